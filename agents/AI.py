@@ -1,10 +1,17 @@
 import numpy as np
-import copy
+import shutil
+import json
+import os
 from agents.resources import *
+from agents.inference import FrozenPolicy
+from resources.profiler import profiler
+from resources.metrics import Metrics
 
 # The Agent class consists of 4 Brains: an actor, a critic, a target_actor and a target_critic.
 #   The targe_networks are initialized as identical copies of the actor and ciritc networks,
-#   but are updated one step behind. 
+#   and are updated in place from them during learning: either a hard copy every target_update_interval
+#   learning steps, or, if tau is given, a soft update blending tau of the networks into the targets every step.
+#   By default they are copied every step, so they stay one step behind. 
 #
 #   The shape and structure of each network is defined in the settings.py file, along with
 #   the learning rate, and epsilon value for an epsilon-greedy strategy. 
@@ -13,80 +20,211 @@ from agents.resources import *
 #   Each experience includes the current state that the agent made a decision on,
 #   the action that the eagent chose to take,
 #   the reward given by the environment for that action, 
-#   and the next state returned by the environment. 
+#   the next state returned by the environment,
+#   and whether the race ended with that action (in which case the next state is not bootstrapped).
 #
 #   Once the memory buffer is full, at each step the agent will sample a given number of experiences.
-#   For each sample in the batch, the agent will:
-#       generate a new action, using the target_actor, given the next_state,
-#       calculate a V_value using the target_critic network, given the next_state-next_action pair,
-#       calculate the target_q value as the sum of the reward from the previous action and the discounted V_value
-#       calculate the predicted_q value using the critic network, given the previous state-action pair. 
-#       calculate the critic loss as the square difference between the predicted_q and the target_q
-#       calculate the gradient of the ciritic, as the derivative of the loss with respect to the predicted_q
-#       calculate the gradient of the actor network as the output gradient from the critic network
-#           from the input nodes that correspond to the action
+#   The whole batch goes through the networks at once, one sample per column, and the agent will:
+#       generate the next actions, using the target_actor, given the next_states,
+#       calculate the V_values using the target_critic network, given the next_state-next_action pairs,
+#       calculate the target_q values as the sum of the rewards from the previous actions and the discounted V_values
+#       calculate the predicted_q values using the critic network, given the previous state-action pairs. 
+#       calculate the critic loss as the mean square difference between the predicted_q and the target_q
+#       calculate the gradient of the ciritic, as the derivative of the loss with respect to each predicted_q,
+#           and let the critic's optimizer update it
+#       calculate the gradient of the actor network as the gradient of -Q from the critic network, given the states
+#           and the actor's own actions, from the input nodes that correspond to the action,
+#           and let the actor's optimizer update it
+#
+# The losses and Q-values of every update, and the reward and length of every episode (ended by calling end_episode),
+#   are recorded in self.metrics, a Metrics object (see resources/metrics.py) that keeps their statistics in fixed memory.
 
 class Agent:
-    def __init__(self, buffer_size = 1000):                
-        self.actor = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE)
-        self.critic = Brain(STATE_DIM + ACTION_DIM, 1, HIDDEN_DIM, CRITIC_NETWORK, CRITIC_LEARNING_RATE)
+    def __init__(self, buffer_size = 1000, prioritized = False, tau = TAU, target_update_interval = TARGET_UPDATE_INTERVAL,
+                 optimizer = OPTIMIZER, memory = None):                
+        self.actor = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE, optimizer = optimizer)
+        self.critic = Brain(STATE_DIM + ACTION_DIM, 1, HIDDEN_DIM, CRITIC_NETWORK, CRITIC_LEARNING_RATE, optimizer = optimizer)
+
+        self.target_actor = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE)
+        self.target_critic = Brain(STATE_DIM + ACTION_DIM, 1, HIDDEN_DIM, CRITIC_NETWORK, CRITIC_LEARNING_RATE)
+        self.target_actor.copy_from(self.actor)
+        self.target_critic.copy_from(self.critic)
 
-        self.target_actor = copy.deepcopy(self.actor)
-        self.target_critic = copy.deepcopy(self.critic)
+        self.tau = tau
+        self.target_update_interval = target_update_interval
+        self.learn_steps = 0
 
-        self.memory = ReplayBuffer(buffer_size)
+        # memory can be an existing buffer (e.g. a DiskReplayBuffer) to use instead of a new ReplayBuffer
+        self.memory = ReplayBuffer(buffer_size, prioritized = prioritized) if memory is None else memory
 
-        self.C_loss = []
-        self.A_loss = []
+        self.metrics = Metrics()
         self.rewards = 0
+        self.episode_reward = 0
+        self.episode_steps = 0
 
     def forward(self, state):
         return self.actor.forward(state)
+
+    # Updates the target networks in place, without creating any new objects.
+    def update_targets(self):
+        if self.tau is not None:
+            self.target_actor.soft_update(self.actor, self.tau)
+            self.target_critic.soft_update(self.critic, self.tau)
+        elif self.learn_steps % self.target_update_interval == 0:
+            self.target_actor.copy_from(self.actor)
+            self.target_critic.copy_from(self.critic)
         
 
-    def learn(self, state, action, reward, next_state, batch_size=250):
+    def learn(self, state, action, reward, next_state, batch_size=250, done=False):
        
-        self.memory.add_experience(state, action, reward, next_state)
+        self.memory.add_experience(state, action, reward, next_state, done)
         self.rewards += reward
+        self.episode_reward += reward
+        self.episode_steps += 1
+        self.update(batch_size)
+
+    # Records the reward and number of steps of the episode since the last call, and the laps completed if given.
+    def end_episode(self, laps = None):
+        if self.episode_steps:
+            self.metrics.add("episode_reward", self.episode_reward)
+            self.metrics.add("episode_length", self.episode_steps)
+        if laps is not None:
+            self.metrics.add("laps", laps)
+        self.episode_reward = 0
+        self.episode_steps = 0
+
+    # The save method writes the agent to a checkpoint directory:
+    #   meta.json with the checkpoint version and the agent settings and counters,
+    #   one raw .npy file with the flat parameters of each network,
+    #   one .npz file with the optimizer state (counters and moments) of the actor and the critic,
+    #   and, if include_memory is True, the replay buffer columns (a persistent buffer is only flushed, as it is kept on disk).
+    # The checkpoint is written next to the old one (path + ".tmp"), the old one is renamed aside (path + ".old"),
+    # the new one is renamed in its place and only then the old one is deleted, so a crash at any point leaves
+    # either checkpoint whole: at path, or at path + ".old", where load finds it.
+    def save(self, path, include_memory = False):
+        temporary = path + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        for name in ("actor", "critic", "target_actor", "target_critic"):
+            np.save(os.path.join(temporary, name + ".npy"), getattr(self, name).parameters)
+        for name in ("actor", "critic"):
+            np.savez(os.path.join(temporary, name + "_optimizer.npz"), **getattr(self, name).optimizer.get_state())
+        if include_memory:
+            self.memory.save(temporary)
+
+        meta = {
+            "version": CHECKPOINT_VERSION,
+            "buffer_size": self.memory.buffer_size,
+            "prioritized": self.memory.prioritized,
+            "tau": self.tau,
+            "target_update_interval": self.target_update_interval,
+            "learn_steps": self.learn_steps,
+            "rewards": float(self.rewards),
+            "actor_learning_rate": self.actor.learning_rate,
+            "critic_learning_rate": self.critic.learning_rate,
+            "optimizer": self.actor.optimizer_name,
+            "dtype": self.actor.dtype.name,
+            "memory": include_memory and not self.memory.persistent,
+        }
+        with open(os.path.join(temporary, "meta.json"), "w") as file:
+            json.dump(meta, file, indent=4)
+
+        previous = path + ".old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, previous)
+        os.rename(temporary, path)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    # The load method builds an agent from a checkpoint directory written by save.
+    #   With mmap = True the networks use the parameter files directly, memory-mapped copy-on-write:
+    #   nothing is read until it is used, and training changes the parameters in memory but never the files.
+    #   The replay buffer is only loaded if it was saved and load_memory is True, or memory is used instead (see __init__).
+    #   Everything is loaded as DTYPE, whatever type it was saved with.
+    #   If save was stopped after it renamed the old checkpoint aside, the old checkpoint is loaded.
+    @classmethod
+    def load(cls, path, mmap = True, load_memory = True, memory = None):
+        if not os.path.exists(path) and os.path.exists(path + ".old"):
+            path = path + ".old"
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+        assert meta["version"] == CHECKPOINT_VERSION, "Unsupported checkpoint version"
+
+        agent = cls(meta["buffer_size"], meta["prioritized"], meta["tau"], meta["target_update_interval"],
+                    meta.get("optimizer", "SGD"), memory)
+        for name in ("actor", "critic", "target_actor", "target_critic"):
+            parameters = np.load(os.path.join(path, name + ".npy"), mmap_mode="c" if mmap else None)
+            brain = getattr(agent, name)
+            assert parameters.shape == brain.parameters.shape, "Checkpoint does not match the network settings"
+            # A checkpoint saved with another dtype is converted, and then read whole instead of memory-mapped
+            if parameters.dtype != brain.dtype:
+                parameters = parameters.astype(brain.dtype)
+            brain.bind(parameters, copy = False)
+
+        agent.actor.learning_rate = meta["actor_learning_rate"]
+        agent.critic.learning_rate = meta["critic_learning_rate"]
+        for name in ("actor", "critic"):
+            if os.path.exists(os.path.join(path, name + "_optimizer.npz")):
+                with np.load(os.path.join(path, name + "_optimizer.npz")) as state:
+                    getattr(agent, name).optimizer.set_state(state)
+        agent.learn_steps = meta["learn_steps"]
+        agent.rewards = meta["rewards"]
+        if meta["memory"] and load_memory and memory is None:
+            agent.memory.load(path)
+        return agent
 
+    # The update method runs one learning step on a batch sampled from the memory buffer,
+    # once the buffer holds memory.warmup experiences (for a ReplayBuffer, once it is full).
+    # It can also be called on its own when the memory is filled by someone else.
+    def update(self, batch_size=250):
+        if len(self.memory) >= self.memory.warmup:
+            profiler.count("learn")
 
-        if len(self.memory.buffer) >= self.memory.buffer_size:
-            states, actions, rewards, next_states = self.memory.sample_batch(batch_size)
-            critic_loss = []
-            critic_gradient = np.zeros([1,1])
-            actor_loss = []
-            
-            for i in range(batch_size):
-                next_action = self.target_actor.forward(next_states[i])
+            with profiler.phase("sample"):
+                states, actions, rewards, next_states, dones, indices, weights = self.memory.sample_batch(batch_size)
 
-                target_critic_input = np.concatenate((next_states[i], next_action))
-                target_critic_input = np.reshape(target_critic_input, (8,1))
-                V_value = self.target_critic.forward(target_critic_input) *2
+                # Each sample becomes a column of the batch matrices
+                states = states.T
+                actions = actions.T
+                rewards = np.reshape(rewards, (1, batch_size))
+                next_states = next_states.T
+                dones = np.reshape(dones, (1, batch_size))
 
-                target_q = rewards[i] + DISCOUNT_FACTOR * V_value
+            with profiler.phase("q_values"):
+                next_actions = self.target_actor.forward(next_states)
+                V_values = self.target_critic.forward(np.concatenate((next_states, next_actions))) *2
 
-                critic_input = np.concatenate((*states[i], actions[i]))
-                critic_input = np.reshape(critic_input, (8,1))
-                predicted_q = self.critic.forward(critic_input) *2    
+                target_q = rewards + DISCOUNT_FACTOR * (1 - dones) * V_values
 
-                critic_gradient += 2*(predicted_q - target_q)
+                predicted_q = self.critic.forward(np.concatenate((states, actions))) *2
 
-                critic_loss.insert(len(critic_loss),(target_q - predicted_q)**2)
-                actor_loss.insert(len(actor_loss), -predicted_q)
-                    
+                # With prioritized sampling, each sample's gradient is scaled by its importance-sampling weight
+                critic_gradient = 2*(predicted_q - target_q) * weights
 
-            
-            critic_loss = sum(critic_loss) * (1/batch_size)
-            critic_gradient *= (1/batch_size)
-            actor_loss = sum(actor_loss) * (1/batch_size) 
+                if self.memory.prioritized:
+                    self.memory.update_priorities(indices, target_q - predicted_q)
 
-            self.C_loss.insert(len(self.C_loss), critic_loss[0])
-            self.A_loss.insert(len(self.A_loss), actor_loss[0])
+                self.metrics.add("critic_loss", np.mean((target_q - predicted_q)**2))
+                self.metrics.add("q_mean", np.mean(predicted_q))
+                self.metrics.add("q_max", np.max(predicted_q))
 
-            self.target_actor = copy.deepcopy(self.actor)
-            self.target_critic = copy.deepcopy(self.critic)
-            actor_gradient = self.critic.backward(critic_gradient)
-            self.actor.backward(actor_gradient[5:])
+            with profiler.phase("targets"):
+                self.update_targets()
+                self.learn_steps += 1
+
+            with profiler.phase("backward"):
+                self.critic.backward(critic_gradient)
+                self.critic.step()
+
+                # The actor's actions go through the critic, and the gradient of -Q comes back to the actor
+                # through the action inputs, without adding anything to the critic's gradients.
+                actor_q = self.critic.forward(np.concatenate((states, self.actor.forward(states)))) *2
+                actor_gradient = self.critic.backward(np.full((1, batch_size), -2.0, dtype=DTYPE), accumulate = False)
+                self.actor.backward(actor_gradient[STATE_DIM:])
+                self.actor.step()
+
+                self.metrics.add("actor_loss", -np.mean(actor_q))
         
 # The Brain class builds a network based on the structure passed in the thrid argument.
 #   The structure the network consists of layers, each layer defined in the layers.py file
@@ -98,10 +236,27 @@ class Agent:
 #
 #   The forward and backward method iterate through the layers (forwards or backwards),
 #       calling the corresponding mthod from each layer, and passing the output to the following layer.
+#   Both methods take a (features, batch) matrix, with one sample per column.
+#
+#   The weights and biases of all Dense layers are views into one contiguous vector, self.parameters,
+#   so the whole network can be copied, blended, compared or sent somewhere else as a single array.
+#
+#   With population = P the Brain holds P networks of the same structure, stacked: self.parameters is (P, parameters),
+#   with one network per row laid out as in a single Brain, and forward and backward take (P, features, batch) arrays.
+#
+#   The backward method only adds the gradients of the batch to self.gradients, a vector laid out as self.parameters,
+#   and the step method lets the optimizer (one of the optimizers.py classes, by name) update all parameters from it.
+#
+#   The parameters, gradients and optimizer moments are all of type dtype (DTYPE by default).
+#   The inputs of forward and backward must already be of that type: they are not converted, and a wider array
+#   (e.g. float64 in a float32 network) upcasts everything after it. tests/test_dtype.py checks that learning never does.
 
 class Brain:
-    def __init__(self, input_dim, output_dim, hidden_dim, network, learning_rate):
-        self.learning_rate = learning_rate
+    def __init__(self, input_dim, output_dim, hidden_dim, network, learning_rate, population = None, optimizer = OPTIMIZER,
+                 dtype = DTYPE):
+        self.dtype = np.dtype(dtype)
+        self.optimizer = get_optimizer(optimizer, learning_rate, dtype = self.dtype)
+        self.optimizer_name = optimizer
         layer_mapping = {
             "Dense": Dense,
             "Tanh": Tanh,
@@ -113,52 +268,202 @@ class Brain:
             layer_class = layer_mapping[layer_type]
             if layer_type == "Dense":
                 if output:
-                    self.network.insert(0, layer_class(hidden_dim, output_dim))
+                    self.network.insert(0, layer_class(hidden_dim, output_dim, population, self.dtype))
                     output = False
                 elif index == len(network) -1:
-                    self.network.insert(0, layer_class(input_dim, hidden_dim))
+                    self.network.insert(0, layer_class(input_dim, hidden_dim, population, self.dtype))
                 else:
-                    self.network.insert(0, layer_class(hidden_dim, hidden_dim))
+                    self.network.insert(0, layer_class(hidden_dim, hidden_dim, population, self.dtype))
             else:
                 self.network.insert(0, layer_class())
+
+        self.dense_layers = [layer for layer in self.network if isinstance(layer, Dense)]
+        stack = () if population is None else (population,)
+        size = sum(layer.num_parameters() for layer in self.dense_layers)
+        self.bind(np.empty(stack + (size,), dtype=self.dtype))
+
+        self.gradients = np.zeros(stack + (size,), dtype=self.dtype)
+        offset = 0
+        for layer in self.dense_layers:
+            offset = layer.bind_gradients(self.gradients, offset)
+
+    @property
+    def learning_rate(self):
+        return self.optimizer.learning_rate
+
+    @learning_rate.setter
+    def learning_rate(self, learning_rate):
+        self.optimizer.learning_rate = learning_rate
            
+    # Makes the given vector the parameter vector of the network.
+    # With copy = False the network takes the values in the vector, which can also be a memory-mapped array.
+    def bind(self, parameters, copy = True):
+        assert parameters.dtype == self.dtype, "Parameters must be of the Brain's dtype"
+        self.parameters = parameters
+        offset = 0
+        for layer in self.dense_layers:
+            offset = layer.bind_parameters(self.parameters, offset, copy)
+
 
-    def forward(self, action):
-        output = action
-        for layer in self.network:
-            output = layer.forward(output)
+    def forward(self, input):
+        with profiler.phase("brain.forward"):
+            output = input
+            for layer in self.network:
+                output = layer.forward(output)
 
         return output
     
-    def backward(self, error):
-        grad = error
-        for layer in reversed(self.network):
-            grad = layer.backward(grad, self.learning_rate)
+    # Adds the gradients of the batch to self.gradients and returns the gradient of the input.
+    # With accumulate = False only the input gradient is computed, and self.gradients is left as it is.
+    def backward(self, error, accumulate = True):
+        with profiler.phase("brain.backward"):
+            grad = error
+            for layer in reversed(self.network):
+                grad = layer.backward(grad, accumulate)
         return grad
 
+    # Updates the parameters from the accumulated gradients. It returns True if the optimizer applied an update.
+    def step(self):
+        with profiler.phase("brain.step"):
+            return self.optimizer.step(self.parameters, self.gradients)
+
+    def zero_gradients(self):
+        self.gradients[...] = 0
+
+    # Returns a FrozenPolicy that acts with a copy of this network, see agents/inference.py.
+    def freeze(self):
+        return FrozenPolicy(self)
+
+    # The following methods work on the flat parameter vector, always in place.
+    # The other Brain must have the same structure.
+    def copy_from(self, other):
+        self.parameters[:] = other.parameters
+
+    def soft_update(self, other, tau):
+        self.parameters *= (1 - tau)
+        self.parameters += tau * other.parameters
+
+    def get_parameters(self):
+        return self.parameters.copy()
+
+    def set_parameters(self, parameters):
+        self.parameters[:] = parameters
+
+    def parameter_diff(self, other):
+        return self.parameters - other.parameters
+
 # The ReplayBuffer class is just a manager for the agents' experience memory.
+#   The experiences are stored in preallocated float32 arrays, one per field (state, action, reward, next_state, done),
+#   used as a ring buffer: once the buffer is full, each new experience overwrites the oldest one.
+#
+#   Learning starts once the buffer holds warmup experiences, which is all of them.
+#
+#   If prioritized is True, each experience also gets a priority stored in a SumTree, and the batches are sampled
+#   with probability proportional to priority ** alpha. New experiences get the largest priority seen so far,
+#   and update_priorities should be called with the TD-errors of the sampled batch.
 
 class ReplayBuffer:
-    def __init__(self, buffer_size):
+    persistent = False
+
+    def __init__(self, buffer_size, state_dim = STATE_DIM, action_dim = ACTION_DIM, prioritized = False,
+                 alpha = PRIORITY_ALPHA, beta = PRIORITY_BETA, dtype = DTYPE):
         self.buffer_size = buffer_size
-        self.buffer = []
+        self.warmup = buffer_size
+        self.position = 0
+        self.size = 0
+        self.dtype = np.dtype(dtype)
+
+        self.states = np.zeros((buffer_size, state_dim), dtype=self.dtype)
+        self.actions = np.zeros((buffer_size, action_dim), dtype=self.dtype)
+        self.rewards = np.zeros(buffer_size, dtype=self.dtype)
+        self.next_states = np.zeros((buffer_size, state_dim), dtype=self.dtype)
+        self.dones = np.zeros(buffer_size, dtype=self.dtype)
 
-    # This method stores the state, action, reward and next state in the replay buffer.
-    def add_experience(self, state, action, reward, next_state):
-        experience = (state, action, reward, next_state)
-        self.buffer.append(experience)
-        if len(self.buffer) > self.buffer_size:
-            del self.buffer[0]
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        if prioritized:
+            self.priorities = SumTree(buffer_size)
+            self.max_priority = 1.0
 
+    def __len__(self):
+        return self.size
+
+    # This method stores the state, action, reward, next state and done flag in the replay buffer.
+    def add_experience(self, state, action, reward, next_state, done = False):
+        i = self.position
+        self.states[i] = np.ravel(state)
+        self.actions[i] = np.ravel(action)
+        self.rewards[i] = reward
+        self.next_states[i] = np.ravel(next_state)
+        self.dones[i] = done
+
+        if self.prioritized:
+            self.priorities.update([i], self.max_priority ** self.alpha)
+
+        self.position = (i + 1) % self.buffer_size
+        self.size = min(self.size + 1, self.buffer_size)
+
+    # Same as add_experience, for a batch of experiences given one per row.
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        count = np.size(rewards)
+        rows = slice(max(0, count - self.buffer_size), count)
+        indices = (self.position + np.arange(count)[rows]) % self.buffer_size
+
+        self.states[indices] = np.reshape(states, (count, -1))[rows]
+        self.actions[indices] = np.reshape(actions, (count, -1))[rows]
+        self.rewards[indices] = np.ravel(rewards)[rows]
+        self.next_states[indices] = np.reshape(next_states, (count, -1))[rows]
+        self.dones[indices] = np.ravel(dones)[rows]
+
+        if self.prioritized:
+            self.priorities.update(indices, np.full(len(indices), self.max_priority ** self.alpha))
+
+        self.position = (self.position + count) % self.buffer_size
+        self.size = min(self.size + count, self.buffer_size)
+
+    # It returns the states, actions, rewards, next_states and dones of the batch, one experience per row,
+    # along with the indices of the experiences (for update_priorities) and their importance-sampling weights.
+    # Without prioritized sampling the indices are uniform and the weights are all 1.
     def sample_batch(self, batch_size):
-        # The choice method of numpy generates a list of indices.
-        # The first argument is an array. If an int is given, the array is all the numbers from 0 to int_given
-        # The second argument specifies how many items to pick from the given array (batch_size)
-        # The replace argument determines if an item can be selected twice or not. 
+        if self.prioritized:
+            # The total priority is split in batch_size equal segments, and one value is drawn from each segment
+            segment = self.priorities.total() / batch_size
+            values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+            indices = np.minimum(self.priorities.find(values), self.size - 1)
+
+            probabilities = self.priorities.get(indices) / self.priorities.total()
+            weights = (self.size * probabilities) ** (-self.beta)
+            weights = (weights / weights.max()).astype(self.dtype)
+        else:
+            indices = np.random.randint(self.size, size=batch_size)
+            weights = np.ones(batch_size, dtype=self.dtype)
+
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], indices, weights)
+
+    # Writes the buffer columns (and priorities) as .npy files in the given directory.
+    def save(self, path):
+        for name in ("states", "actions", "rewards", "next_states", "dones"):
+            np.save(os.path.join(path, "memory_" + name + ".npy"), getattr(self, name))
+        counters = [self.position, self.size]
+        if self.prioritized:
+            np.save(os.path.join(path, "memory_priorities.npy"), self.priorities.tree)
+            counters.append(self.max_priority)
+        np.save(os.path.join(path, "memory_counters.npy"), np.array(counters, dtype=np.float64))
 
-        batch_indices = np.random.choice(len(self.buffer), size=batch_size, replace=False)
-        batch = [self.buffer[i] for i in batch_indices]
+    # Reads the buffer columns written by save into this buffer, which must have the same size.
+    def load(self, path):
+        for name in ("states", "actions", "rewards", "next_states", "dones"):
+            getattr(self, name)[...] = np.load(os.path.join(path, "memory_" + name + ".npy"))
+        counters = np.load(os.path.join(path, "memory_counters.npy"))
+        self.position, self.size = int(counters[0]), int(counters[1])
+        if self.prioritized and os.path.exists(os.path.join(path, "memory_priorities.npy")):
+            self.priorities.tree[...] = np.load(os.path.join(path, "memory_priorities.npy"))
+            self.max_priority = counters[2]
 
-        # The zip function groups the nth item of each batch. [[1,2], [a,b], [!, ?]] becomes [[1, a, !], [2, b, ?]]
-        states, actions, rewards, next_states = zip(*batch)
-        return np.array(states), np.array(actions), np.array(rewards), np.array(next_states)
\ No newline at end of file
+    # Sets the priority of the given experiences from the absolute TD-errors of the last learning step.
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(np.ravel(td_errors)) + PRIORITY_EPSILON
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.priorities.update(indices, priorities ** self.alpha)
@@ -0,0 +1,76 @@
+from agents.resources import *
+import numpy as np
+
+# The FrozenPolicy class runs a copy of a Brain forward for acting only, as fast as NumPy allows for one state or a small batch.
+#
+#   Each Dense layer and the activation after it are fused into one step that writes into preallocated buffers,
+#   so acting allocates nothing, keeps nothing for a backward pass, and does not go through the profiler.
+#   The bias is stored as the last column of the weights, and every input buffer ends with a constant row of ones,
+#   so a step is only one matrix product into the next buffer and one in-place tanh.
+#   The buffers for one state are made with the policy, and the ones for each batch size the first time it is used.
+#
+#   The policy acts with the parameters the Brain had when it was frozen. refresh() copies them again,
+#   e.g. after the Brain learned or got new parameters with set_parameters.
+#
+#   act(state) takes one (STATE_DIM,) state and returns a (ACTION_DIM,) action,
+#   and act_batch(states) takes a (batch, STATE_DIM) array and returns a (batch, ACTION_DIM) array.
+#   Both return (a view of) the policy's output buffer, overwritten by the next call, so it must be copied to be kept.
+
+class FrozenPolicy:
+    def __init__(self, brain):
+        assert brain.parameters.ndim == 1, "Only a single Brain can be frozen, not a population"
+        self.brain = brain
+        self.dtype = brain.dtype
+
+        # The Dense layers, and whether a tanh follows each of them
+        self.layers = []
+        self.tanh = []
+        for layer in brain.network:
+            if isinstance(layer, Dense):
+                self.layers.append(layer)
+                self.tanh.append(False)
+            elif isinstance(layer, Tanh):
+                assert self.layers and not self.tanh[-1], "A Tanh must follow a Dense layer"
+                self.tanh[-1] = True
+            else:
+                assert isinstance(layer, Linear), "Unsupported layer " + type(layer).__name__
+
+        # (output, input + 1) weights, with the bias as last column
+        self.weights = [np.empty((output, input + 1), dtype=self.dtype) for output, input in
+                        (layer.weights.shape for layer in self.layers)]
+        self.refresh()
+
+        self.single = self._plan(())
+        self.batches = {}
+
+    # Copies the Brain's current parameters into the policy.
+    def refresh(self):
+        for layer, weights in zip(self.layers, self.weights):
+            weights[:, :-1] = layer.weights
+            weights[:, -1] = layer.bias[:, 0]
+
+    # Returns the input buffer of the network, and the steps with their weights, input and output buffers,
+    # for inputs of shape (features,) + batch.
+    def _plan(self, batch):
+        inputs = [np.ones((weights.shape[1],) + batch, dtype=self.dtype) for weights in self.weights]
+        outputs = [input[:-1] for input in inputs[1:]] + [np.empty((self.weights[-1].shape[0],) + batch, dtype=self.dtype)]
+        steps = list(zip(self.weights, inputs, outputs, self.tanh))
+        return inputs[0][:-1], steps
+
+    def _run(self, plan, states):
+        state, steps = plan
+        state[...] = states
+        for weights, input, output, tanh in steps:
+            np.dot(weights, input, out=output)
+            if tanh:
+                np.tanh(output, out=output)
+        return output
+
+    def act(self, state):
+        return self._run(self.single, state)
+
+    def act_batch(self, states):
+        plan = self.batches.get(len(states))
+        if plan is None:
+            plan = self.batches[len(states)] = self._plan((len(states),))
+        return self._run(plan, states.T).T
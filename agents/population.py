@@ -0,0 +1,234 @@
+import numpy as np
+
+from agents.AI import Agent, Brain, ReplayBuffer
+from agents.resources import *
+from resources.profiler import profiler
+from resources.metrics import Metrics
+
+# The Population class trains size agents together, as if they were one.
+#   Its actor, critic, target_actor and target_critic are stacked Brains, holding the networks of every member
+#   as (size, output, input) arrays, so all members go forward and learn with one matmul per layer instead of
+#   one Python loop per agent. The learning step is the same as Agent.update, run for every member at once.
+#
+#   The experiences go to a PopulationBuffer, where every member has its own memory, filled together at each step.
+#   The metrics are recorded as in an Agent, with one value per member in every metric.
+#
+#   Each member is also available as a regular Agent, in self.members, whose Brains are views of the member's row
+#   of the stacked parameters: training the population changes them, and they can be saved, played or sent to
+#   the workers and the viewer like any other agent. Their memories are MemberBuffers, views of the member's rows of
+#   the population memory, so a member checkpoint holds the member's experiences, with the population's buffer size.
+
+class Population:
+    def __init__(self, size, buffer_size = 1000, tau = TAU, target_update_interval = TARGET_UPDATE_INTERVAL,
+                 optimizer = OPTIMIZER):
+        self.size = size
+        self.actor = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE, size, optimizer)
+        self.critic = Brain(STATE_DIM + ACTION_DIM, 1, HIDDEN_DIM, CRITIC_NETWORK, CRITIC_LEARNING_RATE, size, optimizer)
+
+        self.target_actor = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE, size)
+        self.target_critic = Brain(STATE_DIM + ACTION_DIM, 1, HIDDEN_DIM, CRITIC_NETWORK, CRITIC_LEARNING_RATE, size)
+        self.target_actor.copy_from(self.actor)
+        self.target_critic.copy_from(self.critic)
+
+        self.tau = tau
+        self.target_update_interval = target_update_interval
+        self.learn_steps = 0
+
+        self.memory = PopulationBuffer(size, buffer_size, dtype = self.actor.dtype)
+
+        self.metrics = Metrics()
+        self.rewards = np.zeros(size)
+        self.episode_reward = np.zeros(size)
+        self.episode_steps = 0
+
+        self.members = []
+        for i in range(size):
+            agent = Agent(buffer_size, tau = tau, target_update_interval = target_update_interval, optimizer = optimizer,
+                          memory = MemberBuffer(self.memory, i))
+            for name in ("actor", "critic", "target_actor", "target_critic"):
+                getattr(agent, name).bind(getattr(self, name).parameters[i], copy = False)
+            self.members.append(agent)
+
+    # Builds a population from a list of agents (e.g. loaded from checkpoints), copying their parameters, memories
+    # and optimizer states (a member whose optimizer has no moments yet starts from zero ones).
+    @classmethod
+    def from_agents(cls, agents, buffer_size = 1000):
+        population = cls(len(agents), buffer_size, agents[0].tau, agents[0].target_update_interval,
+                         agents[0].actor.optimizer_name)
+        for i, agent in enumerate(agents):
+            for name in ("actor", "critic", "target_actor", "target_critic"):
+                getattr(population, name).parameters[i] = getattr(agent, name).parameters
+        for name in ("actor", "critic"):
+            states = [getattr(agent, name).optimizer.get_state() for agent in agents]
+            state = {"calls": states[0]["calls"], "steps": states[0]["steps"]}
+            for moment in set().union(*states) - {"calls", "steps"}:
+                zeros = np.zeros_like(getattr(population, name).parameters[0])
+                state[moment] = np.stack([member.get(moment, zeros) for member in states])
+            getattr(population, name).optimizer.set_state(state)
+        population.memory.copy_from([agent.memory for agent in agents])
+        population.learn_steps = agents[0].learn_steps
+        population.rewards[:] = [agent.rewards for agent in agents]
+        return population
+
+    # Returns the members as agents, with the population counters and each member's row of the optimizer states copied into them.
+    def agents(self):
+        states = {name: getattr(self, name).optimizer.get_state() for name in ("actor", "critic")}
+        for i, agent in enumerate(self.members):
+            agent.learn_steps = self.learn_steps
+            agent.rewards = float(self.rewards[i])
+            for name, state in states.items():
+                getattr(agent, name).optimizer.set_state({key: value if value.ndim == 0 else value[i] for key, value in state.items()})
+        return self.members
+
+    # Takes one state per member, as a (size, STATE_DIM) array, and returns one action per member, (size, ACTION_DIM).
+    def forward(self, states):
+        return self.actor.forward(states[:, :, None])[:, :, 0]
+
+    def update_targets(self):
+        if self.tau is not None:
+            self.target_actor.soft_update(self.actor, self.tau)
+            self.target_critic.soft_update(self.critic, self.tau)
+        elif self.learn_steps % self.target_update_interval == 0:
+            self.target_actor.copy_from(self.actor)
+            self.target_critic.copy_from(self.critic)
+
+    # Same as Agent.learn, with one experience per member: states (size, STATE_DIM), actions (size, ACTION_DIM),
+    # rewards (size,) and next_states (size, STATE_DIM).
+    def learn(self, states, actions, rewards, next_states, batch_size=250, done=False):
+        self.memory.add_experience(states, actions, rewards, next_states, done)
+        self.rewards += rewards
+        self.episode_reward += rewards
+        self.episode_steps += 1
+        self.update(batch_size)
+
+    # Same as Agent.end_episode, with laps as one value per member.
+    def end_episode(self, laps = None):
+        if self.episode_steps:
+            self.metrics.add("episode_reward", self.episode_reward, (self.size,))
+            self.metrics.add("episode_length", self.episode_steps)
+        if laps is not None:
+            self.metrics.add("laps", laps, (self.size,))
+        self.episode_reward[:] = 0
+        self.episode_steps = 0
+
+    # Same as Agent.update, with a batch sampled for every member. Every array has the members as first dimension.
+    def update(self, batch_size=250):
+        if len(self.memory) >= self.memory.buffer_size:
+            profiler.count("learn", self.size)
+
+            with profiler.phase("sample"):
+                states, actions, rewards, next_states, dones = self.memory.sample_batch(batch_size)
+
+            with profiler.phase("q_values"):
+                next_actions = self.target_actor.forward(next_states)
+                V_values = self.target_critic.forward(np.concatenate((next_states, next_actions), axis=1)) *2
+
+                target_q = rewards + DISCOUNT_FACTOR * (1 - dones) * V_values
+
+                predicted_q = self.critic.forward(np.concatenate((states, actions), axis=1)) *2
+
+                critic_gradient = 2*(predicted_q - target_q)
+
+                self.metrics.add("critic_loss", np.mean((target_q - predicted_q)**2, axis=(1, 2)), (self.size,))
+                self.metrics.add("q_mean", np.mean(predicted_q, axis=(1, 2)), (self.size,))
+                self.metrics.add("q_max", np.max(predicted_q, axis=(1, 2)), (self.size,))
+
+            with profiler.phase("targets"):
+                self.update_targets()
+                self.learn_steps += 1
+
+            with profiler.phase("backward"):
+                self.critic.backward(critic_gradient)
+                self.critic.step()
+
+                actor_q = self.critic.forward(np.concatenate((states, self.actor.forward(states)), axis=1)) *2
+                actor_gradient = self.critic.backward(np.full((self.size, 1, batch_size), -2.0, dtype=DTYPE), accumulate = False)
+                self.actor.backward(actor_gradient[:, STATE_DIM:])
+                self.actor.step()
+
+                self.metrics.add("actor_loss", -np.mean(actor_q, axis=(1, 2)), (self.size,))
+
+
+# The PopulationBuffer class is a ReplayBuffer for a whole population: the columns have the members as first dimension,
+#   and every step adds one experience for each member at the same position.
+#   Each member samples its own batch, and the batches come out as (size, features, batch) arrays, ready for the Brains.
+
+class PopulationBuffer:
+    def __init__(self, size, buffer_size, state_dim = STATE_DIM, action_dim = ACTION_DIM, dtype = DTYPE):
+        self.buffer_size = buffer_size
+        self.dtype = np.dtype(dtype)
+        self.position = 0
+        self.count = 0
+        self.members = np.arange(size)[:, None]
+
+        self.states = np.zeros((size, buffer_size, state_dim), dtype=self.dtype)
+        self.actions = np.zeros((size, buffer_size, action_dim), dtype=self.dtype)
+        self.rewards = np.zeros((size, buffer_size), dtype=self.dtype)
+        self.next_states = np.zeros((size, buffer_size, state_dim), dtype=self.dtype)
+        self.dones = np.zeros((size, buffer_size), dtype=self.dtype)
+
+    def __len__(self):
+        return self.count
+
+    # Fills the buffer with the experiences of one ReplayBuffer per member, the newest last.
+    # The members share the position, so every member gets as many experiences as the member with the fewest.
+    def copy_from(self, memories):
+        count = min(min(len(memory) for memory in memories), self.buffer_size)
+        for i, memory in enumerate(memories):
+            rows = (memory.position - count + np.arange(count)) % memory.buffer_size
+            for name in ("states", "actions", "rewards", "next_states", "dones"):
+                getattr(self, name)[i, :count] = getattr(memory, name)[rows]
+        self.position = count % self.buffer_size
+        self.count = count
+
+    def add_experience(self, states, actions, rewards, next_states, dones = False):
+        i = self.position
+        self.states[:, i] = states
+        self.actions[:, i] = actions
+        self.rewards[:, i] = rewards
+        self.next_states[:, i] = next_states
+        self.dones[:, i] = dones
+
+        self.position = (i + 1) % self.buffer_size
+        self.count = min(self.count + 1, self.buffer_size)
+
+    # It returns the states, actions, rewards, next_states and dones of every member's batch,
+    # as (size, features, batch) arrays, with the rewards and dones as (size, 1, batch).
+    def sample_batch(self, batch_size):
+        indices = np.random.randint(self.count, size=(len(self.members), batch_size))
+        return (self.states[self.members, indices].transpose(0, 2, 1),
+                self.actions[self.members, indices].transpose(0, 2, 1),
+                self.rewards[self.members, indices][:, None],
+                self.next_states[self.members, indices].transpose(0, 2, 1),
+                self.dones[self.members, indices][:, None])
+
+
+# The MemberBuffer class is the memory of one member of a PopulationBuffer, as a ReplayBuffer:
+#   its columns are views of the member's rows, and its position and size are the ones of the whole population,
+#   so saving and loading it work as for any ReplayBuffer. The population adds the experiences, not the member.
+
+class MemberBuffer(ReplayBuffer):
+    def __init__(self, population_buffer, index):
+        self.population_buffer = population_buffer
+        self.buffer_size = population_buffer.buffer_size
+        self.warmup = population_buffer.buffer_size
+        self.dtype = population_buffer.dtype
+        self.prioritized = False
+        for name in ("states", "actions", "rewards", "next_states", "dones"):
+            setattr(self, name, getattr(population_buffer, name)[index])
+
+    @property
+    def position(self):
+        return self.population_buffer.position
+
+    @position.setter
+    def position(self, position):
+        self.population_buffer.position = position
+
+    @property
+    def size(self):
+        return self.population_buffer.count
+
+    @size.setter
+    def size(self, size):
+        self.population_buffer.count = size
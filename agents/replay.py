@@ -0,0 +1,129 @@
+from agents.resources import *
+from agents.AI import ReplayBuffer
+from numpy.lib.format import open_memmap
+import numpy as np
+import os
+
+# The DiskReplayBuffer class is a ReplayBuffer whose columns live in memory-mapped files in a directory, so it is kept
+# between runs and it can hold more experiences than fit in memory:
+#
+#   header.bin              magic, version, state_dim, action_dim, dtype, capacity, position (the write cursor), size
+#   states.npy, actions.npy, rewards.npy, next_states.npy, dones.npy
+#                           one .npy file per column with capacity rows, readable with np.load(mmap_mode="r")
+#
+#   Opening a directory that already holds a buffer resumes it where the last run stopped, with its own size;
+#   otherwise a new buffer of buffer_size experiences is created. The files are created sparse, so only the experiences written use the disk.
+#   The header is memory-mapped too, and the cursor is written into it after every add, after the experiences themselves,
+#   so a run that is stopped or killed at any point leaves a buffer that can be opened again.
+#
+#   Learning can start once warmup experiences are stored (Agent.update checks memory.warmup), instead of when the
+#   buffer is full, which could take longer than a run.
+#
+#   The batches are sampled chunk by chunk: chunks_per_batch experiences are drawn uniformly, and the batch is drawn
+#   in equal parts, uniformly, from the chunks of chunk_size experiences they are in, then sorted. Every experience is still
+#   equally likely to be drawn, but a batch only reads a few short runs of each file instead of one page per experience:
+#   with the default settings a batch of 256 reads about 77 pages of states.npy instead of about 254, in 4 contiguous
+#   ranges the read-ahead of the disk can follow. The price is that the experiences of a batch are more correlated.
+#
+#   Prioritized sampling is not supported: its SumTree would need the whole capacity in memory.
+
+REPLAY_MAGIC = b"PODREPLY"
+REPLAY_HEADER = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("state_dim", "<u4"),
+    ("action_dim", "<u4"),
+    ("dtype", "S4"),
+    ("capacity", "<u8"),
+    ("position", "<u8"),
+    ("size", "<u8"),
+])
+
+class DiskReplayBuffer(ReplayBuffer):
+    persistent = True
+
+    def __init__(self, path, buffer_size = None, state_dim = STATE_DIM, action_dim = ACTION_DIM, dtype = DTYPE,
+                 warmup = REPLAY_WARMUP, chunk_size = REPLAY_CHUNK_SIZE, chunks_per_batch = REPLAY_CHUNKS_PER_BATCH):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.prioritized = False
+        self.chunk_size = chunk_size
+        self.chunks_per_batch = chunks_per_batch
+
+        header_path = os.path.join(path, "header.bin")
+        new = not os.path.exists(header_path)
+        if new:
+            assert buffer_size is not None, "A new replay buffer needs a buffer_size"
+            os.makedirs(path, exist_ok = True)
+            self.buffer_size, self.position, self.size = buffer_size, 0, 0
+        else:
+            self.header = np.memmap(header_path, dtype=REPLAY_HEADER, mode="r+", shape=(1,))
+            assert self.header["magic"][0] == REPLAY_MAGIC, "Not a replay buffer: " + path
+            assert self.header["version"][0] == REPLAY_VERSION, "Unsupported replay buffer version"
+            assert (self.header["state_dim"][0], self.header["action_dim"][0]) == (state_dim, action_dim), \
+                "The replay buffer does not match the state and action sizes"
+            assert self.header["dtype"][0].decode() == self.dtype.str[1:], "The replay buffer was saved with another dtype"
+            self.buffer_size = int(self.header["capacity"][0])
+            self.position = int(self.header["position"][0])
+            self.size = int(self.header["size"][0])
+        self.warmup = min(warmup, self.buffer_size)
+
+        # The memory maps are kept to flush them, and the columns are plain arrays over the same memory
+        self.maps = {}
+        for name, shape in (("states", (state_dim,)), ("actions", (action_dim,)), ("rewards", ()),
+                            ("next_states", (state_dim,)), ("dones", ())):
+            self.maps[name] = open_memmap(os.path.join(path, name + ".npy"), mode = "w+" if new else "r+", dtype = self.dtype,
+                                          shape = (self.buffer_size,) + shape)
+            setattr(self, name, np.asarray(self.maps[name]))
+
+        # A new buffer gets its header once its columns exist, so a directory with a header always holds a whole buffer
+        if new:
+            self.header = np.memmap(header_path, dtype=REPLAY_HEADER, mode="w+", shape=(1,))
+            self.header[0] = (REPLAY_MAGIC, REPLAY_VERSION, state_dim, action_dim, self.dtype.str[1:], buffer_size, 0, 0)
+            self.flush()
+        # position and size, as a plain array over the header, the cheapest to write after every add
+        self.cursor = np.ndarray(2, dtype="<u8", buffer=self.header, offset=REPLAY_HEADER.fields["position"][1])
+
+    def add_experience(self, state, action, reward, next_state, done = False):
+        super().add_experience(state, action, reward, next_state, done)
+        self._write_cursor()
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        super().add_batch(states, actions, rewards, next_states, dones)
+        self._write_cursor()
+
+    def _write_cursor(self):
+        self.cursor[0] = self.position
+        self.cursor[1] = self.size
+
+    def sample_batch(self, batch_size):
+        chunks = min(self.chunks_per_batch, batch_size)
+        starts = np.random.randint(self.size, size=chunks) // self.chunk_size * self.chunk_size
+        lengths = np.minimum(starts + self.chunk_size, self.size) - starts
+
+        counts = np.full(chunks, batch_size // chunks)
+        counts[:batch_size % chunks] += 1
+        indices = np.repeat(starts, counts) + (np.random.random(batch_size) * np.repeat(lengths, counts)).astype(np.int64)
+        indices.sort()
+        weights = np.ones(batch_size, dtype=self.dtype)
+
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], indices, weights)
+
+    # Writes everything to disk: the columns first, then the header.
+    def flush(self):
+        for column in self.maps.values():
+            column.flush()
+        self.header.flush()
+
+    # The buffer is its own checkpoint, so saving it with an agent only flushes it, and loading does nothing.
+    def save(self, path):
+        self.flush()
+
+    def load(self, path):
+        pass
+
+    def close(self):
+        self.flush()
+        self.maps = {}
+        self.states = self.actions = self.rewards = self.next_states = self.dones = None
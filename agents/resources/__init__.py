@@ -1,3 +1,5 @@
 from agents.resources.settings import *
 from resources.functions import *
-from agents.resources.layers import *
\ No newline at end of file
+from agents.resources.layers import *
+from agents.resources.sum_tree import *
+from agents.resources.optimizers import *
@@ -1,3 +1,4 @@
+from agents.resources.settings import *
 import numpy as np
 
 class Layer:
@@ -8,24 +9,68 @@ class Layer:
     def forward(self, input):
         pass
 
-    def backward(self, output_gradient, learning_rate):
+    def backward(self, output_gradient, accumulate = True):
         pass
 
 
+# All layers work on batches: the input is a (features, batch) matrix, with one column per sample.
+#   A single sample is just a batch of size 1, a (features, 1) column.
+#
+# A Dense layer can also hold a whole population of layers: with population = P the weights are (P, output, input),
+# the bias (P, output, 1), and the input and output have an extra first dimension, (P, features, batch).
+# All members then go forward and backward together, with one matmul (single layers keep np.dot, which is faster for them).
+
 class Dense(Layer):
-    def __init__(self, input_size, output_size):
-        self.weights = np.random.randn(output_size, input_size)
-        self.bias = np.random.randn(output_size, 1)
+    def __init__(self, input_size, output_size, population = None, dtype = DTYPE):
+        stack = () if population is None else (population,)
+        self.weights = np.random.randn(*stack, output_size, input_size).astype(dtype)
+        self.bias = np.random.randn(*stack, output_size, 1).astype(dtype)
+        self.product = np.dot if population is None else np.matmul
+
+    # Moves the weights and bias into the given flat parameter vector, starting at offset,
+    # and keeps them as views of it. It returns the offset where the next layer should start.
+    # With copy = False the values already in the vector are kept (e.g. when loading saved parameters).
+    # For a population the parameters are a (P, parameters) array, with one member per row.
+    def bind_parameters(self, parameters, offset, copy = True):
+        return self._bind(("weights", "bias"), parameters, offset, copy)
+
+    # Same as bind_parameters for the gradient vector, which has the same layout, and starts at zero.
+    def bind_gradients(self, gradients, offset):
+        self.weights_gradient = np.zeros_like(self.weights)
+        self.bias_gradient = np.zeros_like(self.bias)
+        return self._bind(("weights_gradient", "bias_gradient"), gradients, offset, True)
+
+    def _bind(self, names, vector, offset, copy):
+        for name in names:
+            values = getattr(self, name)
+            size = values.shape[-2] * values.shape[-1]
+            view = vector[..., offset:offset + size].reshape(values.shape)
+            assert np.may_share_memory(view, vector), "Parameters must be a view of the parameter vector"
+            if copy:
+                view[...] = values
+            setattr(self, name, view)
+            offset += size
+        return offset
+
+    # Number of parameters of the layer, or of each member of a population.
+    def num_parameters(self):
+        return self.weights.shape[-2] * self.weights.shape[-1] + self.bias.shape[-2]
 
     def forward(self, input):
         self.input = input
-        return np.dot(self.weights, self.input) + self.bias
+        return self.product(self.weights, self.input) + self.bias
 
-    def backward(self, output_gradient, learning_rate):
-        W_gradient = np.dot(output_gradient, self.input.T)
-        self.weights -= learning_rate * W_gradient
-        self.bias -= learning_rate * output_gradient
-        return np.dot(self.weights.T, output_gradient)
+    # The weight and bias gradients are averaged over the batch, so the learning rate
+    # does not depend on the batch size, and added to the gradient vector. The weights are not changed here:
+    # the optimizer of the Brain updates them all at once. The input gradient is returned per sample.
+    # With accumulate = False only the input gradient is computed.
+    def backward(self, output_gradient, accumulate = True):
+        input_gradient = self.product(np.swapaxes(self.weights, -1, -2), output_gradient)
+        if accumulate:
+            batch_size = output_gradient.shape[-1]
+            self.weights_gradient += self.product(output_gradient, np.swapaxes(self.input, -1, -2)) / batch_size
+            self.bias_gradient += np.sum(output_gradient, axis=-1, keepdims=True) / batch_size
+        return input_gradient
 
 class Activation(Layer):
     def __init__(self, activation, activation_prime):
@@ -36,7 +81,7 @@ class Activation(Layer):
         self.input = input
         return self.activation(self.input)
 
-    def backward(self, output_gradient, learning_rate):
+    def backward(self, output_gradient, accumulate = True):
         return np.multiply(output_gradient, self.activation_prime(self.input))
 
 class Tanh(Activation):
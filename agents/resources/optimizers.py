@@ -0,0 +1,182 @@
+from agents.resources.settings import *
+import numpy as np
+import math
+
+# The optimizers update a flat parameter vector from a flat gradient vector of the same shape, both owned by a Brain.
+#   The Brain's backward only adds the gradients of each batch to its gradient vector,
+#   and the Brain's step calls the optimizer, which updates all the parameters at once, in place.
+#
+#   Every optimizer supports:
+#       -gradient accumulation: the gradients of accumulate calls to step are averaged before the update is applied,
+#        so a large batch can be learned as several smaller ones,
+#       -gradient clipping: if the norm of the gradient vector is larger than clip_norm, it is scaled down to clip_norm
+#        (for a population of Brains, each member's gradients are clipped on their own),
+#       -learning-rate schedules: a function of the number of updates, returning the factor the learning rate is multiplied by.
+#
+#   The state of the optimizer (counters and moment vectors) can be read with get_state and restored with set_state,
+#   so it can be saved with the parameters.
+
+class Optimizer:
+    def __init__(self, learning_rate, clip_norm = GRADIENT_CLIP, accumulate = ACCUMULATION_STEPS, schedule = None, dtype = DTYPE):
+        assert accumulate >= 1, "At least one gradient must be accumulated"
+        self.learning_rate = learning_rate
+        self.dtype = np.dtype(dtype)
+        self.clip_norm = clip_norm
+        self.accumulate = accumulate
+        self.schedule = schedule
+        self.calls = 0
+        self.steps = 0
+
+    # Applies an update if enough gradients were accumulated, and then clears the gradients.
+    # It returns True if the parameters were updated.
+    def step(self, parameters, gradients):
+        self.calls += 1
+        if self.calls % self.accumulate != 0:
+            return False
+
+        if self.accumulate > 1:
+            gradients /= self.accumulate
+        if self.clip_norm is not None:
+            norm = np.sqrt(np.sum(np.square(gradients), axis=-1, keepdims=True))
+            gradients *= np.minimum(1, self.clip_norm / np.maximum(norm, 1e-12)).astype(gradients.dtype)
+
+        learning_rate = float(self.learning_rate)
+        if self.schedule is not None:
+            learning_rate *= self.schedule(self.steps)
+
+        self.steps += 1
+        self.update(parameters, gradients, learning_rate)
+        gradients[...] = 0
+        return True
+
+    def update(self, parameters, gradients, learning_rate):
+        pass
+
+    # The moment vectors, by name, created on the first update
+    def moments(self):
+        return {}
+
+    def get_state(self):
+        state = {"calls": np.array(self.calls), "steps": np.array(self.steps)}
+        state.update(self.moments())
+        return state
+
+    # Zeroed moment vector, created on the first update or when the state is loaded
+    def zeros(self, shape):
+        return np.zeros(shape, dtype=self.dtype)
+
+    def set_state(self, state):
+        self.calls = int(state["calls"])
+        self.steps = int(state["steps"])
+        for name in self.moments():
+            getattr(self, name)[...] = state[name]
+
+
+class SGD(Optimizer):
+    def update(self, parameters, gradients, learning_rate):
+        parameters -= learning_rate * gradients
+
+class Momentum(Optimizer):
+    def __init__(self, learning_rate, momentum = MOMENTUM, **kwargs):
+        super().__init__(learning_rate, **kwargs)
+        self.momentum = momentum
+        self.velocity = None
+
+    def moments(self):
+        return {} if self.velocity is None else {"velocity": self.velocity}
+
+    def set_state(self, state):
+        if "velocity" in state and self.velocity is None:
+            self.velocity = self.zeros(np.shape(state["velocity"]))
+        super().set_state(state)
+
+    def update(self, parameters, gradients, learning_rate):
+        if self.velocity is None:
+            self.velocity = self.zeros(parameters.shape)
+        self.velocity *= self.momentum
+        self.velocity += gradients
+        parameters -= learning_rate * self.velocity
+
+class RMSProp(Optimizer):
+    def __init__(self, learning_rate, decay = RMSPROP_DECAY, epsilon = OPTIMIZER_EPSILON, **kwargs):
+        super().__init__(learning_rate, **kwargs)
+        self.decay = decay
+        self.epsilon = epsilon
+        self.square = None
+
+    def moments(self):
+        return {} if self.square is None else {"square": self.square}
+
+    def set_state(self, state):
+        if "square" in state and self.square is None:
+            self.square = self.zeros(np.shape(state["square"]))
+        super().set_state(state)
+
+    def update(self, parameters, gradients, learning_rate):
+        if self.square is None:
+            self.square = self.zeros(parameters.shape)
+        self.square *= self.decay
+        self.square += (1 - self.decay) * np.square(gradients)
+        parameters -= learning_rate * gradients / (np.sqrt(self.square) + self.epsilon)
+
+class Adam(Optimizer):
+    def __init__(self, learning_rate, betas = ADAM_BETAS, epsilon = OPTIMIZER_EPSILON, **kwargs):
+        super().__init__(learning_rate, **kwargs)
+        self.beta1, self.beta2 = betas
+        self.epsilon = epsilon
+        self.mean = None
+        self.square = None
+
+    def moments(self):
+        return {} if self.mean is None else {"mean": self.mean, "square": self.square}
+
+    def set_state(self, state):
+        if "mean" in state and self.mean is None:
+            self.mean = self.zeros(np.shape(state["mean"]))
+            self.square = self.zeros(np.shape(state["square"]))
+        super().set_state(state)
+
+    def update(self, parameters, gradients, learning_rate):
+        if self.mean is None:
+            self.mean = self.zeros(parameters.shape)
+            self.square = self.zeros(parameters.shape)
+        self.mean *= self.beta1
+        self.mean += (1 - self.beta1) * gradients
+        self.square *= self.beta2
+        self.square += (1 - self.beta2) * np.square(gradients)
+
+        # The bias correction of both moments is folded into the step size
+        step_size = learning_rate * math.sqrt(1 - self.beta2 ** self.steps) / (1 - self.beta1 ** self.steps)
+        parameters -= step_size * self.mean / (np.sqrt(self.square) + self.epsilon)
+
+
+OPTIMIZERS = {
+    "SGD": SGD,
+    "Momentum": Momentum,
+    "RMSProp": RMSProp,
+    "Adam": Adam,
+}
+
+def get_optimizer(name, learning_rate, **kwargs):
+    return OPTIMIZERS[name](learning_rate, **kwargs)
+
+
+# Learning-rate schedules: each returns a function of the number of updates done so far.
+
+def constant_schedule():
+    return lambda step: 1
+
+def step_schedule(every, factor = 0.5):
+    return lambda step: factor ** (step // every)
+
+def exponential_schedule(rate):
+    return lambda step: rate ** step
+
+# Linear warmup for warmup updates, then cosine decay down to minimum (a fraction of the learning rate) at total updates.
+def cosine_schedule(total, warmup = 0, minimum = 0):
+    def schedule(step):
+        if step < warmup:
+            return (step + 1) / warmup
+        progress = min(1, (step - warmup) / max(1, total - warmup))
+        return minimum + (1 - minimum) * 0.5 * (1 + math.cos(math.pi * progress))
+    return schedule
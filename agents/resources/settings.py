@@ -1,9 +1,46 @@
 DISCOUNT_FACTOR = 0.5
-STATE_DIM = 5
-ACTION_DIM = 3
 HIDDEN_DIM = 7
-ACTOR_LEARNING_RATE = 0.0001
-CRITIC_LEARNING_RATE = 0.0001
+ACTOR_LEARNING_RATE = 0.001
+CRITIC_LEARNING_RATE = 0.001
 
 CRITIC_NETWORK = ["Dense", "Tanh", "Dense", "Tanh", "Dense", "Tanh"]
-ACTOR_NETWORK = ["Dense", "Tanh", "Dense", "Tanh", "Dense", "Tanh"]
\ No newline at end of file
+ACTOR_NETWORK = ["Dense", "Tanh", "Dense", "Tanh", "Dense", "Tanh"]
+
+# Target network updates: with TAU = None the targets are a hard copy of the networks every
+# TARGET_UPDATE_INTERVAL learning steps, otherwise they are blended towards them by TAU every step.
+TARGET_UPDATE_INTERVAL = 1
+TAU = None
+
+# STATE_DIM, ACTION_DIM and DTYPE, the sizes and the floating point type of the states and actions,
+# are shared with the environments, in resources/settings.py.
+from resources.settings import STATE_DIM, ACTION_DIM, DTYPE
+
+# Optimizer settings: OPTIMIZER is one of "SGD", "Momentum", "RMSProp" or "Adam".
+# With GRADIENT_CLIP the gradient vector of each network is scaled down to that norm,
+# and the gradients of ACCUMULATION_STEPS learning steps are averaged into one update.
+OPTIMIZER = "Adam"
+GRADIENT_CLIP = 1.0
+ACCUMULATION_STEPS = 1
+MOMENTUM = 0.9
+RMSPROP_DECAY = 0.9
+ADAM_BETAS = (0.9, 0.999)
+OPTIMIZER_EPSILON = 1e-8
+
+# Prioritized replay settings
+PRIORITY_ALPHA = 0.6
+PRIORITY_BETA = 0.4
+PRIORITY_EPSILON = 1e-6
+
+# Version of the checkpoint format written by Agent.save
+CHECKPOINT_VERSION = 1
+
+# Disk replay buffer settings (see agents/replay.py): learning starts once REPLAY_WARMUP experiences are stored,
+# and every batch is sampled from REPLAY_CHUNKS_PER_BATCH random chunks of REPLAY_CHUNK_SIZE consecutive experiences.
+REPLAY_WARMUP = 1000
+REPLAY_CHUNK_SIZE = 4096
+REPLAY_CHUNKS_PER_BATCH = 4
+REPLAY_VERSION = 1
+
+# Rollout workers (see agents/rollout.py): seconds between two checks of a worker waiting for free slots,
+# or of the learner waiting for new transitions in drain
+ROLLOUT_POLL_INTERVAL = 0.0001
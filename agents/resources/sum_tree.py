@@ -0,0 +1,45 @@
+import numpy as np
+
+# The SumTree class stores one priority per slot of the replay buffer in a binary tree,
+# where every node holds the sum of its two children and the root holds the total.
+#
+#   The tree is kept in a flat array: node 1 is the root, and the children of node i are 2i and 2i + 1.
+#   The leaves start at index self.leaves (the capacity rounded up to a power of 2).
+#
+#   Updating a priority and finding the slot for a given cumulative value both take O(log n),
+#   and both are done for a whole batch of slots at once, one tree level per NumPy operation.
+
+class SumTree:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.depth = max(1, int(np.ceil(np.log2(capacity))))
+        self.leaves = 2 ** self.depth
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    # Sets the priorities of the given slots and updates the sums above them, level by level.
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices, dtype=np.int64) + self.leaves]
+
+    # Given an array of values between 0 and the total, it walks down the tree for all of them at once:
+    #   if the value is larger than the sum of the left child, it goes right and subtracts that sum.
+    # It returns the slot index reached by each value.
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values -= np.where(go_right, left_sum, 0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.leaves, self.capacity - 1)
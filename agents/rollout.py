@@ -0,0 +1,290 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import time
+
+from agents.AI import Brain
+from agents.resources import *
+from resources import *
+from envs.pod_racing import RaceTrackEnv
+from envs.vector_pod_racing import VectorRaceTrackEnv
+from envs.resources.functions import scale_actions
+
+# The SharedArray class is a NumPy array living in a block of shared memory.
+#   The process that creates it owns the memory and unlinks it on close.
+#   When it is sent to another process only the name, shape and dtype are pickled,
+#   and the other process attaches to the same memory, so nothing is copied afterwards.
+
+class SharedArray:
+    def __init__(self, shape, dtype = np.float64, name = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        if self.owner:
+            size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            # Only the owner should unlink the memory, so the attaching process stops tracking it.
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+        if self.owner:
+            self.array[...] = 0
+
+    def __reduce__(self):
+        return (SharedArray, (self.shape, self.dtype.str, self.memory.name))
+
+    def close(self):
+        self.array = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# The RolloutWorkers class runs num_workers processes that play races with copies of the actors,
+# while the main process (the learner) trains them.
+#
+#   Each worker steps its own RaceTrackEnv, or a VectorRaceTrackEnv with num_envs races if num_envs is given,
+#   using an epsilon-greedy strategy: epsilon starts at EPSILON on each race and goes down by epsilon_decay each step.
+#
+#   Every step of a worker fills one slot of its ring of shared arrays (states, actions, rewards, next_states, dones),
+#   each slot holding the transitions of all its races and players, along with ended, whether each race ended on that step
+#   (at max_steps too), and laps, the number of laps each player completed in it.
+#   The workers count the slots they wrote, and the learner counts the slots it read, so a worker waits instead of
+#   overwriting slots that were not read yet.
+#
+#   The learner calls drain to move all new transitions into the agents' memory buffers, and to record the reward,
+#   length and laps of every finished race in the agents' metrics, as Agent.end_episode does,
+#   and publish to copy the actors' parameters into shared memory. The workers check the weights
+#   version every step and load the new parameters when they change (see read_weights). The version is odd while
+#   the learner is writing, so a worker never loads half-written weights.
+
+class RolloutWorkers:
+    def __init__(self, num_workers, actors, num_envs = None, num_bots = 0, slots = 1024,
+                 epsilon = EPSILON, epsilon_decay = EPSILON_DECAY, max_steps = 500, seed = 0):
+        self.num_workers = num_workers
+        self.num_players = len(actors)
+        self.num_envs = num_envs
+        self.num_bots = num_bots
+        self.slots = slots
+        self.epsilon = epsilon
+        self.epsilon_decay = epsilon_decay
+        self.max_steps = max_steps
+        self.seed = seed
+
+        races = 1 if num_envs is None else num_envs
+        shape = (num_workers, slots, races, self.num_players)
+        self.shared = {
+            "states": SharedArray(shape + (STATE_DIM,), DTYPE),
+            "actions": SharedArray(shape + (ACTION_DIM,), DTYPE),
+            "rewards": SharedArray(shape, DTYPE),
+            "next_states": SharedArray(shape + (STATE_DIM,), DTYPE),
+            "dones": SharedArray(shape, DTYPE),
+            "ended": SharedArray(shape[:3], np.int8),
+            "laps": SharedArray(shape, DTYPE),
+            "written": SharedArray((num_workers,), np.int64),
+            "read": SharedArray((num_workers,), np.int64),
+            "weights": SharedArray((self.num_players, actors[0].parameters.size), actors[0].dtype),
+            "version": SharedArray((1,), np.int64),
+            "stop": SharedArray((1,), np.int64),
+        }
+        self.arrays = {name: shared.array for name, shared in self.shared.items()}
+        self.processes = []
+        self.publish(actors)
+
+        # Reward and length of the race each worker is playing, up to the last slot drained
+        self.episode_rewards = np.zeros((num_workers, races, self.num_players))
+        self.episode_lengths = np.zeros((num_workers, races), dtype=np.int64)
+
+    # Only the shared arrays travel to the worker processes, which attach to them by name.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["arrays"] = {}
+        state["processes"] = []
+        return state
+
+    def start(self):
+        # Forking is much faster to start and does not re-import the main script, so it is used where available.
+        methods = mp.get_all_start_methods()
+        context = mp.get_context("fork" if "fork" in methods else "spawn")
+        for index in range(self.num_workers):
+            process = context.Process(target=_rollout_worker, args=(index, self, self.seed + index), daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    # Copies the parameters of the actors (one per player) into shared memory for the workers.
+    def publish(self, actors):
+        version = self.arrays["version"]
+        version[0] += 1
+        for i, actor in enumerate(actors):
+            self.arrays["weights"][i] = actor.parameters
+        version[0] += 1
+
+    # Moves every transition written since the last call into the memory of each agent (one per player).
+    # If there is none, it waits up to timeout seconds for the workers to write some, sleeping between checks.
+    # It returns the number of transitions moved.
+    def drain(self, agents, timeout = 0):
+        total = 0
+        written = self.arrays["written"]
+        read = self.arrays["read"]
+        deadline = time.perf_counter() + timeout
+        while np.array_equal(written, read) and time.perf_counter() < deadline:
+            time.sleep(ROLLOUT_POLL_INTERVAL)
+
+        for index in range(self.num_workers):
+            start, end = read[index], written[index]
+            if end == start:
+                continue
+            slots = np.arange(start, end) % self.slots
+
+            for i, agent in enumerate(agents):
+                rewards = self.arrays["rewards"][index, slots, :, i]
+                agent.memory.add_batch(self.arrays["states"][index, slots, :, i],
+                                       self.arrays["actions"][index, slots, :, i],
+                                       rewards,
+                                       self.arrays["next_states"][index, slots, :, i],
+                                       self.arrays["dones"][index, slots, :, i])
+                agent.rewards += float(rewards.sum())
+                total += rewards.size
+
+            self._end_episodes(index, slots, agents)
+            read[index] = end
+        return total
+
+    # Records the races of the worker that ended in the given slots in the agents' metrics,
+    # and adds the rest of the slots to the races still being played.
+    def _end_episodes(self, index, slots, agents):
+        cumulative = np.cumsum(self.arrays["rewards"][index, slots], axis=0)
+        ended = self.arrays["ended"][index, slots]
+        laps = self.arrays["laps"][index, slots]
+
+        for race in range(ended.shape[1]):
+            previous = -1
+            for slot in np.flatnonzero(ended[:, race]):
+                rewards = self.episode_rewards[index, race] + cumulative[slot, race]
+                if previous >= 0:
+                    rewards -= cumulative[previous, race]
+                length = self.episode_lengths[index, race] + slot - previous
+                for i, agent in enumerate(agents):
+                    agent.metrics.add("episode_reward", rewards[i])
+                    agent.metrics.add("episode_length", length)
+                    agent.metrics.add("laps", laps[slot, race, i])
+                self.episode_rewards[index, race] = 0
+                self.episode_lengths[index, race] = 0
+                previous = slot
+
+            self.episode_rewards[index, race] += cumulative[-1, race]
+            if previous >= 0:
+                self.episode_rewards[index, race] -= cumulative[previous, race]
+            self.episode_lengths[index, race] += len(slots) - 1 - previous
+
+    # Total number of environment steps taken by all workers.
+    def steps(self):
+        return int(self.arrays["written"].sum())
+
+    def close(self):
+        self.arrays["stop"][0] = 1
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.arrays = {}
+        for shared in self.shared.values():
+            shared.close()
+
+
+# Copies the weights published in the shared arrays into out, if a complete version other than version is there.
+# The version is read again after the copy: if the weights were published again meanwhile, the copy can mix
+# two versions and is dropped. It returns the version copied, or None if out must not be used.
+def read_weights(arrays, out, version):
+    published = arrays["version"][0]
+    if published == version or published % 2 != 0:
+        return None
+    out[...] = arrays["weights"]
+    if arrays["version"][0] != published:
+        return None
+    return published
+
+def _rollout_worker(index, workers, seed):
+    np.random.seed(seed)
+    arrays = {name: shared.array for name, shared in workers.shared.items()}
+    num_players = workers.num_players
+    races = 1 if workers.num_envs is None else workers.num_envs
+
+    actors = [Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE) for _ in range(num_players)]
+    policies = [actor.freeze() for actor in actors]
+    actions = np.empty((races, num_players, ACTION_DIM), dtype=DTYPE)
+    laps = np.zeros((races, num_players), dtype=DTYPE)
+    weights = np.empty_like(arrays["weights"])
+    version = -1
+
+    if workers.num_envs is None:
+        env = RaceTrackEnv(num_players = num_players, num_bots = workers.num_bots, normalized = True, dtype = DTYPE)
+        observations, info = env.reset()
+        states = observations[None].copy()
+        steps = 0
+    else:
+        env = VectorRaceTrackEnv(workers.num_envs, num_players, workers.num_bots, max_steps = workers.max_steps)
+        observations, info = env.reset()
+        states = normalize_observations(observations, DTYPE)
+    epsilon = np.full(races, workers.epsilon)
+
+    while not arrays["stop"][0]:
+        # Load new weights once a complete version was copied
+        published = read_weights(arrays, weights, version)
+        if published is not None:
+            for i, actor in enumerate(actors):
+                actor.set_parameters(weights[i])
+                policies[i].refresh()
+            version = published
+
+        # Wait for the learner if every slot is still unread
+        slot_count = arrays["written"][index]
+        if slot_count - arrays["read"][index] >= workers.slots:
+            time.sleep(ROLLOUT_POLL_INTERVAL)
+            continue
+
+        for i, policy in enumerate(policies):
+            actions[:, i] = policy.act_batch(states[:, i])
+        explore = np.random.random(races) < epsilon
+        actions[explore] = np.random.uniform(low=-1, high=1, size=(np.count_nonzero(explore), num_players, ACTION_DIM))
+        epsilon = np.maximum(epsilon - workers.epsilon_decay, 0)
+
+        if workers.num_envs is None:
+            observations, rewards, terminated, info = env.step(actions[0])
+            next_states = observations[None].copy()
+            rewards = np.array(rewards)[None]
+            steps += 1
+            done = np.array([terminated])
+            ended = np.array([terminated or steps >= workers.max_steps])
+            if ended[0]:
+                laps[0] = info["laps"]
+                observations, info = env.reset()
+                new_states = observations[None].copy()
+                steps = 0
+                epsilon[:] = workers.epsilon
+            else:
+                new_states = next_states
+        else:
+            observations, rewards, dones, info = env.step(scale_actions(actions))
+            next_states = normalize_observations(info["final_observation"], DTYPE)
+            new_states = normalize_observations(observations, DTYPE)
+            done = info["terminated"]
+            ended = dones
+            laps[:] = info["laps"]
+            epsilon[dones] = workers.epsilon
+
+        slot = slot_count % workers.slots
+        arrays["states"][index, slot] = states
+        arrays["actions"][index, slot] = actions
+        arrays["rewards"][index, slot] = rewards
+        arrays["next_states"][index, slot] = next_states
+        arrays["dones"][index, slot] = done[:, None]
+        arrays["ended"][index, slot] = ended
+        arrays["laps"][index, slot] = laps
+        arrays["written"][index] = slot_count + 1
+
+        states = new_states
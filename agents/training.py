@@ -0,0 +1,76 @@
+import numpy as np
+
+from agents.resources import *
+from resources import *
+from resources.profiler import profiler
+
+# The local training loop, used by python main.py train and by the sweep trials, so a sweep scores the same training.
+#
+#   Every epoch is one race of env, from its reset, of at most steps_per_epoch steps. On every step each agent
+#   (or every member of the population) plays a random action with probability eps, which starts at epsilon
+#   and goes down by epsilon_decay every step, and otherwise the action of its actor. Then they all learn from the step,
+#   with done set if the race ended: a race cut at steps_per_epoch is not done, so its last state is still bootstrapped.
+#
+#   At the end of the race the episode and the laps completed are recorded in the metrics (see Agent.end_episode),
+#   and end_epoch(epoch, rewards) is called with the total reward of every agent in the race.
+#   If it returns True, the training stops after that epoch.
+def train_epochs(env, agents, start_epoch, epochs, steps_per_epoch, batch_size, population = None,
+                 epsilon = EPSILON, epsilon_decay = EPSILON_DECAY, end_epoch = None, verbose = True):
+    actions = np.zeros((len(agents), ACTION_DIM), dtype=DTYPE)
+
+    for e in range(start_epoch, epochs):
+        eps = epsilon
+        done = False
+        states, info = env.reset()
+        # The environment writes every step into the same states array, so the previous states are copied here
+        prev_states = np.empty_like(states)
+        totals = np.zeros(len(agents))
+        steps = 0
+
+        if verbose:
+            print("Epoch: " + str(e))
+        profiler.epoch(e)
+
+        while not done:
+            # Given the array of states, fill the array of actions, with the action for each agent.
+            with profiler.phase("agent.forward"):
+                if population is not None:
+                    actions[:] = population.forward(states)
+                    explore = np.random.random(len(agents)) < eps
+                    actions[explore] = np.random.uniform(low=-1, high= 1, size=(np.count_nonzero(explore), ACTION_DIM))
+                else:
+                    for i, agent in enumerate(agents):
+                        if np.random.random() < eps:
+                            actions[i] = np.random.uniform(low=-1, high= 1, size=(ACTION_DIM,))
+                        else:
+                            actions[i] = agent.forward(states[i:i+1].T)[:, 0]
+
+            # Given the array of actions, return the array of states and the rewards.
+            with profiler.phase("env.step"):
+                prev_states[:] = states
+                states, rewards, done, info = env.step(actions)
+                totals += rewards
+
+            with profiler.phase("agent.learn"):
+                if population is not None:
+                    population.learn(prev_states, actions, np.array(rewards), states, batch_size, done)
+                else:
+                    for i, agent in enumerate(agents):
+                        agent.learn(prev_states[i], actions[i], rewards[i], states[i], batch_size, done)
+
+            profiler.count("steps")
+            steps += 1
+            if steps >= steps_per_epoch:
+                done = True
+
+            if eps > 0:
+                eps -= epsilon_decay
+
+        laps = np.array(info["laps"])
+        if population is not None:
+            population.end_episode(laps)
+        else:
+            for i, agent in enumerate(agents):
+                agent.end_episode(laps[i])
+        if end_epoch is not None and end_epoch(e, totals):
+            break
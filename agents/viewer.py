@@ -0,0 +1,129 @@
+import multiprocessing as mp
+import numpy as np
+import time
+
+from agents.AI import Brain
+from agents.rollout import SharedArray, read_weights
+from agents.resources import *
+from envs.pod_racing import RaceTrackEnv
+
+# The LiveViewer class plays races with the latest actors in a separate process, with its own pygame window,
+# so the training can be watched while it runs.
+#
+#   The trainer calls publish to copy the actors' parameters into shared memory, which only copies the arrays
+#   and never waits for the viewer. As with the RolloutWorkers, the weights version is odd while it is being written,
+#   and the viewer loads the new parameters at the start of its next race, once a complete version is copied (see read_weights).
+#
+#   The viewer plays one step every frame_budget seconds (1 / render_fps by default).
+#   With skip_frames, a step that is already late when it is simulated is not drawn, so the race keeps its real speed
+#   even if drawing is slower than the budget. Without it every step is drawn and the race slows down instead.
+
+class LiveViewer:
+    def __init__(self, actors, num_bots = 1, num_laps = 3, render_fps = 20, frame_budget = None, skip_frames = True,
+                 max_steps = 1000, track = None):
+        self.num_players = len(actors)
+        self.num_bots = num_bots
+        self.num_laps = num_laps
+        self.frame_budget = 1 / render_fps if frame_budget is None else frame_budget
+        self.skip_frames = skip_frames
+        self.max_steps = max_steps
+        self.track = track
+
+        self.shared = {
+            "weights": SharedArray((self.num_players, actors[0].parameters.size), actors[0].dtype),
+            "version": SharedArray((1,), np.int64),
+            "stop": SharedArray((1,), np.int64),
+            # Number of steps drawn and skipped by the viewer
+            "frames": SharedArray((2,), np.int64),
+        }
+        self.arrays = {name: shared.array for name, shared in self.shared.items()}
+        self.process = None
+        self.publish(actors)
+
+    # Only the shared arrays travel to the viewer process, which attaches to them by name.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["arrays"] = {}
+        state["process"] = None
+        return state
+
+    def start(self):
+        methods = mp.get_all_start_methods()
+        context = mp.get_context("fork" if "fork" in methods else "spawn")
+        self.process = context.Process(target=_viewer, args=(self,), daemon=True)
+        self.process.start()
+
+    # Copies the parameters of the actors (one per player) into shared memory for the viewer.
+    def publish(self, actors):
+        version = self.arrays["version"]
+        version[0] += 1
+        for i, actor in enumerate(actors):
+            self.arrays["weights"][i] = actor.parameters
+        version[0] += 1
+
+    # Returns the number of steps the viewer drew and skipped.
+    def frames(self):
+        drawn, skipped = self.arrays["frames"]
+        return int(drawn), int(skipped)
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def close(self):
+        self.arrays["stop"][0] = 1
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
+        self.arrays = {}
+        for shared in self.shared.values():
+            shared.close()
+
+
+def _viewer(viewer):
+    arrays = {name: shared.array for name, shared in viewer.shared.items()}
+    actors = [Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE) for _ in range(viewer.num_players)]
+    policies = [actor.freeze() for actor in actors]
+    actions = np.zeros((viewer.num_players, ACTION_DIM), dtype=DTYPE)
+    weights = np.empty_like(arrays["weights"])
+    version = -1
+
+    env = RaceTrackEnv(num_players = viewer.num_players, num_bots = viewer.num_bots, num_laps = viewer.num_laps,
+                       track = viewer.track, normalized = True, dtype = DTYPE)
+    done = True
+    deadline = time.perf_counter()
+
+    while not arrays["stop"][0]:
+        if done:
+            # New weights are only loaded between races
+            published = read_weights(arrays, weights, version)
+            if published is not None:
+                for i, actor in enumerate(actors):
+                    actor.set_parameters(weights[i])
+                    policies[i].refresh()
+                version = published
+            states, info = env.reset()
+            steps = 0
+
+        for i, policy in enumerate(policies):
+            actions[i] = policy.act(states[i])
+        states, rewards, done, info = env.step(actions)
+        steps += 1
+        done = done or steps >= viewer.max_steps
+
+        deadline += viewer.frame_budget
+        if viewer.skip_frames and time.perf_counter() > deadline:
+            arrays["frames"][1] += 1
+            continue
+
+        env.show()
+        arrays["frames"][0] += 1
+
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif not viewer.skip_frames:
+            deadline = time.perf_counter()
+
+    env.close()
@@ -0,0 +1 @@
+from benchmarks.runner import *
@@ -0,0 +1,5 @@
+from benchmarks.runner import main
+
+# Runs the benchmark suite, see main in benchmarks/runner.py for the options.
+
+main()
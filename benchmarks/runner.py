@@ -0,0 +1,107 @@
+import numpy as np
+import platform
+import argparse
+import time
+import json
+import sys
+
+# The runner of the benchmark suite: it times the benchmarks of benchmarks/suite.py, writes and compares their results.
+# The suite imports the agents and the environments, so it is only loaded when the benchmarks are run.
+
+# Calls the operation in rounds of increasing size until a round lasts at least min_time,
+# then times repeats rounds of that size and keeps the fastest one.
+# It returns the mean time of one call, in seconds.
+def measure(operation, min_time = 0.05, repeats = 5):
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation()
+        best = min(best, time.perf_counter() - start)
+    return best / calls
+
+# Runs the benchmarks whose name contains any of the given filters (all of them if there are none),
+# and returns the results in the format written to JSON.
+def run(filters = None, min_time = 0.05, repeats = 5, verbose = True):
+    from benchmarks.suite import BENCHMARKS
+
+    results = {}
+    for name, (function, argument) in BENCHMARKS.items():
+        if filters and not any(pattern in name for pattern in filters):
+            continue
+        operation, items = function(argument)
+        seconds = measure(operation, min_time, repeats)
+        results[name] = {"seconds": seconds, "per_second": items / seconds}
+        if verbose:
+            print("{:<30} {:>14.1f} /s {:>12.2f} us".format(name, items / seconds, seconds * 1e6))
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+# Compares the results with a baseline, and returns the names of the benchmarks
+# that are slower than the baseline by more than threshold (0.1 is 10% fewer items per second).
+def compare(results, baseline, threshold = 0.1, verbose = True):
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        change = result["per_second"] / baseline["results"][name]["per_second"] - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(name)
+        if verbose:
+            print("{:<30} {:>+8.1%}{}".format(name, change, "  REGRESSION" if regressed else ""))
+    return regressions
+
+def save(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=4)
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+# The command line of the suite, used by python -m benchmarks and python main.py bench:
+#
+#   python -m benchmarks                                  runs everything and prints the results
+#   python -m benchmarks env_step agent_learn             runs only the benchmarks whose name contains one of the words
+#   python -m benchmarks --output results.json            also writes the results to a JSON file
+#   python -m benchmarks --compare baseline.json          compares with a stored baseline, and exits with 1 on regressions
+def main(argv = None, prog = "python -m benchmarks"):
+    parser = argparse.ArgumentParser(prog=prog)
+    parser.add_argument("filters", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression (default 0.1)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum duration of each timed round, in seconds")
+    parser.add_argument("--repeats", type=int, default=5, help="number of timed rounds per benchmark")
+    args = parser.parse_args(argv)
+
+    results = run(args.filters, args.min_time, args.repeats)
+
+    if args.output:
+        save(results, args.output)
+
+    if args.compare:
+        print()
+        regressions = compare(results, load(args.compare), args.threshold)
+        if regressions:
+            print(str(len(regressions)) + " regression(s)")
+            sys.exit(1)
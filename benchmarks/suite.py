@@ -0,0 +1,168 @@
+import numpy as np
+import subprocess
+import tempfile
+import sys
+import os
+
+from agents.AI import Agent, Brain, ReplayBuffer
+from agents.population import Population
+from agents.replay import DiskReplayBuffer
+from agents.resources import *
+from envs.pod_racing import RaceTrackEnv
+from envs.lookahead import LookaheadBot
+from envs.resources.settings import LOOKAHEAD_HORIZON
+from resources import *
+
+# Each benchmark is a function that prepares what it needs and returns (operation, items):
+#   operation is called repeatedly by measure, and items is how many things one call processes
+#   (steps, samples, transitions...), so the results can be compared as items per second.
+#
+# BENCHMARKS maps the name of every benchmark to its function and arguments.
+
+def bench_env_step(num_pods):
+    env = RaceTrackEnv(num_players = 1, num_bots = num_pods - 1)
+    env.reset()
+    action = [[8000, 4500, 100]]
+
+    def operation():
+        observations, rewards, terminated, info = env.step(action)
+        if terminated:
+            env.reset()
+    return operation, 1
+
+def bench_env_step_normalized(num_pods):
+    env = RaceTrackEnv(num_players = 1, num_bots = num_pods - 1, normalized = True)
+    env.reset()
+    action = np.zeros((1, ACTION_DIM))
+
+    def operation():
+        observations, rewards, terminated, info = env.step(action)
+        if terminated:
+            env.reset()
+    return operation, 1
+
+def bench_env_state(num_pods):
+    env = RaceTrackEnv(num_players = 1, num_bots = num_pods - 1)
+    env.reset()
+    state = env.get_state()
+
+    def operation():
+        env.get_state(state)
+        env.set_state(state)
+    return operation, 1
+
+def bench_env_simulate(rollouts):
+    env = RaceTrackEnv(num_players = 1, num_bots = 1)
+    env.reset()
+    actions = np.full((rollouts, LOOKAHEAD_HORIZON, 1, 3), np.nan)
+    return (lambda: env.simulate(actions)), rollouts * LOOKAHEAD_HORIZON
+
+def bench_lookahead_act(num_pods):
+    env = RaceTrackEnv(num_players = 1, num_bots = num_pods - 1)
+    env.reset()
+    bot = LookaheadBot(env)
+    return bot.act, 1
+
+def bench_brain_forward(batch_size):
+    brain = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE)
+    states = np.random.random((STATE_DIM, batch_size)).astype(DTYPE)
+    return (lambda: brain.forward(states)), batch_size
+
+def bench_policy_act(batch_size):
+    policy = Brain(STATE_DIM, ACTION_DIM, HIDDEN_DIM, ACTOR_NETWORK, ACTOR_LEARNING_RATE).freeze()
+    states = np.random.random((batch_size, STATE_DIM)).astype(DTYPE)
+    if batch_size == 1:
+        return (lambda: policy.act(states[0])), 1
+    return (lambda: policy.act_batch(states)), batch_size
+
+def bench_agent_learn(batch_size):
+    agent = Agent(buffer_size = max(1000, batch_size))
+    for _ in range(agent.memory.buffer_size):
+        agent.memory.add_experience(np.random.random(STATE_DIM), np.random.uniform(-1, 1, ACTION_DIM),
+                                    np.random.random(), np.random.random(STATE_DIM))
+    return (lambda: agent.update(batch_size)), 1
+
+def bench_population_learn(size):
+    population = Population(size)
+    for _ in range(population.memory.buffer_size):
+        population.memory.add_experience(np.random.random((size, STATE_DIM)), np.random.uniform(-1, 1, (size, ACTION_DIM)),
+                                         np.random.random(size), np.random.random((size, STATE_DIM)))
+    return (lambda: population.update(100)), size
+
+def bench_replay_add(buffer_size):
+    memory = ReplayBuffer(buffer_size)
+    state, action = np.random.random((STATE_DIM, 1)), np.random.uniform(-1, 1, ACTION_DIM)
+    return (lambda: memory.add_experience(state, action, 1.0, state)), 1
+
+def bench_replay_sample(batch_size):
+    memory = ReplayBuffer(100000)
+    memory.add_batch(np.random.random((100000, STATE_DIM)), np.random.random((100000, ACTION_DIM)),
+                     np.random.random(100000), np.random.random((100000, STATE_DIM)), np.zeros(100000))
+    return (lambda: memory.sample_batch(batch_size)), batch_size
+
+# The disk buffers live in a temporary directory, removed with the buffer when the benchmark is done
+def disk_replay(buffer_size):
+    directory = tempfile.TemporaryDirectory()
+    memory = DiskReplayBuffer(os.path.join(directory.name, "replay"), buffer_size)
+    memory.directory = directory
+    return memory
+
+def bench_disk_replay_add(buffer_size):
+    memory = disk_replay(buffer_size)
+    state, action = np.random.random((STATE_DIM, 1)), np.random.uniform(-1, 1, ACTION_DIM)
+    return (lambda: memory.add_experience(state, action, 1.0, state)), 1
+
+def bench_disk_replay_sample(batch_size):
+    memory = disk_replay(1000000)
+    memory.add_batch(np.random.random((1000000, STATE_DIM)), np.random.random((1000000, ACTION_DIM)),
+                     np.random.random(1000000), np.random.random((1000000, STATE_DIM)), np.zeros(1000000))
+    return (lambda: memory.sample_batch(batch_size)), batch_size
+
+def bench_normalize_state(num_players):
+    observations = [[(12000, 1990)] * num_players, [(10680, 4990)] * num_players]
+    return (lambda: normalize_state(observations)), num_players
+
+def bench_normalize_action(num_players):
+    actions = [np.random.uniform(-1, 1, ACTION_DIM) for _ in range(num_players)]
+    return (lambda: normalize_action([action.copy() for action in actions])), num_players
+
+# Starts a new interpreter that only imports the module, as a worker process does when it is spawned.
+def bench_import(module):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-c", "import " + module]
+    return (lambda: subprocess.run(command, cwd=root, check=True)), 1
+
+BENCHMARKS = {
+    "env_step/pods=1": (bench_env_step, 1),
+    "env_step/pods=8": (bench_env_step, 8),
+    "env_step/pods=64": (bench_env_step, 64),
+    "env_step_normalized/pods=1": (bench_env_step_normalized, 1),
+    "env_step_normalized/pods=8": (bench_env_step_normalized, 8),
+    "env_state/pods=2": (bench_env_state, 2),
+    "env_state/pods=8": (bench_env_state, 8),
+    "env_simulate/rollouts=1": (bench_env_simulate, 1),
+    "env_simulate/rollouts=256": (bench_env_simulate, 256),
+    "lookahead_act/pods=2": (bench_lookahead_act, 2),
+    "brain_forward/batch=1": (bench_brain_forward, 1),
+    "brain_forward/batch=32": (bench_brain_forward, 32),
+    "brain_forward/batch=256": (bench_brain_forward, 256),
+    "policy_act/batch=1": (bench_policy_act, 1),
+    "policy_act/batch=32": (bench_policy_act, 32),
+    "policy_act/batch=256": (bench_policy_act, 256),
+    "agent_learn/batch=32": (bench_agent_learn, 32),
+    "agent_learn/batch=100": (bench_agent_learn, 100),
+    "agent_learn/batch=256": (bench_agent_learn, 256),
+    "population_learn/size=1": (bench_population_learn, 1),
+    "population_learn/size=64": (bench_population_learn, 64),
+    "replay_add/size=100000": (bench_replay_add, 100000),
+    "replay_sample/batch=100": (bench_replay_sample, 100),
+    "replay_sample/batch=1024": (bench_replay_sample, 1024),
+    "disk_replay_add/size=100000": (bench_disk_replay_add, 100000),
+    "disk_replay_sample/batch=256": (bench_disk_replay_sample, 256),
+    "normalize_state/players=1": (bench_normalize_state, 1),
+    "normalize_state/players=8": (bench_normalize_state, 8),
+    "normalize_action/players=1": (bench_normalize_action, 1),
+    "normalize_action/players=8": (bench_normalize_action, 8),
+    "import/envs.pod_racing": (bench_import, "envs.pod_racing"),
+    "import/agents.rollout": (bench_import, "agents.rollout"),
+}
@@ -0,0 +1,166 @@
+import numpy as np
+import threading
+import zipfile
+import struct
+import queue
+import glob
+import zlib
+import os
+
+# The FrameCapture class wraps a RaceTrackEnv and saves pictures of the race, as the window shows them, into a directory.
+#
+#   On every reset and every `every` steps, the race is drawn by the environment's Rasterizer (in any render mode),
+#   downscaled by keeping one pixel out of `downscale` in both directions, copied and put in a queue.
+#   A background thread takes the frames from the queue and writes them:
+#       -format "npz": in chunks of chunk_size frames, as compressed NumPy archives frames_00000.npz, frames_00001.npz...
+#        each with "frames" (frames, height, width, 3), and the "ticks" and "episodes" the frames were taken at,
+#       -format "png": one file per frame, frame_000000.png, frame_000001.png... numbered by tick.
+#   As in the TrajectoryRecorder, every reset and every step is a tick, counted from the start of the capture.
+#   The compression runs in the thread (zlib releases the GIL), so the simulation only pays for drawing and copying the frame.
+#   compress_level is the zlib level of both formats, 1 by default, the fastest, which is what keeps the writer up with the race.
+#
+#   The queue holds at most queue_size frames, so the memory used stays the same however long the race is.
+#   If the writer falls behind and the queue is full, the frame is dropped (and counted in self.dropped),
+#   so the simulation never waits, unless block is True, which waits for room in the queue and never drops a frame.
+#
+#   Everything else is passed through to the wrapped environment.
+
+class FrameCapture:
+    def __init__(self, env, path, format = "npz", every = 1, downscale = 1, chunk_size = 100, queue_size = 32, block = False,
+                 compress_level = 1):
+        assert format in ("npz", "png"), "Unknown capture format " + str(format)
+        assert every >= 1 and downscale >= 1, "every and downscale must be at least 1"
+        self.env = env
+        self.path = path
+        self.format = format
+        self.every = every
+        self.downscale = downscale
+        self.chunk_size = chunk_size
+        self.block = block
+        self.compress_level = compress_level
+
+        self.ticks = 0
+        self.episodes = -1
+        self.steps = 0
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+
+        os.makedirs(path, exist_ok = True)
+        self.queue = queue.Queue(maxsize = queue_size)
+        self.thread = threading.Thread(target = self._writer, daemon = True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def reset(self, **kwargs):
+        observations, info = self.env.reset(**kwargs)
+        self.episodes += 1
+        self.steps = 0
+        self.capture()
+        self.ticks += 1
+        return observations, info
+
+    def step(self, actions):
+        observations, rewards, terminated, info = self.env.step(actions)
+        self.steps += 1
+        if self.steps % self.every == 0 or terminated:
+            self.capture()
+        self.ticks += 1
+        return observations, rewards, terminated, info
+
+    # Draws the current state of the race and sends it to the writer. It returns False if the frame was dropped.
+    def capture(self):
+        if self.error is not None:
+            raise self.error
+
+        frame = self.env.frame()
+        if self.downscale > 1:
+            frame = frame[::self.downscale, ::self.downscale]
+        item = (self.ticks, self.episodes, np.array(frame))
+
+        try:
+            self.queue.put(item, block = self.block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.captured += 1
+        return True
+
+    # Waits until every captured frame is written, writes the last chunk and closes the wrapped environment.
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.env.close()
+        if self.error is not None:
+            raise self.error
+
+    def _writer(self):
+        chunk = None
+        used = 0
+        chunks = 0
+        ticks = np.zeros(self.chunk_size, dtype=np.int64)
+        episodes = np.zeros(self.chunk_size, dtype=np.int64)
+
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                tick, episode, frame = item
+
+                if self.format == "png":
+                    write_png(os.path.join(self.path, "frame_{:06d}.png".format(tick)), frame, self.compress_level)
+                    self.written += 1
+                    continue
+
+                if chunk is None:
+                    chunk = np.zeros((self.chunk_size,) + frame.shape, dtype=frame.dtype)
+                chunk[used], ticks[used], episodes[used] = frame, tick, episode
+                used += 1
+                if used == self.chunk_size:
+                    self._save_chunk(chunks, chunk, ticks, episodes, used)
+                    chunks += 1
+                    used = 0
+
+            if used:
+                self._save_chunk(chunks, chunk, ticks, episodes, used)
+        except Exception as error:
+            self.error = error
+            # Keep emptying the queue, so a blocking capture does not wait forever
+            while self.queue.get() is not None:
+                pass
+
+    # Same as np.savez_compressed, with the compression level of the capture
+    def _save_chunk(self, index, chunk, ticks, episodes, used):
+        path = os.path.join(self.path, "frames_{:05d}.npz".format(index))
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel = self.compress_level) as archive:
+            for name, array in (("frames", chunk[:used]), ("ticks", ticks[:used]), ("episodes", episodes[:used])):
+                with archive.open(name + ".npy", "w", force_zip64 = True) as file:
+                    np.lib.format.write_array(file, array)
+        self.written += used
+
+
+# Returns the frames saved by a FrameCapture in "npz" format, one chunk at a time, as (ticks, episodes, frames) arrays.
+def read_frames(path):
+    for name in sorted(glob.glob(os.path.join(path, "frames_*.npz"))):
+        with np.load(name) as chunk:
+            yield chunk["ticks"], chunk["episodes"], chunk["frames"]
+
+# Writes a (height, width, 3) uint8 array as an RGB PNG file, with zlib only.
+def write_png(path, frame, level = 1):
+    height, width, _ = frame.shape
+    # Every row of pixels starts with its filter type, 0 (none)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = frame.reshape(height, width * 3)
+
+    def block(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(block(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(block(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        file.write(block(b"IEND", b""))
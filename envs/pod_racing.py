@@ -1,14 +1,17 @@
-import pygame
 import numpy as np
 import math
 import sys
 
 from envs.resources import *
+from resources.profiler import profiler
+
+# pygame is only imported when a window is opened (see show), so headless environments start without loading it.
 
 class RaceTrackEnv():
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 6}
 
-    def __init__(self, render_mode=None, num_players = 1, num_bots = 1, num_laps = None, render_fps = 6):
+    def __init__(self, render_mode=None, num_players = 1, num_bots = 1, num_laps = None, render_fps = 6, collisions = False,
+                 track = None, tracks = None, normalized = False, dtype = DTYPE):
 
         assert num_players + num_bots > 0, "Not enough pods to play the game"
         assert render_mode is None or render_mode in self.metadata["render_modes"]
@@ -23,10 +26,25 @@ class RaceTrackEnv():
         """
         self.window = None
         self.clock = None
+        self.rasterizer = None
+        self.lines = []
 
         self.num_players = num_players
         self.num_bots = num_bots
         self.num_laps = num_laps
+        self.collisions = collisions
+
+        # In normalized mode the observations are written into one preallocated array of the given dtype,
+        # returned on every step, and the actions are scaled into another one (up to the shield with collisions).
+        self.normalized = normalized
+        self.action_scale, self.max_thrust = (SHIELD_ACTION_SCALE, SHIELD_THRUST) if collisions else (ACTION_SCALE, BOOST_THRUST)
+        if normalized:
+            self.observations = np.zeros((num_players, STATE_DIM), dtype=dtype)
+            self.actions = np.zeros((num_players, ACTION_DIM))
+
+        # The race is played on track, or on a random track from the tracks list at every reset
+        self.track = DEFAULT_TRACK if track is None else track
+        self.tracks = tracks
         self.metadata["render_fps"] = render_fps
 
         
@@ -51,10 +69,31 @@ class RaceTrackEnv():
     #
     #   -terminated, which indicates if the game ended.
     #
-    #   -info, wich is an array of tuples containig the location of all players and all bots.
+    #   -info, which is a dictionary with:
+    #       "positions": an array of tuples containig the location of all players and all bots,
+    #       "progress": the race distance covered by each player since the start,
+    #       "laps": the number of laps each player completed,
+    #       and, if collisions are enabled:
+    #       "collisions": the number of pairs of pods that collided on this step,
+    #       "pairs": an array of shape (collisions, 2) with the indices of the pods of each pair,
+    #       "impulses": the impulse of each collision.
+    #
+    # If collisions are enabled, the pods bounce off each other after they all moved, as in the original game.
+    # A thrust of SHIELD_THRUST activates the shield, and each pod can use BOOST_THRUST only once per race.
+    #
+    # In normalized mode, actions is an array of shape (num_players, 3) with values in [-1, 1], and observations
+    # is an array of shape (num_players, STATE_DIM) with the normalized (x, y, target_x, target_y, distance) of each player.
+    # That array is the same object on every step, so it must be copied to be kept.
 
     def step(self, actions):
         assert len(actions) == self.num_players, "Number of actions doesnt match number of players"
+        if self.normalized:
+            # One list of Python floats, so the physics below does not work on NumPy scalars
+            actions = write_actions(actions, self.actions, self.action_scale, self.max_thrust).tolist()
+
+        # Every action is checked before any pod moves, so an action out of range leaves the race as it was
+        for x, y, thrust in actions:
+            assert 0 <= x <= WIDTH and 0 <= y <= HEIGHT and 0 <= thrust <= self.max_thrust, "Action out of range"
         
         rewards = []
         lines = []
@@ -63,24 +102,28 @@ class RaceTrackEnv():
             # Players have a numberd id, bot have "bot" as their id
             if isinstance(pod.id, int):
                 x, y, thrust = actions[pod.id]
-                assert 0 <= x <= WIDTH and 0 <= y <= HEIGHT and 0 <= thrust <= 101, "Action out of range"
                 
-                last_distance = checkDistance(*pod.get_pos(), *self.checkpoints[pod.target])
+                # The distance to the target was kept from the last step
+                last_distance = pod.distance
                 lines.append([x,y])
             else:
-                thrust = 100
+                thrust = BOT_THRUST
                 x, y = self.checkpoints[pod.target]
             
             pod.update(x, y, thrust)
+            pod.distance = checkDistance(*pod.get_pos(), *self.checkpoints[pod.target])
 
             # Checkpoint counter for each pod
-            if checkDistance(*pod.get_pos(), *self.checkpoints[pod.target]) < 800:
-                pod.target = (pod.target + 1) % len(self.checkpoints)
+            if pod.distance < self.track.radius:
+                pod.target = (pod.target + 1) % len(self.track)
                 pod.checked += 1
+                pod.passed += 1
+                pod.distance = checkDistance(*pod.get_pos(), *self.checkpoints[pod.target])
 
-            # The number of checkpoints a pod corssed, divided by 4 is the number of laps.
+            # The number of checkpoints a pod corssed, divided by the number of checkpoints is the number of laps.
             # If a pod completes the total number of laps, the game is over. 
-            if self.num_laps != None and (pod.checked / 4) >= self.num_laps:
+            # passed is used, as checked is reset for players every time they score a checkpoint.
+            if self.num_laps != None and self.track.laps(pod.passed) >= self.num_laps:
                 self.terminated = True
 
             # it calcualtes a reward based on the distance to the next checkpoint:
@@ -89,24 +132,66 @@ class RaceTrackEnv():
             if isinstance(pod.id, int):
                 reward = -1
 
-                if last_distance > checkDistance(*pod.get_pos(), *self.checkpoints[pod.target]):
-                    reward = (last_distance - checkDistance(*pod.get_pos(), *self.checkpoints[pod.target]))/(185)
+                if last_distance > pod.distance:
+                    reward = (last_distance - pod.distance)/(REWARD_SCALE)
 
                 if pod.checked == 1:
-                    reward = 100
+                    reward = CHECKPOINT_REWARD
                     pod.checked = 0
 
                 rewards.append(reward)
 
+        if self.collisions:
+            with profiler.phase("env.collisions"):
+                collisions = self._collide()
+
         # Render the new frame
+        self.lines = lines
         if self.render_mode == "human":
-            self._render_frame(lines)
+            with profiler.phase("env.render"):
+                self._render_frame(lines)
 
-        observations = get_obs(self.pods, self.num_players, self.checkpoints)
-        info = get_info(self.pods)
+        with profiler.phase("env.observations"):
+            observations = self._observations()
+            info = {"positions": get_info(self.pods), "progress": self._progress(), "laps": self._laps()}
+            if self.collisions:
+                info.update(collisions)
 
         return observations, rewards, self.terminated, info
 
+    # Bounces the pods that are touching, and returns the collision part of the info dictionary.
+    # As in the original game, the positions are rounded and the speeds truncated afterwards.
+    def _collide(self):
+        x = np.array([pod.x for pod in self.pods], dtype=np.float64)
+        y = np.array([pod.y for pod in self.pods], dtype=np.float64)
+        x_speed = np.array([pod.x_speed for pod in self.pods], dtype=np.float64)
+        y_speed = np.array([pod.y_speed for pod in self.pods], dtype=np.float64)
+        mass = np.array([pod.mass for pod in self.pods], dtype=np.float64)
+
+        pairs = find_collision_pairs(x, y)
+        impulses = resolve_collisions(pairs, x, y, x_speed, y_speed, mass)
+
+        for pod, new_x, new_y, new_x_speed, new_y_speed in zip(self.pods, np.round(x), np.round(y), np.trunc(x_speed), np.trunc(y_speed)):
+            pod.x, pod.y, pod.x_speed, pod.y_speed = float(new_x), float(new_y), float(new_x_speed), float(new_y_speed)
+
+        # The pods that moved need their distance to the target again
+        for index in np.unique(pairs):
+            pod = self.pods[index]
+            pod.distance = checkDistance(*pod.get_pos(), *self.checkpoints[pod.target])
+
+        return {"collisions": len(pairs), "pairs": pairs, "impulses": impulses}
+
+    def _observations(self):
+        if self.normalized:
+            return write_obs(self.pods, self.num_players, self.checkpoints, self.observations)
+        return get_obs(self.pods, self.num_players, self.checkpoints)
+
+    def _progress(self):
+        return [self.track.progress(pod.passed, pod.distance) for pod in self.pods[:self.num_players]]
+
+    def _laps(self):
+        return [pod.passed // len(self.track) for pod in self.pods[:self.num_players]]
+
     def render(self):
         if self.render_mode == "rgb_array":
             return self._render_frame()
@@ -117,62 +202,74 @@ class RaceTrackEnv():
     # Additionally, 2 lines are drawn per player pod:
     #   -One short green line aiding the visualization of direction of travel.
     #   -One white line showing the selected point to travel to.
-    def _render_frame(self, *args):
-        lines = args[0]
+    #
+    # The checkpoints and their numbers are drawn only once per track, by the Rasterizer, into a cached background.
+    # In "rgb_array" mode the Rasterizer then draws the pods and lines with NumPy, and the frame it returns
+    # is reused on the next call. If no lines are given, the ones from the last step are used.
+    def _render_frame(self, lines = None):
+        if lines is None:
+            lines = self.lines
+
+        if self.render_mode != "human":
+            return self.frame(lines)
+
+        self.show(lines)
 
-        if self.window is None and self.render_mode == "human":
+        # We need to ensure that human-rendering occurs at the predefined framerate.
+        # The following line will automatically add a delay to keep the framerate stable.
+        self.clock.tick(self.metadata["render_fps"])
+
+    # Returns the current state of the race drawn by the Rasterizer, as a (HEIGHT/10, WIDTH/10, 3) array, in any render mode.
+    # It is the same picture as the window, in the Rasterizer's buffer, so it is overwritten by the next call.
+    def frame(self, lines = None):
+        if lines is None:
+            lines = self.lines
+
+        if self.rasterizer is None or self.rasterizer.checkpoints != self.checkpoints:
+            self.rasterizer = Rasterizer(self.checkpoints)
+
+        return self.rasterizer.render([pod.x for pod in self.pods], [pod.y for pod in self.pods],
+                                      [pod.angle for pod in self.pods], [pod.color for pod in self.pods],
+                                      lines if len(lines) else None)
+
+    # Draws the current state of the race in the pygame window, opening it if needed, without waiting for the framerate.
+    # This is what human-mode uses on every step, and it can be called directly to draw only some of the steps.
+    def show(self, lines = None):
+        import pygame
+
+        if lines is None:
+            lines = self.lines
+
+        if self.rasterizer is None or self.rasterizer.checkpoints != self.checkpoints:
+            self.rasterizer = Rasterizer(self.checkpoints)
+
+        if self.window is None:
             pygame.init()
             pygame.display.init()
             self.window = pygame.display.set_mode((WIDTH/10,HEIGHT/10))
             pygame.display.set_caption(TITLE)
-        if self.clock is None and self.render_mode == "human":
+        if self.clock is None:
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((WIDTH/10,HEIGHT/10))
-        canvas.fill((25, 25, 25))
-
-        font = pygame.font.Font('freesansbold.ttf', 32)
-        
-        numbers = []
-        rects = []
-
-        # Load checkpoints
-        for checkpoint in self.checkpoints:
-            pygame.draw.circle(canvas, BLUE, (checkpoint[0]/10, checkpoint[1]/10), RADIUS)
-            numbers.append(font.render(str(self.checkpoints.index(checkpoint)), True, WHITE))
-            rects.append(numbers[-1].get_rect())
-            rects[-1].center = (checkpoint[0]/10, checkpoint[1]/10)
+        # The following line copies the cached track to the visible window
+        self.window.blit(self.rasterizer.background_surface, (0, 0))
 
         # Load pods
         for pod in self.pods:
             modifiers = get_triangle(pod.angle)
             result = tuple((mod_x + pod.x/10, mod_y + pod.y/10) for mod_x, mod_y in modifiers)
-            pygame.draw.polygon(canvas, pod.color, result)
+            pygame.draw.polygon(self.window, pod.color, result)
 
        # Load lines
-        for i in range(self.num_players):
+        for i in range(len(lines)):
             pod = self.pods[i]
             pos = ((pod.x + math.cos(pod.angle) * 1000) / 10, (pod.y + math.sin(pod.angle) * 1000)/10)
 
-            pygame.draw.line(canvas,WHITE, (pod.x /10, pod.y /10), ((lines[i][0])/10, (lines[i][1])/10))
-            pygame.draw.line(canvas,GREEN, (pod.x /10, pod.y /10), pos)
+            pygame.draw.line(self.window,WHITE, (pod.x /10, pod.y /10), ((lines[i][0])/10, (lines[i][1])/10))
+            pygame.draw.line(self.window,GREEN, (pod.x /10, pod.y /10), pos)
 
-        # Draw all loaded elements
-        if self.render_mode == "human":
-            # The following line copies our drawings from `canvas` to the visible window
-            self.window.blit(canvas, canvas.get_rect())
-            for _ in range(len(numbers)):
-                self.window.blit(numbers[_], rects[_])
-            pygame.event.pump()
-            pygame.display.update()
-
-            # We need to ensure that human-rendering occurs at the predefined framerate.
-            # The following line will automatically add a delay to keep the framerate stable.
-            self.clock.tick(self.metadata["render_fps"])
-        else:  # rgb_array
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
-            )
+        pygame.event.pump()
+        pygame.display.update()
         
         for event in pygame.event.get():
             if event.type == pygame.KEYDOWN:
@@ -185,7 +282,7 @@ class RaceTrackEnv():
 
     # The reset function will create:
     #
-    #   an array for the checkpoints (wich is fixed at the moment)
+    #   an array for the checkpoints, from the track (or a random one from the tracks list)
     #   a list of player pods, of length equal to num_players
     #   a list of bot pods, of length equal to num_bots
     #
@@ -198,23 +295,97 @@ class RaceTrackEnv():
     #       for example, starting 3 players would return observations:
     #       [[(12000, 1990), (12000, 1990), (12000, 1990)], [(10680, 4990), (10680, 4990), (10680, 4990)]]
     #
-    #   info, wich is an array of tuples containig the location of all players and all bots
+    #   info, which is a dictionary with "positions", an array of tuples containig the location of all players and all bots,
+    #   and the "progress" and "laps" of the players, as in step
+    #
+    # In normalized mode, observations is the same preallocated array that step returns.
+    # If collisions are enabled, the pods start in a grid behind the first checkpoint instead of on top of each other.
     def reset(self, **kwargs):
         
         self.terminated = False
+        self.lines = []
 
         self.pods = []
-        self.checkpoints = [(12000, 1990), (10680, 4990), (14020, 3010), (3990, 7780)]
-        self.pods += [Pod(i, *self.checkpoints[0], *self.checkpoints[1], 1, np.random.randint(256, size=3)) for i in range(self.num_players)]
-        self.pods += [Pod("bot", *self.checkpoints[0], *self.checkpoints[1], 1, np.random.randint(256, size=3)) for i in range(self.num_bots)]
+        self.track_index = -1
+        if self.tracks:
+            self.track_index = np.random.randint(len(self.tracks))
+            self.track = self.tracks[self.track_index]
+        self.checkpoints = self.track.checkpoints
+        starts = self._start_positions()
+        boosts = 1 if self.collisions else None
+        self.pods += [Pod(i, *starts[i], *self.checkpoints[1], 1, np.random.randint(256, size=3), boosts) for i in range(self.num_players)]
+        self.pods += [Pod("bot", *starts[self.num_players + i], *self.checkpoints[1], 1, np.random.randint(256, size=3), boosts) for i in range(self.num_bots)]
 
-        observations = get_obs(self.pods, self.num_players, self.checkpoints)
-        info = get_info(self.pods)
+        for pod in self.pods:
+            pod.distance = checkDistance(*pod.get_pos(), *self.checkpoints[pod.target])
+
+        observations = self._observations()
+        info = {"positions": get_info(self.pods), "progress": self._progress(), "laps": self._laps()}
 
         return observations, info
     
+    # Returns the starting position of every pod: the first checkpoint, or, with collisions, a grid of rows
+    # facing the second checkpoint with the first checkpoint in the middle of the front row.
+    def _start_positions(self):
+        num_pods = self.num_players + self.num_bots
+        if not self.collisions:
+            return [self.checkpoints[0]] * num_pods
+
+        (x0, y0), (x1, y1) = self.checkpoints[0], self.checkpoints[1]
+        length = math.hypot(x1 - x0, y1 - y0)
+        forward_x, forward_y = (x1 - x0) / length, (y1 - y0) / length
+        columns = math.ceil(math.sqrt(num_pods))
+        spacing = 2 * POD_RADIUS + 100
+
+        starts = []
+        for i in range(num_pods):
+            side = (i % columns - (columns - 1) / 2) * spacing
+            back = (i // columns) * spacing
+            starts.append((round(x0 - forward_y * side - forward_x * back), round(y0 + forward_x * side - forward_y * back)))
+        return starts
+
+    # Returns the state of the race (see envs/resources/simulation.py) as a flat float64 array,
+    # written into out if it is given, so a search can save and restore it many times per step without copying the pods.
+    def get_state(self, out = None):
+        state = [float(self.terminated), self.track_index]
+        for pod in self.pods:
+            state += (pod.x, pod.y, pod.x_speed, pod.y_speed, pod.angle, pod.target, pod.checked, pod.passed, pod.distance,
+                      -1 if pod.boosts is None else pod.boosts, pod.shield, pod.mass)
+        if out is None:
+            return np.array(state)
+        out[:] = state
+        return out
+
+    # Puts the race back in a state returned by get_state, from a race of the same environment (same number of pods).
+    def set_state(self, state):
+        values = state.tolist() if isinstance(state, np.ndarray) else list(state)
+        assert len(values) == STATE_HEADER + POD_STATE_SIZE * len(self.pods), "The state does not match the pods of the race"
+
+        self.terminated = values[0] != 0
+        if values[1] >= 0:
+            self.track_index = int(values[1])
+            self.track = self.tracks[self.track_index]
+            self.checkpoints = self.track.checkpoints
+        self.lines = []
+
+        for pod, start in zip(self.pods, range(STATE_HEADER, len(values), POD_STATE_SIZE)):
+            (pod.x, pod.y, pod.x_speed, pod.y_speed, pod.angle, target, checked, passed, pod.distance,
+             boosts, shield, pod.mass) = values[start:start + POD_STATE_SIZE]
+            pod.target, pod.checked, pod.passed, pod.shield = int(target), int(checked), int(passed), int(shield)
+            pod.boosts = None if boosts < 0 else int(boosts)
+
+    # Plays K action sequences of shape (K, steps, num_players, 3), in game units in any mode, from the current state
+    # (or the given one) without changing the race, and returns (rewards, progress, terminated, states),
+    # see simulate_rollouts in envs/resources/simulation.py.
+    def simulate(self, actions, state = None, discount = 1.0):
+        if state is None:
+            state = self.get_state()
+        track = self.tracks[int(state[1])] if state[1] >= 0 else self.track
+        return simulate_rollouts(track, state, actions, self.num_players, self.num_laps, self.collisions, discount)
+
     def close(self):
         print("closed")
         if self.window is not None:
+            import pygame
             pygame.display.quit()
             pygame.quit()
@@ -0,0 +1,179 @@
+import numpy as np
+import struct
+import os
+
+from envs.resources import *
+from envs.pod_racing import RaceTrackEnv
+
+# The recording format is made of two files:
+#
+#   The ticks file (path) starts with a small header:
+#       magic (8 bytes), version, number of pods and number of players (3 x int32), padded to RECORD_HEADER_SIZE bytes,
+#   followed by one fixed-size record per tick (see tick_dtype) for the whole run.
+#
+#   The episodes file (path + ".episodes") holds one fixed-size record per episode (see episode_dtype),
+#   with the first tick of the episode, its checkpoints and the colors of its pods.
+#
+# Both files only grow at the end, so they can be memory-mapped and read at any episode and tick,
+# even while the recording is still going on.
+
+RECORD_MAGIC = b"PODREC\x00\x00"
+RECORD_VERSION = 1
+RECORD_HEADER_SIZE = 64
+
+def tick_dtype(num_pods, num_players):
+    return np.dtype([
+        ("x", np.float32, (num_pods,)),
+        ("y", np.float32, (num_pods,)),
+        ("angle", np.float32, (num_pods,)),
+        ("x_speed", np.float32, (num_pods,)),
+        ("y_speed", np.float32, (num_pods,)),
+        ("target", np.int16, (num_pods,)),
+        ("action", np.float32, (num_players, 3)),
+        ("reward", np.float32, (num_players,)),
+        ("terminated", np.uint8),
+    ])
+
+def episode_dtype(num_pods):
+    return np.dtype([
+        ("start", np.int64),
+        ("num_checkpoints", np.int32),
+        ("checkpoints", np.int32, (MAX_CHECKPOINTS, 2)),
+        ("color", np.uint8, (num_pods, 3)),
+    ])
+
+
+# The TrajectoryRecorder class wraps a RaceTrackEnv and records every reset and step into the files above.
+#
+#   The ticks are written into an in-memory chunk of chunk_size records, and the chunk is appended to the file
+#   only when it is full (or on flush/close), so recording a tick costs a few array assignments.
+#   The reset state of each episode is recorded as its first tick, with no thrust and no reward.
+#   The actions are always recorded in game units (x, y, thrust), also for a normalized environment.
+#
+#   Everything else is passed through to the wrapped environment.
+
+class TrajectoryRecorder:
+    def __init__(self, env, path, chunk_size = 4096):
+        self.env = env
+        self.path = path
+        self.chunk_size = chunk_size
+        self.num_pods = env.num_players + env.num_bots
+        self.num_players = env.num_players
+
+        self.tick_dtype = tick_dtype(self.num_pods, self.num_players)
+        self.episode_dtype = episode_dtype(self.num_pods)
+        self.chunk = np.zeros(chunk_size, dtype=self.tick_dtype)
+        self.used = 0
+
+        self.file = open(path, "wb")
+        header = RECORD_MAGIC + struct.pack("<3i", RECORD_VERSION, self.num_pods, self.num_players)
+        self.file.write(header.ljust(RECORD_HEADER_SIZE, b"\x00"))
+        self.episodes = open(path + ".episodes", "wb")
+        self.ticks = 0
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def reset(self, **kwargs):
+        observations, info = self.env.reset(**kwargs)
+
+        episode = np.zeros(1, dtype=self.episode_dtype)
+        episode["start"] = self.ticks
+        episode["num_checkpoints"] = len(self.env.checkpoints)
+        episode["checkpoints"][0, :len(self.env.checkpoints)] = self.env.checkpoints
+        episode["color"] = [pod.color for pod in self.env.pods]
+        self.episodes.write(episode.tobytes())
+
+        self._record(None, None)
+        return observations, info
+
+    # A normalized environment is recorded with the actions it scaled to game units, as the player draws them.
+    def step(self, actions):
+        observations, rewards, terminated, info = self.env.step(actions)
+        self._record(self.env.actions if self.env.normalized else actions, rewards, terminated)
+        return observations, rewards, terminated, info
+
+    def _record(self, actions, rewards, terminated = False):
+        tick = self.chunk[self.used]
+        pods = self.env.pods
+        tick["x"] = [pod.x for pod in pods]
+        tick["y"] = [pod.y for pod in pods]
+        tick["angle"] = [pod.angle for pod in pods]
+        tick["x_speed"] = [pod.x_speed for pod in pods]
+        tick["y_speed"] = [pod.y_speed for pod in pods]
+        tick["target"] = [pod.target for pod in pods]
+        # The reset tick has no action, so the players aim at their own position
+        tick["action"] = [(pod.x, pod.y, 0) for pod in pods[:self.num_players]] if actions is None else actions
+        tick["reward"] = 0 if rewards is None else rewards
+        tick["terminated"] = terminated
+
+        self.used += 1
+        self.ticks += 1
+        if self.used == self.chunk_size:
+            self.flush()
+
+    # Writes the ticks recorded so far to disk.
+    def flush(self):
+        self.file.write(self.chunk[:self.used].tobytes())
+        self.used = 0
+        self.file.flush()
+        self.episodes.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.episodes.close()
+        self.env.close()
+
+
+# The TrajectoryPlayer class reads a recording made by the TrajectoryRecorder.
+#
+#   Both files are memory-mapped, so opening a recording of any size is instant, and
+#   episode(i) returns the ticks of an episode as a structured array without reading the rest of the file.
+#
+#   play(i) shows an episode in a "human" RaceTrackEnv window: the pods are placed at the recorded positions
+#   and drawn by the environment, without running the physics or any network.
+
+class TrajectoryPlayer:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            header = file.read(RECORD_HEADER_SIZE)
+        assert header[:len(RECORD_MAGIC)] == RECORD_MAGIC, "Not a trajectory recording"
+        version, self.num_pods, self.num_players = struct.unpack_from("<3i", header, len(RECORD_MAGIC))
+        assert version == RECORD_VERSION, "Unsupported recording version"
+
+        self.tick_dtype = tick_dtype(self.num_pods, self.num_players)
+        self.episode_dtype = episode_dtype(self.num_pods)
+
+        num_ticks = (os.path.getsize(path) - RECORD_HEADER_SIZE) // self.tick_dtype.itemsize
+        num_episodes = os.path.getsize(path + ".episodes") // self.episode_dtype.itemsize
+        self.ticks = np.memmap(path, dtype=self.tick_dtype, mode="r", offset=RECORD_HEADER_SIZE, shape=(num_ticks,))
+        self.episodes = np.memmap(path + ".episodes", dtype=self.episode_dtype, mode="r", shape=(num_episodes,))
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def episode(self, index):
+        start = self.episodes[index]["start"]
+        end = self.episodes[index + 1]["start"] if index + 1 < len(self.episodes) else len(self.ticks)
+        return self.ticks[start:end]
+
+    def checkpoints(self, index):
+        episode = self.episodes[index]
+        return [tuple(int(c) for c in checkpoint) for checkpoint in episode["checkpoints"][:episode["num_checkpoints"]]]
+
+    # Plays the ticks of an episode from start_tick in a "human" window.
+    def play(self, index, start_tick = 0, render_fps = 6):
+        env = RaceTrackEnv(render_mode="human", num_players=self.num_players,
+                           num_bots=self.num_pods - self.num_players, render_fps=render_fps)
+        env.reset()
+        env.checkpoints = self.checkpoints(index)
+        for pod, color in zip(env.pods, self.episodes[index]["color"]):
+            pod.color = tuple(int(c) for c in color)
+
+        for tick in self.episode(index)[start_tick:]:
+            for i, pod in enumerate(env.pods):
+                pod.x, pod.y, pod.angle = float(tick["x"][i]), float(tick["y"][i]), float(tick["angle"][i])
+            env._render_frame(tick["action"][:, :2].tolist())
+
+        env.close()
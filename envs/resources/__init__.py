@@ -1,3 +1,7 @@
 from envs.resources.functions import *
 from envs.resources.pod import *
-from envs.resources.settings import *
\ No newline at end of file
+from envs.resources.settings import *
+from envs.resources.rasterizer import *
+from envs.resources.collisions import *
+from envs.resources.track import *
+from envs.resources.simulation import *
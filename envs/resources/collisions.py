@@ -0,0 +1,99 @@
+from envs.resources.settings import *
+import numpy as np
+
+# Functions used by the environment for pod-pod collisions.
+# They work on NumPy arrays with one value per pod, so a race with hundreds of pods is handled in a few array operations.
+
+# Half of the 3x3 block of neighbouring cells: each pair of neighbouring cells is visited only once.
+NEIGHBOUR_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+# Broad phase: every pod is put in a square cell of a uniform grid, with cells as big as the collision distance,
+# so two pods can only touch if they are in the same or in neighbouring cells.
+# The pods are sorted by cell, and the pods of each neighbouring cell are found with a binary search.
+#
+# It returns an array of shape (pairs, 2), with the indices of every pair of pods closer than 2 * radius.
+def find_collision_pairs(x, y, radius = POD_RADIUS):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    count = len(x)
+    if count < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    size = 2 * radius
+    cell_x = np.floor(x / size).astype(np.int64)
+    cell_y = np.floor(y / size).astype(np.int64)
+    cell_x -= cell_x.min() - 1
+    cell_y -= cell_y.min() - 1
+    rows = cell_y.max() + 2
+
+    keys = cell_x * rows + cell_y
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first, second = [], []
+    for dx, dy in NEIGHBOUR_CELLS:
+        neighbour = (cell_x + dx) * rows + (cell_y + dy)
+        start = np.searchsorted(sorted_keys, neighbour, "left")
+        counts = np.searchsorted(sorted_keys, neighbour, "right") - start
+        total = counts.sum()
+        if total == 0:
+            continue
+
+        # All the pods of the neighbouring cell, for every pod, in one flat array
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        i = np.repeat(np.arange(count), counts)
+        j = order[np.repeat(start, counts) + offsets]
+        if dx == 0 and dy == 0:
+            keep = j > i
+            i, j = i[keep], j[keep]
+        first.append(i)
+        second.append(j)
+
+    if not first:
+        return np.empty((0, 2), dtype=np.int64)
+    i, j = np.concatenate(first), np.concatenate(second)
+
+    # Narrow phase: the exact distance
+    close = (x[i] - x[j])**2 + (y[i] - y[j])**2 < size**2
+    return np.stack((i[close], j[close]), axis=1)
+
+# Elastic collisions between the given pairs, as in the original game: the pods bounce off each other with an impulse
+# along the line between their centres, depending on their masses, and the impulse is at least MIN_IMPULSE.
+# Only pairs that are moving towards each other bounce, and overlapping pods are pushed apart so they do not stick.
+#
+# The positions and speeds are updated in place, and the magnitude of each pair's impulse is returned.
+def resolve_collisions(pairs, x, y, x_speed, y_speed, mass, radius = POD_RADIUS):
+    if len(pairs) == 0:
+        return np.empty(0)
+    i, j = pairs[:, 0], pairs[:, 1]
+
+    nx = x[i] - x[j]
+    ny = y[i] - y[j]
+    distance = np.hypot(nx, ny)
+    # Pods in the very same place are pushed apart along the x-axis
+    same = distance == 0
+    nx[same], distance[same] = 1, 1
+    nx, ny = nx / distance, ny / distance
+
+    m1, m2 = mass[i], mass[j]
+    reduced_mass = (m1 * m2) / (m1 + m2)
+    product = nx * (x_speed[i] - x_speed[j]) + ny * (y_speed[i] - y_speed[j])
+    approaching = product < 0
+
+    # The first half of the impulse cancels the approach speed, the second half (at least MIN_IMPULSE) bounces them
+    impulse = np.where(approaching, -product * reduced_mass, 0)
+    impulse = impulse + np.where(approaching, np.maximum(impulse, MIN_IMPULSE), 0)
+
+    np.add.at(x_speed, i, nx * impulse / m1)
+    np.add.at(y_speed, i, ny * impulse / m1)
+    np.add.at(x_speed, j, -nx * impulse / m2)
+    np.add.at(y_speed, j, -ny * impulse / m2)
+
+    # Overlapping pods are moved apart, the lighter one further
+    overlap = np.maximum(2 * radius - distance, 0)
+    np.add.at(x, i, nx * overlap * m2 / (m1 + m2))
+    np.add.at(y, i, ny * overlap * m2 / (m1 + m2))
+    np.add.at(x, j, -nx * overlap * m1 / (m1 + m2))
+    np.add.at(y, j, -ny * overlap * m1 / (m1 + m2))
+
+    return impulse
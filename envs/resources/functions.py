@@ -1,4 +1,5 @@
 from envs.resources.settings import *
+import numpy as np
 import math
 
 # functions used by the environment
@@ -25,12 +26,34 @@ def get_obs(pods, num_players, checkpoints):
     obs = [*agent_location, *target_location]
     return obs
 
+# Writes the normalized observation of every player into out, an array of shape (num_players, STATE_DIM),
+# with the same values normalize_state computes from get_obs, but without building any lists.
+def write_obs(pods, num_players, checkpoints, out):
+    for i in range(num_players):
+        x, y = pods[i].get_pos()
+        t_x, t_y = checkpoints[pods[i].target]
+        out[i] = (x / WIDTH, y / HEIGHT, t_x / WIDTH, t_y / HEIGHT, math.hypot(x - t_x, y - t_y) / DIAGONAL)
+    return out
+
+# Scales actions in [-1, 1], of shape (..., ACTION_DIM), into (x, y, thrust) actions written into out,
+# with the thrust rounded down as normalize_action does, and at most max_thrust.
+def write_actions(actions, out, scale = ACTION_SCALE, max_thrust = BOOST_THRUST):
+    np.add(actions, 1, out=out)
+    np.multiply(out, scale, out=out)
+    np.floor(out[..., 2], out=out[..., 2])
+    np.minimum(out[..., 2], max_thrust, out=out[..., 2])
+    return out
+
+# Same as write_actions, into a new array, for the environments that take (x, y, thrust) actions like the VectorRaceTrackEnv.
+# For an environment with collisions, pass scale = SHIELD_ACTION_SCALE and max_thrust = SHIELD_THRUST.
+def scale_actions(actions, scale = ACTION_SCALE, max_thrust = BOOST_THRUST):
+    actions = np.asarray(actions, dtype=np.float64)
+    return write_actions(actions, np.empty(actions.shape), scale, max_thrust)
+
 # Given an angle, it will retrun the points of a triangle to draw the pods, rotated theta degrees around the origin.
 # The points can then be translated to the right location in the map.
 def get_triangle(theta):
-    p1 = (36.22, 0)
-    p2 = (-28.38, 22.5)
-    p3 = (-28.38, -22.5)
+    p1, p2, p3 = TRIANGLE
 
     rp1x = p1[0] * math.cos(theta) - p1[1] * math.sin(theta)
     rp1y = p1[0] * math.sin(theta) + p1[1] * math.cos(theta)                 
@@ -89,3 +112,38 @@ def update_angle(theta, angle):
 
     return angle
 
+
+
+# Vectorized versions of the functions above, used by the VectorRaceTrackEnv.
+# They take NumPy arrays of any (matching) shape and apply the same math element-wise,
+# so a whole batch of races can be updated with a handful of array operations.
+
+# Element-wise version of checkDistance
+def check_distances(x1, y1, x2, y2):
+    return np.floor(np.sqrt((x1 - x2)**2 + (y1 - y2)**2))
+
+# Element-wise version of normalize_angle
+def normalize_angles(angles):
+    normal = 2 * math.pi
+    return np.mod(angles + normal, normal)
+
+# Element-wise version of update_angle.
+# Every branch of update_angle is computed for all pods, and np.select picks the one
+# that the scalar version would have taken, so both functions return the same angles.
+def update_angles(theta, angle):
+    turn_up = np.where(angle + ROTATION_SPEED > theta, theta, angle + ROTATION_SPEED)
+    turn_down = np.where(angle - ROTATION_SPEED < theta, theta, angle - ROTATION_SPEED)
+
+    wrap_down = normalize_angles(angle - ROTATION_SPEED)
+    wrap_down = np.where(wrap_down < theta, theta, wrap_down)
+    wrap_down = np.where(angle - ROTATION_SPEED > 0, angle - ROTATION_SPEED, wrap_down)
+
+    wrap_up = normalize_angles(angle + ROTATION_SPEED)
+    wrap_up = np.where(wrap_up > theta, theta, wrap_up)
+    wrap_up = np.where(angle + ROTATION_SPEED < (math.pi * 2), angle + ROTATION_SPEED, wrap_up)
+
+    left = (angle < math.pi) & (theta > angle)
+    right = ~left & (theta < angle)
+
+    conditions = [left & (theta < angle + math.pi), left, right & (theta > angle - math.pi), right]
+    return np.select(conditions, [turn_up, wrap_down, turn_down, wrap_up], turn_up)
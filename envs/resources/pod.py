@@ -7,9 +7,15 @@ import math
 #   - x and y are the current position of the pod
 #   - t_x and t_y are the point that the pod is currently traveling towards
 #   - target is the index of checkpoins that the pod should hit next
+#   - checked counts the checkpoints crossed (reset by the environment for players), passed counts all of them
+#   - distance is the distance to the target, kept by the environment
 #   - color is the color to be rendered as; the default is red. 
+#   - boosts is how many times the pod can use BOOST_THRUST (None for no limit); once they are used, it counts as BOT_THRUST.
+#
+# A thrust of SHIELD_THRUST activates the shield: the pod gets SHIELD_MASS for this turn,
+# and its thrust is 0 for this turn and the next SHIELD_TURNS turns.
 class Pod():
-    def __init__(self, id, x, y, t_x, t_y, target = 1, color = RED):
+    def __init__(self, id, x, y, t_x, t_y, target = 1, color = RED, boosts = None):
         self.id = id
         self.color = tuple(color)
         self.x = x
@@ -24,6 +30,12 @@ class Pod():
         self.y_acceleration = 0
 
         self.checked = 0
+        self.passed = 0
+        self.distance = 0
+
+        self.boosts = boosts
+        self.shield = 0
+        self.mass = POD_MASS
 
     # Returns the current position
     def get_pos(self):
@@ -32,7 +44,20 @@ class Pod():
     # This function updates the current postion and angle of the pod, based on the given (x, y, thrust) action.
     def update(self, x, y, thrust):
         
-        self.thrust = 661 if thrust == 101 else thrust
+        self.mass = POD_MASS
+        if thrust == SHIELD_THRUST:
+            self.shield = SHIELD_TURNS + 1
+            self.mass = SHIELD_MASS
+        if thrust == BOOST_THRUST and self.boosts is not None:
+            if self.boosts > 0:
+                self.boosts -= 1
+            else:
+                thrust = BOT_THRUST
+        if self.shield > 0:
+            self.shield -= 1
+            thrust = 0
+
+        self.thrust = BOOST_POWER if thrust == BOOST_THRUST else thrust
         theta = normalize_angle(check_angle(self.x, self.y, x, y))
         
         if theta != self.angle:
@@ -40,8 +65,8 @@ class Pod():
             
         x_power = round(math.cos(self.angle) * self.thrust,0)
         y_power = round(math.sin(self.angle) * self.thrust,0)
-        self.x_acceleration = math.floor(self.x_speed * 0.85)
-        self.y_acceleration = math.floor(self.y_speed * 0.85)
+        self.x_acceleration = math.floor(self.x_speed * CONSTANT_ACCEL)
+        self.y_acceleration = math.floor(self.y_speed * CONSTANT_ACCEL)
         self.x_speed = self.x_acceleration + x_power
         self.y_speed = self.y_acceleration + y_power
 
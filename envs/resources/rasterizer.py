@@ -0,0 +1,120 @@
+from envs.resources.settings import *
+import numpy as np
+import math
+
+# The Rasterizer class draws races into NumPy frames of shape (HEIGHT/10, WIDTH/10, 3), without a window.
+#
+#   The static part of the track (background, checkpoints and their numbers) is drawn once with pygame,
+#   when the Rasterizer is created, and kept both as a pygame Surface (for the human window) and as a NumPy array.
+#
+#   Every frame starts as a copy of that background in a preallocated buffer, and only the pods and their lines
+#   are drawn on top of it with NumPy, for all pods at once:
+#       -each pod is a triangle, filled by testing the pixels of a small box around the pod against its 3 edges,
+#       -each line is drawn by sampling one point per pixel along it.
+#
+#   The returned frames are the internal buffers, so they are overwritten by the next call and must be copied to be kept.
+#
+#   pygame is only imported when the first Rasterizer is created, so importing the environment does not load it.
+
+class Rasterizer:
+    def __init__(self, checkpoints, scale = 10):
+        import pygame
+
+        self.checkpoints = list(checkpoints)
+        self.scale = scale
+        self.width = int(WIDTH / scale)
+        self.height = int(HEIGHT / scale)
+
+        pygame.font.init()
+        font = pygame.font.Font('freesansbold.ttf', 32)
+
+        self.background_surface = pygame.Surface((self.width, self.height))
+        self.background_surface.fill((25, 25, 25))
+        for index, checkpoint in enumerate(self.checkpoints):
+            center = (checkpoint[0] / scale, checkpoint[1] / scale)
+            pygame.draw.circle(self.background_surface, BLUE, center, RADIUS)
+            number = font.render(str(index), True, WHITE)
+            rect = number.get_rect()
+            rect.center = center
+            self.background_surface.blit(number, rect)
+
+        self.background = np.ascontiguousarray(
+            np.transpose(pygame.surfarray.array3d(self.background_surface), axes=(1, 0, 2)))
+        self.frame = np.empty_like(self.background)
+        self.frames = None
+
+        # Pixel offsets of a box big enough to hold a pod triangle in any rotation
+        size = int(math.ceil(max(math.hypot(*point) for point in TRIANGLE)))
+        self.offsets = np.arange(-size, size + 1)
+
+    # Draws one race and returns the frame.
+    #   x, y and angles have one value per pod, colors one (r, g, b) row per pod,
+    #   and aims one (x, y) row per player pod (the first pods), or None to skip the aim lines.
+    def render(self, x, y, angles, colors, aims = None):
+        frames = self.frame[None]
+        frames[0] = self.background
+        self._draw(frames, np.asarray(x, dtype=np.float64)[None], np.asarray(y, dtype=np.float64)[None],
+                   np.asarray(angles, dtype=np.float64)[None], np.asarray(colors)[None],
+                   None if aims is None else np.asarray(aims, dtype=np.float64)[None])
+        return self.frame
+
+    # Draws a batch of races and returns the frames, of shape (races, HEIGHT/10, WIDTH/10, 3).
+    # The arguments are the same as render, with an extra first dimension for the races.
+    def render_batch(self, x, y, angles, colors, aims = None):
+        x = np.asarray(x, dtype=np.float64)
+        if self.frames is None or len(self.frames) != len(x):
+            self.frames = np.empty((len(x),) + self.background.shape, dtype=np.uint8)
+        self.frames[:] = self.background
+        self._draw(self.frames, x, np.asarray(y, dtype=np.float64), np.asarray(angles, dtype=np.float64),
+                   np.asarray(colors), None if aims is None else np.asarray(aims, dtype=np.float64))
+        return self.frames
+
+    def _draw(self, frames, x, y, angles, colors, aims):
+        races, pods = x.shape
+        race_index = np.broadcast_to(np.arange(races)[:, None], (races, pods))
+        colors = np.broadcast_to(colors, (races, pods, 3))
+        px = x / self.scale
+        py = y / self.scale
+
+        # Pods: the triangle corners are rotated by the pod angle and moved to its position
+        cos, sin = np.cos(angles), np.sin(angles)
+        corners = np.array(TRIANGLE)
+        corner_x = px[..., None] + corners[:, 0] * cos[..., None] - corners[:, 1] * sin[..., None]
+        corner_y = py[..., None] + corners[:, 0] * sin[..., None] + corners[:, 1] * cos[..., None]
+
+        pixel_x = np.floor(px)[..., None, None] + self.offsets[None, :]
+        pixel_y = np.floor(py)[..., None, None] + self.offsets[:, None]
+        inside = np.ones(pixel_x.shape[:2] + (len(self.offsets), len(self.offsets)), dtype=bool)
+        for i in range(3):
+            ax, ay = corner_x[..., i, None, None], corner_y[..., i, None, None]
+            bx, by = corner_x[..., (i + 1) % 3, None, None], corner_y[..., (i + 1) % 3, None, None]
+            # The corners go clockwise on screen, so the inside of every edge is on its non-negative side
+            inside &= (bx - ax) * (pixel_y + 0.5 - ay) - (by - ay) * (pixel_x + 0.5 - ax) >= 0
+
+        pixel_x = np.broadcast_to(pixel_x, inside.shape)
+        pixel_y = np.broadcast_to(pixel_y, inside.shape)
+        inside &= (pixel_x >= 0) & (pixel_x < self.width) & (pixel_y >= 0) & (pixel_y < self.height)
+        owner = np.broadcast_to(race_index[..., None, None], inside.shape)
+        color = np.broadcast_to(colors[:, :, None, None, :], inside.shape + (3,))
+        frames[owner[inside], pixel_y[inside].astype(np.int64), pixel_x[inside].astype(np.int64)] = color[inside]
+
+        # Lines: a white one to the aim point of each player, and a short green one in the direction of travel
+        if aims is not None:
+            players = aims.shape[1]
+            start_x = np.concatenate((px[:, :players], px[:, :players]), axis=1)
+            start_y = np.concatenate((py[:, :players], py[:, :players]), axis=1)
+            end_x = np.concatenate((aims[..., 0] / self.scale, px[:, :players] + cos[:, :players] * 1000 / self.scale), axis=1)
+            end_y = np.concatenate((aims[..., 1] / self.scale, py[:, :players] + sin[:, :players] * 1000 / self.scale), axis=1)
+            line_color = np.array([WHITE] * players + [GREEN] * players, dtype=np.uint8)
+            self._draw_lines(frames, race_index[:, :1], start_x, start_y, end_x, end_y, line_color)
+
+    def _draw_lines(self, frames, race_index, start_x, start_y, end_x, end_y, line_color):
+        length = int(np.ceil(np.max(np.maximum(np.abs(end_x - start_x), np.abs(end_y - start_y)), initial=0))) + 1
+        steps = np.linspace(0, 1, length)
+        points_x = np.floor(start_x[..., None] + (end_x - start_x)[..., None] * steps).astype(np.int64)
+        points_y = np.floor(start_y[..., None] + (end_y - start_y)[..., None] * steps).astype(np.int64)
+
+        visible = (points_x >= 0) & (points_x < self.width) & (points_y >= 0) & (points_y < self.height)
+        owner = np.broadcast_to(race_index[..., None], visible.shape)
+        color = np.broadcast_to(line_color[None, :, None, :], visible.shape + (3,))
+        frames[owner[visible], points_y[visible], points_x[visible]] = color[visible]
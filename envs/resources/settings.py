@@ -1,3 +1,5 @@
+# The sizes and the type of the normalized observations and actions are shared with the agents
+from resources.settings import STATE_DIM, ACTION_DIM, DTYPE
 import math
 
 # game options and settings
@@ -9,9 +11,55 @@ CONSTANT_ACCEL = 0.85
 ROTATION_SPEED = math.pi / 10
 RADIUS = 60
 
+# Corners of the triangle used to draw the pods, in pixels, facing the x-axis
+TRIANGLE = ((36.22, 0), (-28.38, 22.5), (-28.38, -22.5))
+
+CHECKPOINT_RADIUS = 800
+MIN_CHECKPOINTS = 3
+MAX_CHECKPOINTS = 8
+MIN_CHECKPOINT_SPACING = 2500
+# Number of times generate_track starts over (drawing up to 1000 points each time) before it gives up
+TRACK_ATTEMPTS = 100
+BOOST_THRUST = 101
+BOOST_POWER = 661
+BOT_THRUST = 100
+REWARD_SCALE = 185
+CHECKPOINT_REWARD = 100
+
+# Collision settings, as in the original game.
+# A thrust of SHIELD_THRUST activates the shield: the pod has SHIELD_MASS on that turn,
+# and can not accelerate for the next SHIELD_TURNS turns.
+POD_RADIUS = 400
+POD_MASS = 1
+MIN_IMPULSE = 120
+SHIELD_THRUST = 102
+SHIELD_MASS = 10
+SHIELD_TURNS = 3
+
+# Normalized observations and actions: each player observes (x, y, target_x, target_y, distance), its STATE_DIM values,
+# divided by the map size and diagonal, and acts with (x, y, thrust), its ACTION_DIM values, in [-1, 1],
+# scaled by ACTION_SCALE after adding 1.
+# With collisions the thrust goes up to SHIELD_THRUST instead, scaled by SHIELD_ACTION_SCALE, so every thrust
+# from 0 to SHIELD_THRUST gets an equal part of [-1, 1] and the top one activates the shield.
+DIAGONAL = math.hypot(WIDTH, HEIGHT)
+ACTION_SCALE = (WIDTH / 2, HEIGHT / 2, BOOST_THRUST / 2)
+SHIELD_ACTION_SCALE = (WIDTH / 2, HEIGHT / 2, (SHIELD_THRUST + 1) / 2)
+
 # define colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (50, 50, 200)
+
+# Lookahead bot: every step it plays LOOKAHEAD_ANGLES x LOOKAHEAD_THRUSTS x LOOKAHEAD_HOLDS rollouts of LOOKAHEAD_HORIZON steps.
+# Each one aims at an angle from the direction of the next checkpoint (up to LOOKAHEAD_MAX_ANGLE on both sides),
+# LOOKAHEAD_AIM_DISTANCE away from the pod, with one of the thrusts, for hold steps, and then plays like a bot.
+# The rollouts are compared by their rewards, discounted by LOOKAHEAD_DISCOUNT per step, so reaching a checkpoint sooner wins.
+LOOKAHEAD_HORIZON = 20
+LOOKAHEAD_ANGLES = 9
+LOOKAHEAD_MAX_ANGLE = math.pi / 2
+LOOKAHEAD_THRUSTS = (0, 50, 100, BOOST_THRUST)
+LOOKAHEAD_HOLDS = (1, 3, 6)
+LOOKAHEAD_AIM_DISTANCE = 5000
+LOOKAHEAD_DISCOUNT = 0.98
@@ -0,0 +1,136 @@
+from envs.resources.settings import *
+from envs.resources.functions import *
+from envs.resources.collisions import *
+import numpy as np
+
+# The state of a RaceTrackEnv, as returned by get_state and taken by set_state and simulate_rollouts,
+# is one flat float64 array of STATE_HEADER + POD_STATE_SIZE * num_pods values:
+#   -terminated (0 or 1), and the index of the track in the environment's tracks list (-1 if it has no list),
+#   -then, for every pod (players first, then bots), the POD_STATE_FIELDS below.
+#    boosts is -1 for pods that can boost without limit.
+#
+# The ids and colors of the pods are not part of the state: they stay the same for the whole race.
+
+STATE_HEADER = 2
+POD_STATE_FIELDS = ("x", "y", "x_speed", "y_speed", "angle", "target", "checked", "passed", "distance", "boosts", "shield", "mass")
+POD_STATE_SIZE = len(POD_STATE_FIELDS)
+
+# Races are moved this far apart from each other along the x-axis to find the colliding pods of all of them at once
+RACE_SPACING = 1000000
+
+# Plays K action sequences from the same state, all at once, with the rules of RaceTrackEnv.step:
+# the physics of Pod.update (shield and boosts included), the checkpoints, the rewards and, if collisions is True,
+# the collisions, so every rollout ends in the same state as set_state and the same steps on a RaceTrackEnv
+# (as in the VectorRaceTrackEnv, the angles can differ in their last bits, as NumPy's arctan2 is not the one of math).
+#
+#   actions is an array of shape (K, steps, num_players, 3), with (x, y, thrust) in game units.
+#   An action with a NaN x plays like a bot on that step: it aims at its next checkpoint with BOT_THRUST.
+#
+#   It returns:
+#       -rewards, of shape (K, num_players): the rewards of every player, summed until the race ended,
+#        the reward of step t weighted by discount**t,
+#       -progress, of shape (K, num_players): the race distance covered by every player at the end (see Track.progress),
+#       -terminated, of shape (K,): whether the race ended,
+#       -states, of shape (K, len(state)): the state at the end of every rollout.
+def simulate_rollouts(track, state, actions, num_players, num_laps = None, collisions = False, discount = 1.0):
+    state = np.asarray(state, dtype=np.float64)
+    actions = np.asarray(actions, dtype=np.float64)
+    K, steps = actions.shape[:2]
+    assert actions.shape[2:] == (num_players, 3), "Actions must have shape (K, steps, num_players, 3)"
+
+    pods = state[STATE_HEADER:].reshape(-1, POD_STATE_SIZE)
+    fields = [np.repeat(pods[None, :, i], K, axis=0) for i in range(POD_STATE_SIZE)]
+    x, y, x_speed, y_speed, angle, target, checked, passed, distance, boosts, shield, mass = fields
+    target, checked, passed, boosts, shield = (field.astype(np.int64) for field in (target, checked, passed, boosts, shield))
+
+    players = slice(0, num_players)
+    checkpoints = track.positions
+    num_checkpoints = len(checkpoints)
+    terminated = np.full(K, state[0] != 0)
+    totals = np.zeros((K, num_players))
+    offsets = np.arange(K)[:, None] * RACE_SPACING
+
+    for step in range(steps):
+        # Bots, and players with a NaN action, aim at their next checkpoint with BOT_THRUST
+        target_x = checkpoints[target, 0]
+        target_y = checkpoints[target, 1]
+        aim_x = target_x.copy()
+        aim_y = target_y.copy()
+        thrust = np.full(x.shape, float(BOT_THRUST))
+        action = actions[:, step]
+        given = ~np.isnan(action[..., 0])
+        aim_x[:, players] = np.where(given, action[..., 0], target_x[:, players])
+        aim_y[:, players] = np.where(given, action[..., 1], target_y[:, players])
+        thrust[:, players] = np.where(given, action[..., 2], BOT_THRUST)
+        last_distance = distance[:, players].copy()
+
+        # Pod.update, for every pod of every rollout
+        mass = np.where(thrust == SHIELD_THRUST, SHIELD_MASS, POD_MASS).astype(np.float64)
+        shield = np.where(thrust == SHIELD_THRUST, SHIELD_TURNS + 1, shield)
+        boosting = (thrust == BOOST_THRUST) & (boosts >= 0)
+        thrust = np.where(boosting & (boosts == 0), BOT_THRUST, thrust)
+        boosts = boosts - (boosting & (boosts > 0))
+        thrust = np.where(shield > 0, 0, thrust)
+        shield = np.maximum(shield - 1, 0)
+
+        power = np.where(thrust == BOOST_THRUST, BOOST_POWER, thrust)
+        theta = normalize_angles(np.arctan2(aim_y - y, aim_x - x))
+        angle = update_angles(theta, angle)
+        x_speed = np.floor(x_speed * CONSTANT_ACCEL) + np.round(np.cos(angle) * power)
+        y_speed = np.floor(y_speed * CONSTANT_ACCEL) + np.round(np.sin(angle) * power)
+        x = x + x_speed
+        y = y + y_speed
+
+        # Checkpoint counter for each pod
+        distance = check_distances(np.trunc(x), np.trunc(y), target_x, target_y)
+        reached = distance < track.radius
+        if reached.any():
+            target = np.where(reached, (target + 1) % num_checkpoints, target)
+            checked = checked + reached
+            passed = passed + reached
+            distance = np.where(reached, check_distances(np.trunc(x), np.trunc(y), checkpoints[target, 0], checkpoints[target, 1]), distance)
+
+        ended = terminated.copy()
+        if num_laps != None:
+            ended |= np.any(passed / num_checkpoints >= num_laps, axis=1)
+
+        rewards = np.where(last_distance > distance[:, players], (last_distance - distance[:, players]) / REWARD_SCALE, -1.0)
+        scored = checked[:, players] == 1
+        rewards[scored] = CHECKPOINT_REWARD
+        checked[:, players][scored] = 0
+
+        if collisions:
+            x, y, x_speed, y_speed, distance = _collide(x, y, x_speed, y_speed, mass, distance, target, checkpoints, offsets)
+
+        totals += np.where(terminated[:, None], 0, rewards) * discount**step
+        terminated = ended
+
+    laps, index = np.divmod(passed[:, players] + 1, num_checkpoints)
+    progress = laps * track.lap_length + track.cumulative[index] - distance[:, players]
+
+    states = np.empty((K, len(state)))
+    states[:, 0] = terminated
+    states[:, 1] = state[1]
+    states[:, STATE_HEADER:] = np.stack((x, y, x_speed, y_speed, angle, target, checked, passed, distance, boosts, shield, mass),
+                                        axis=-1).reshape(K, -1)
+    return totals, progress, terminated, states
+
+# RaceTrackEnv._collide for every rollout: the races are moved apart to find their pairs in one call,
+# then the pairs are resolved on the flattened pods, which never mixes pods of different races.
+def _collide(x, y, x_speed, y_speed, mass, distance, target, checkpoints, offsets):
+    shape = x.shape
+    flat_x, flat_y = x.ravel(), y.ravel()
+    flat_x_speed, flat_y_speed = x_speed.ravel(), y_speed.ravel()
+    pairs = find_collision_pairs((x + offsets).ravel(), flat_y)
+    resolve_collisions(pairs, flat_x, flat_y, flat_x_speed, flat_y_speed, mass.ravel())
+
+    x, y = np.round(flat_x).reshape(shape), np.round(flat_y).reshape(shape)
+    x_speed, y_speed = np.trunc(flat_x_speed).reshape(shape), np.trunc(flat_y_speed).reshape(shape)
+
+    # The pods that moved need their distance to the target again
+    if len(pairs):
+        moved = np.zeros(x.size, dtype=bool)
+        moved[pairs.ravel()] = True
+        moved = moved.reshape(shape)
+        distance = np.where(moved, check_distances(np.trunc(x), np.trunc(y), checkpoints[target, 0], checkpoints[target, 1]), distance)
+    return x, y, x_speed, y_speed, distance
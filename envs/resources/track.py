@@ -0,0 +1,73 @@
+from envs.resources.settings import *
+import numpy as np
+import json
+
+# The Track class holds the checkpoints of a race, and everything about them that does not change during the race,
+# computed once when the track is created:
+#   - positions: the checkpoints as an array of shape (checkpoints, 2)
+#   - segments and lengths: the vector and distance from each checkpoint to the next one (the last one goes back to the first)
+#   - cumulative: the race distance from the first checkpoint to each checkpoint, with the lap length as the last value
+#   - radius: the distance at which a checkpoint counts as reached
+#
+# Tracks can be saved to and loaded from JSON files, with the checkpoints and the radius.
+
+class Track:
+    def __init__(self, checkpoints, radius = CHECKPOINT_RADIUS):
+        assert 2 <= len(checkpoints) <= MAX_CHECKPOINTS, "A track needs between 2 and MAX_CHECKPOINTS checkpoints"
+        self.checkpoints = [(int(x), int(y)) for x, y in checkpoints]
+        self.radius = radius
+
+        self.positions = np.array(self.checkpoints, dtype=np.float64)
+        self.segments = np.roll(self.positions, -1, axis=0) - self.positions
+        self.lengths = np.hypot(self.segments[:, 0], self.segments[:, 1])
+        self.cumulative = np.concatenate(([0], np.cumsum(self.lengths)))
+        self.lap_length = self.cumulative[-1]
+
+    def __len__(self):
+        return len(self.checkpoints)
+
+    # The number of laps completed after crossing the given number of checkpoints.
+    def laps(self, passed):
+        return passed / len(self.checkpoints)
+
+    # The race distance covered by a pod that crossed the given number of checkpoints since the start,
+    # and is at the given distance from its next checkpoint.
+    def progress(self, passed, distance):
+        next_checkpoint = passed + 1
+        laps, index = divmod(next_checkpoint, len(self.checkpoints))
+        return float(laps * self.lap_length + self.cumulative[index] - distance)
+
+    def save(self, path):
+        with open(path, "w") as file:
+            json.dump({"checkpoints": self.checkpoints, "radius": self.radius}, file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data["checkpoints"], data.get("radius", CHECKPOINT_RADIUS))
+
+
+DEFAULT_TRACK = Track([(12000, 1990), (10680, 4990), (14020, 3010), (3990, 7780)])
+
+# Generates a random track from the given seed: between MIN_CHECKPOINTS and MAX_CHECKPOINTS checkpoints
+# (or num_checkpoints), inside the map with a margin of one checkpoint radius, and all at least min_spacing apart.
+# It raises a ValueError if that many checkpoints could not be placed in TRACK_ATTEMPTS attempts.
+def generate_track(seed = None, num_checkpoints = None, min_spacing = MIN_CHECKPOINT_SPACING, radius = CHECKPOINT_RADIUS):
+    rng = np.random.default_rng(seed)
+    if num_checkpoints is None:
+        num_checkpoints = int(rng.integers(MIN_CHECKPOINTS, MAX_CHECKPOINTS + 1))
+
+    for _ in range(TRACK_ATTEMPTS):
+        checkpoints = []
+        for _ in range(1000):
+            point = rng.integers((radius, radius), (WIDTH - radius, HEIGHT - radius), endpoint=True)
+            if all(np.hypot(*(point - other)) >= min_spacing for other in checkpoints):
+                checkpoints.append(point)
+                if len(checkpoints) == num_checkpoints:
+                    return Track(checkpoints, radius)
+    raise ValueError("Could not place " + str(num_checkpoints) + " checkpoints " + str(min_spacing) + " apart on the map")
+
+# Generates count tracks, with seeds seed, seed + 1, ..., so the same pool can be generated again.
+def generate_tracks(count, seed = 0, **kwargs):
+    return [generate_track(seed + i, **kwargs) for i in range(count)]
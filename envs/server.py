@@ -0,0 +1,295 @@
+import numpy as np
+import asyncio
+import socket
+import struct
+import os
+
+from envs.resources import *
+from envs.pod_racing import RaceTrackEnv
+
+# The EnvServer hosts num_races RaceTrackEnvs behind a local socket, so bots written in any language can race them.
+# The EnvClient at the end of this file is the Python side of the protocol.
+#
+#   The address is "unix:/path/to/socket" for a Unix socket, or "host:port" for TCP.
+#
+#   Every message is little-endian, and starts with an 8 bytes header:
+#       op (uint8), status (uint8), count (uint16), request id (uint32)
+#   followed by count fixed-size records, so the size of every message is known from its header.
+#
+#   Requests (status 0), with P the number of players of every race:
+#       OP_INFO  (0), count 0:        no records
+#       OP_RESET (1), count races:    one record per race: race (uint32)
+#       OP_STEP  (2), count races:    one record per race: race (uint32), then P x (x, y, thrust) (float32),
+#                                     in the game units of RaceTrackEnv (0 to WIDTH, 0 to HEIGHT, 0 to 100 or BOOST_THRUST)
+#
+#   Responses have the op, count and request id of their request, and status 0 (STATUS_OK) or 1 (STATUS_ERROR):
+#       OP_INFO:              one record: version, num_races, num_players, num_bots (4 x uint32)
+#       OP_RESET and OP_STEP: one record per race, in the order of the request:
+#                             terminated (uint8), 3 padding bytes, then P x (x, y, x_speed, y_speed, angle, target_x, target_y)
+#                             and P x reward (float32)
+#       errors:               count 0, then the length of the message (uint32) and the message (utf-8).
+#                             The races of the request before the one that failed were still reset or stepped,
+#                             the one that failed was not: a step with an action out of range leaves its race as it was.
+#
+#   A client can send any number of requests without waiting for the answers (pipelining):
+#   they are answered in order, and all the requests that arrive together are answered with one write.
+#   A request with an unknown op closes the connection, as the rest of the stream can not be read.
+
+PROTOCOL_VERSION = 1
+OP_INFO = 0
+OP_RESET = 1
+OP_STEP = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+HEADER = struct.Struct("<BBHI")
+INFO = struct.Struct("<4I")
+ERROR = struct.Struct("<I")
+POD_VALUES = 7
+RESET_RECORD = struct.Struct("<I")
+
+def step_record(num_players):
+    return struct.Struct("<I" + "3f" * num_players)
+
+def race_record(num_players):
+    return struct.Struct("<B3x" + "{}f".format(POD_VALUES * num_players) + "{}f".format(num_players))
+
+# Returns ("unix", path) or ("tcp", (host, port)) from an address string.
+def parse_address(address):
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, port = address.rsplit(":", 1)
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+class EnvServer:
+    def __init__(self, num_races = 1, num_players = 1, num_bots = 1, num_laps = None, collisions = False, track = None, tracks = None):
+        self.num_races = num_races
+        self.num_players = num_players
+        self.num_bots = num_bots
+        self.envs = [RaceTrackEnv(num_players = num_players, num_bots = num_bots, num_laps = num_laps, collisions = collisions,
+                                  track = track, tracks = tracks) for _ in range(num_races)]
+        self.started = [False] * num_races
+
+        self.records = {OP_INFO: None, OP_RESET: RESET_RECORD, OP_STEP: step_record(num_players)}
+        self.race_record = race_record(num_players)
+        self.connections = 0
+
+    # Returns the size of the request starting at offset in buffer, or None if its header is not complete yet.
+    def request_size(self, buffer, offset):
+        if len(buffer) - offset < HEADER.size:
+            return None
+        op, status, count, request = HEADER.unpack_from(buffer, offset)
+        if op not in self.records:
+            raise ValueError("Unknown op " + str(op))
+        record = self.records[op]
+        return HEADER.size + (0 if record is None else count * record.size)
+
+    # Answers the complete request at offset in buffer, appending the response to out.
+    def handle(self, buffer, offset, out):
+        op, status, count, request = HEADER.unpack_from(buffer, offset)
+        start = len(out)
+        try:
+            if op == OP_INFO:
+                out += HEADER.pack(op, STATUS_OK, 1, request)
+                out += INFO.pack(PROTOCOL_VERSION, self.num_races, self.num_players, self.num_bots)
+            else:
+                out += HEADER.pack(op, STATUS_OK, count, request)
+                position = offset + HEADER.size
+                record = self.records[op]
+                for _ in range(count):
+                    if op == OP_RESET:
+                        self._reset(record.unpack_from(buffer, position)[0], out)
+                    else:
+                        values = record.unpack_from(buffer, position)
+                        self._step(values[0], values[1:], out)
+                    position += record.size
+        except Exception as error:
+            del out[start:]
+            message = (type(error).__name__ + ": " + str(error)).encode()
+            out += HEADER.pack(op, STATUS_ERROR, 0, request)
+            out += ERROR.pack(len(message))
+            out += message
+
+    def _race(self, race):
+        assert 0 <= race < self.num_races, "No race " + str(race)
+        return self.envs[race]
+
+    def _reset(self, race, out):
+        env = self._race(race)
+        env.reset()
+        self.started[race] = True
+        self._write_race(env, [0] * self.num_players, out)
+
+    def _step(self, race, values, out):
+        env = self._race(race)
+        assert self.started[race], "Race " + str(race) + " was not reset"
+        actions = [values[3 * i:3 * i + 3] for i in range(self.num_players)]
+        observations, rewards, terminated, info = env.step(actions)
+        self._write_race(env, rewards, out)
+
+    def _write_race(self, env, rewards, out):
+        values = []
+        for pod in env.pods[:self.num_players]:
+            target_x, target_y = env.checkpoints[pod.target]
+            values += (pod.x, pod.y, pod.x_speed, pod.y_speed, pod.angle, target_x, target_y)
+        out += self.race_record.pack(env.terminated, *values, *rewards)
+
+    async def serve(self, address, ready = None):
+        kind, where = parse_address(address)
+        loop = asyncio.get_running_loop()
+        if kind == "unix":
+            if os.path.exists(where):
+                os.remove(where)
+            server = await loop.create_unix_server(lambda: _Connection(self), where)
+        else:
+            server = await loop.create_server(lambda: _Connection(self), *where)
+        if ready is not None:
+            ready()
+        async with server:
+            await server.serve_forever()
+
+    # Serves forever (until interrupted) on the address.
+    def run(self, address):
+        try:
+            asyncio.run(self.serve(address))
+        except KeyboardInterrupt:
+            pass
+
+
+# One client connection: the bytes received are gathered until they hold complete requests,
+# which are all answered before the responses are written back at once.
+class _Connection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def connection_lost(self, error):
+        self.server.connections -= 1
+
+    def data_received(self, data):
+        self.buffer += data
+        out = bytearray()
+        offset = 0
+        try:
+            while True:
+                size = self.server.request_size(self.buffer, offset)
+                if size is None or len(self.buffer) - offset < size:
+                    break
+                self.server.handle(self.buffer, offset, out)
+                offset += size
+        except ValueError:
+            self.transport.write(out)
+            self.transport.close()
+            return
+
+        del self.buffer[:offset]
+        if out:
+            self.transport.write(out)
+
+
+# The EnvClient connects to an EnvServer and works with NumPy arrays:
+#
+#   reset(races) and step(races, actions) send one request and wait for its response, which they return as
+#       (pods, rewards, terminated): pods is an array of shape (races, num_players, 7) with
+#       (x, y, x_speed, y_speed, angle, target_x, target_y) for each player, rewards (races, num_players), and terminated (races,).
+#       actions is an array of shape (races, num_players, 3) with (x, y, thrust) for each player.
+#
+#   send_reset and send_step only send the request and return its id, so many requests can be in flight,
+#   and receive waits for the next response and returns (request id, (pods, rewards, terminated)).
+#   Responses come back in the order of the requests.
+
+class EnvClient:
+    def __init__(self, address):
+        kind, where = parse_address(address)
+        if kind == "unix":
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.connect(where)
+
+        self.buffer = bytearray(1 << 16)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.next_request = 0
+
+        request = self._send(OP_INFO, 0, b"")
+        version, self.num_races, self.num_players, self.num_bots = INFO.unpack(self._receive(request)[1])
+        assert version == PROTOCOL_VERSION, "Unsupported server version " + str(version)
+
+        P = self.num_players
+        self.step_dtype = np.dtype([("race", "<u4"), ("actions", "<f4", (P, 3))])
+        self.race_dtype = np.dtype([("terminated", "u1"), ("padding", "V3"), ("pods", "<f4", (P, POD_VALUES)), ("rewards", "<f4", (P,))])
+        assert self.race_dtype.itemsize == race_record(P).size
+
+    def send_reset(self, races):
+        races = np.asarray(races, dtype="<u4")
+        return self._send(OP_RESET, len(races), races.tobytes())
+
+    def send_step(self, races, actions):
+        records = np.zeros(len(races), dtype=self.step_dtype)
+        records["race"] = races
+        records["actions"] = actions
+        return self._send(OP_STEP, len(records), records.tobytes())
+
+    def receive(self):
+        request, body = self._receive()
+        races = np.frombuffer(body, dtype=self.race_dtype)
+        return request, (races["pods"], races["rewards"], races["terminated"].astype(bool))
+
+    def reset(self, races = None):
+        self.send_reset(range(self.num_races) if races is None else races)
+        return self.receive()[1]
+
+    def step(self, races, actions):
+        self.send_step(races, actions)
+        return self.receive()[1]
+
+    def close(self):
+        self.socket.close()
+
+    def _send(self, op, count, body):
+        request = self.next_request
+        self.next_request = (request + 1) & 0xFFFFFFFF
+        self.socket.sendall(HEADER.pack(op, 0, count, request) + body)
+        return request
+
+    # Reads the next response, and returns its request id and its body. Errors are raised as RuntimeErrors.
+    def _receive(self, expected = None):
+        op, status, count, request = HEADER.unpack(self._read(HEADER.size))
+        if status == STATUS_ERROR:
+            message = bytes(self._read(ERROR.unpack(self._read(ERROR.size))[0])).decode()
+            raise RuntimeError("Request " + str(request) + " failed: " + message)
+        size = INFO.size if op == OP_INFO else count * self.race_dtype.itemsize
+        body = bytes(self._read(size))
+        assert expected is None or request == expected, "Unexpected response"
+        return request, body
+
+    # Returns the next size bytes received, reading as much as is available into the buffer.
+    def _read(self, size):
+        if self.end - self.start < size:
+            if size > len(self.buffer) - self.start:
+                remaining = bytes(self.view[self.start:self.end])
+                if size > len(self.buffer):
+                    self.buffer = bytearray(size)
+                    self.view = memoryview(self.buffer)
+                self.view[:len(remaining)] = remaining
+                self.start, self.end = 0, len(remaining)
+            while self.end - self.start < size:
+                received = self.socket.recv_into(self.view[self.end:])
+                if received == 0:
+                    raise ConnectionError("The server closed the connection")
+                self.end += received
+
+        data = self.view[self.start:self.start + size]
+        self.start += size
+        if self.start == self.end:
+            self.start = self.end = 0
+        return data
@@ -0,0 +1,179 @@
+import numpy as np
+import math
+
+from envs.resources import *
+
+# The VectorRaceTrackEnv runs num_envs independent races at the same time.
+#
+#   Instead of a list of Pod objects, the state of every pod in every race is kept in NumPy arrays
+#   of shape (num_envs, num_pods), where the first num_players columns are the players and the
+#   remaining num_bots columns are the bots:
+#       -x, y: current position
+#       -x_speed, y_speed: current speed
+#       -angle: current facing angle
+#       -target: index of the next checkpoint
+#       -checked: checkpoint counter (reset for players every time they score a checkpoint)
+#       -passed: number of checkpoints crossed since the start, which counts the laps
+#
+#   The physics are the same as Pod.update (rotation limited by ROTATION_SPEED, thrust rounded,
+#   speed floored after the 0.85 friction, BOOST_THRUST giving BOOST_POWER), and the rewards and
+#   checkpoint rules are the same as RaceTrackEnv.step, so a policy trained here behaves the same
+#   in RaceTrackEnv.
+#
+#   Races that finish (or reach max_steps, if given) are reset automatically inside step.
+
+class VectorRaceTrackEnv():
+    def __init__(self, num_envs = 1, num_players = 1, num_bots = 1, num_laps = None, max_steps = None, track = None):
+
+        assert num_envs > 0, "Not enough races to play"
+        assert num_players + num_bots > 0, "Not enough pods to play the game"
+
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.num_bots = num_bots
+        self.num_pods = num_players + num_bots
+        self.num_laps = num_laps
+        self.max_steps = max_steps
+
+        self.track = DEFAULT_TRACK if track is None else track
+        self.checkpoints = self.track.positions
+
+        shape = (num_envs, self.num_pods)
+        self.x = np.zeros(shape)
+        self.y = np.zeros(shape)
+        self.x_speed = np.zeros(shape)
+        self.y_speed = np.zeros(shape)
+        self.angle = np.zeros(shape)
+        self.target = np.zeros(shape, dtype=np.int64)
+        self.checked = np.zeros(shape, dtype=np.int64)
+        self.passed = np.zeros(shape, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+
+    # The step function takes an array of actions of shape (num_envs, num_players, 3), each action being (x, y, thrust).
+    # Bots always aim at their next checkpoint with BOT_THRUST.
+    #
+    # the function will return:
+    #
+    #   -observations, an array of shape (num_envs, num_players, 4) with (x, y, target_x, target_y) for each player.
+    #
+    #   -rewards, an array of shape (num_envs, num_players).
+    #
+    #   -dones, an array of shape (num_envs,) indicating which races ended on this step.
+    #       Those races are reset before returning, so their observations are the first of the new race.
+    #
+    #   -info, a dictionary with:
+    #       "positions": array of shape (num_envs, num_pods, 2) with the location of all pods,
+    #       "final_observation": the last observations of the races that ended (same shape as observations, only valid where dones is True),
+    #       "terminated": which races ended because a pod completed the laps, rather than reaching max_steps,
+    #       "laps": array of shape (num_envs, num_players) with the number of laps each player completed (before the reset).
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.float64)
+        assert actions.shape == (self.num_envs, self.num_players, 3), "Actions must have shape (num_envs, num_players, 3)"
+        assert np.all((actions[..., 0] >= 0) & (actions[..., 0] <= WIDTH)
+                      & (actions[..., 1] >= 0) & (actions[..., 1] <= HEIGHT)
+                      & (actions[..., 2] >= 0) & (actions[..., 2] <= BOOST_THRUST)), "Action out of range"
+
+        players = slice(0, self.num_players)
+        num_checkpoints = len(self.checkpoints)
+
+        # Bots aim at their next checkpoint with a fixed thrust
+        target_x = self.checkpoints[self.target, 0]
+        target_y = self.checkpoints[self.target, 1]
+        aim_x = target_x.copy()
+        aim_y = target_y.copy()
+        thrust = np.full(self.x.shape, BOT_THRUST, dtype=np.float64)
+        aim_x[:, players] = actions[..., 0]
+        aim_y[:, players] = actions[..., 1]
+        thrust[:, players] = actions[..., 2]
+
+        last_distance = check_distances(np.trunc(self.x[:, players]), np.trunc(self.y[:, players]),
+                                        target_x[:, players], target_y[:, players])
+
+        self._update(aim_x, aim_y, thrust)
+
+        # Checkpoint counter for each pod
+        pos_x = np.trunc(self.x)
+        pos_y = np.trunc(self.y)
+        reached = check_distances(pos_x, pos_y, target_x, target_y) < self.track.radius
+        self.target = np.where(reached, (self.target + 1) % num_checkpoints, self.target)
+        self.checked += reached
+        self.passed += reached
+
+        # The number of checkpoints a pod crossed, divided by the number of checkpoints is the number of laps.
+        if self.num_laps != None:
+            self.terminated |= np.any((self.passed / num_checkpoints) >= self.num_laps, axis=1)
+
+        # Rewards are calculated as in RaceTrackEnv.step, against the (possibly new) target
+        distance = check_distances(pos_x[:, players], pos_y[:, players],
+                                   self.checkpoints[self.target[:, players], 0],
+                                   self.checkpoints[self.target[:, players], 1])
+        rewards = np.where(last_distance > distance, (last_distance - distance) / REWARD_SCALE, -1.0)
+        scored = self.checked[:, players] == 1
+        rewards[scored] = CHECKPOINT_REWARD
+        self.checked[:, players][scored] = 0
+
+        self.steps += 1
+        dones = self.terminated.copy()
+        if self.max_steps != None:
+            dones |= self.steps >= self.max_steps
+
+        observations = self._get_obs()
+        info = {"positions": self._get_info(), "final_observation": observations.copy(), "terminated": self.terminated.copy(),
+                "laps": self.passed[:, players] // num_checkpoints}
+
+        if np.any(dones):
+            self._reset_envs(dones)
+            observations = self._get_obs()
+
+        return observations, rewards, dones, info
+
+    # This function moves every pod one tick towards its (x, y) aim point, with the same rules as Pod.update.
+    def _update(self, aim_x, aim_y, thrust):
+        thrust = np.where(thrust == BOOST_THRUST, BOOST_POWER, thrust)
+        theta = normalize_angles(np.arctan2(aim_y - self.y, aim_x - self.x))
+        self.angle = update_angles(theta, self.angle)
+
+        x_power = np.round(np.cos(self.angle) * thrust)
+        y_power = np.round(np.sin(self.angle) * thrust)
+        self.x_speed = np.floor(self.x_speed * CONSTANT_ACCEL) + x_power
+        self.y_speed = np.floor(self.y_speed * CONSTANT_ACCEL) + y_power
+
+        self.x += self.x_speed
+        self.y += self.y_speed
+
+    def _get_obs(self):
+        players = slice(0, self.num_players)
+        observations = np.empty((self.num_envs, self.num_players, 4), dtype=np.int64)
+        observations[..., 0] = self.x[:, players]
+        observations[..., 1] = self.y[:, players]
+        observations[..., 2:] = self.checkpoints[self.target[:, players]]
+        return observations
+
+    def _get_info(self):
+        return np.stack((self.x, self.y), axis=-1).astype(np.int64)
+
+    # Places the pods of the races selected by the boolean mask at the starting position.
+    def _reset_envs(self, mask):
+        start_x, start_y = self.checkpoints[0]
+        first_x, first_y = self.checkpoints[1]
+
+        self.x[mask] = start_x
+        self.y[mask] = start_y
+        self.x_speed[mask] = 0
+        self.y_speed[mask] = 0
+        self.angle[mask] = math.atan2((first_y - start_y), (first_x - start_x))
+        self.target[mask] = 1
+        self.checked[mask] = 0
+        self.passed[mask] = 0
+        self.steps[mask] = 0
+        self.terminated[mask] = False
+
+    # The reset function places all pods of all races at the starting position, and returns
+    # the observations and info in the same format as step.
+    def reset(self, **kwargs):
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._get_obs(), {"positions": self._get_info()}
+
+    def close(self):
+        pass
@@ -1,8 +1,33 @@
 from agents.AI import Agent
+from agents.resources.settings import ACTION_DIM, DTYPE
 from envs.pod_racing import RaceTrackEnv
 from resources import *
+from resources.profiler import profiler
 
 import numpy as np
+import argparse
+import json
+import sys
+import os
+
+# The command line of the project:
+#
+#   python main.py train                          trains the agents without any window, resuming from the checkpoints if there are some
+#   python main.py train --show                   also shows a race in a window before and after training
+#   python main.py train --metrics runs           also appends the training metrics to CSV files in runs/ (see resources/metrics.py)
+#   python main.py train --replay replay          keeps the replay buffers on disk in replay/ and resumes them (see agents/replay.py)
+#   python main.py train --offline --replay r     learns from the replay buffers in r/ without playing any race
+#   python main.py play                           shows races of the agents in the checkpoints in a window
+#   python main.py eval --races 20                plays races without a window and prints their rewards and progress
+#   python main.py eval --capture frames          also saves pictures of the races in frames/ (see envs/capture.py)
+#   python main.py bench env_step                 runs the benchmark suite (same options as python -m benchmarks)
+#   python main.py serve unix:/tmp/pods.sock      serves races to bots in other processes (see envs/server.py)
+#
+# Without a command, python main.py trains with the settings below. Every setting can also be changed with an option,
+# see python main.py train --help.
+#
+# Only what the command uses is imported: pygame is loaded by the environment when a window or a rasterizer
+# is needed, and the workers, viewer, population and benchmarks are imported by the commands that use them.
 
 # Set some training settings
 buffer_size = 500
@@ -10,85 +35,330 @@ batch_size = 100
 epochs = 100
 num_agents = 1
 
-# Set the playing environment to render and a trainign environment without rendering
-training_env = RaceTrackEnv(render_mode="rgb_array", num_players = num_agents, num_bots = 0)
-playing_env = RaceTrackEnv(render_mode="human", render_fps = 20, num_players = num_agents, num_laps = 5)
+# With use_population = True the agents are trained as one Population, so all of them act and learn
+# in one call per step instead of one per agent. It is only used by the local training loop (num_workers = 0).
+use_population = False
 
-# Populate a list of agents
-agents = []
-for _ in range(num_agents):
-    agents.append(Agent(buffer_size = buffer_size))
-    
+# With num_workers > 0, the experience is collected by that many worker processes while this process only learns.
+# An epoch is then steps_per_epoch learning steps, and the new actors are sent to the workers after each epoch.
+num_workers = 0
+steps_per_epoch = 500
 
-# The main loop shows what the agent/s do for 4 laps
-# Then trains the agent/s for as many epochs
-# Then plays shows the user another 4 laps after training. 
+# The agents (with their memory) are saved every checkpoint_interval epochs, in checkpoint_path.
+# If a checkpoint is found there when starting, the training continues from it.
+checkpoint_path = "checkpoints"
+checkpoint_interval = 10
 
-done = False
-states, info = playing_env.reset()
-states = normalize_state(states)
-while not done:
-        prev_state = states
-        actions = []
-        
-        for i, agent in enumerate(agents):
-            
-            action = np.resize(agent.forward(states[i]), (3,))
-            actions.append(action)
+# With a metrics_path, the training metrics of each agent (losses, Q-values, episode rewards and laps) are appended
+# to agent_<i>.csv in that directory (population.csv with use_population), every METRICS_FLUSH_INTERVAL seconds.
+metrics_path = None
 
-        states, rewards, done, info = playing_env.step(normalize_action(actions))
-        states = normalize_state(states)
+# With a replay_path, the memory of each agent is a DiskReplayBuffer of buffer_size experiences in replay_path/agent_<i>
+# (see agents/replay.py), kept on disk between runs, and the agents learn once it holds REPLAY_WARMUP experiences.
+# With offline = True, the agents only learn from the experience already in it, steps_per_epoch updates per epoch,
+# without playing any race.
+replay_path = None
+offline = False
 
+# With profile = True, the time of each phase of the training is printed after every epoch.
+# If profile_trace_epochs is set to (first, last), those epochs also run under cProfile, saved in profile_trace_path.
+profile = False
+profile_trace_epochs = None
+profile_trace_path = "profile.prof"
 
+# With live_viewer = True, a separate process plays races with the latest actors in its own window during training.
+# The actors are sent to it after every epoch.
+# It shows viewer_fps steps per second, and with viewer_skip_frames it skips drawing steps when it falls behind.
+live_viewer = False
+viewer_fps = 20
+viewer_skip_frames = True
 
-for e in range(epochs):
-    eps = EPSILON
-    done = False
-    states, info = training_env.reset()
-    states = normalize_state(states)
-    steps = 0
-    indices = []
+# The races shown with play, and with train --show before and after training
+show_laps = 5
+show_fps = 20
+
+# The environments work with normalized arrays: the states are one (num_agents, 5) array, and the actions
+# one (num_agents, 3) array in [-1, 1], both of the agents' DTYPE.
+def make_env(num_agents, render_mode = None, **kwargs):
+    return RaceTrackEnv(render_mode = render_mode, num_players = num_agents, normalized = True, dtype = DTYPE, **kwargs)
+
+# Returns the agents and the number of finished epochs, from the last checkpoint if there is one.
+# With a replay directory, every agent's memory is a DiskReplayBuffer in it, resumed if it exists.
+def load_agents(path, num_agents, buffer_size = buffer_size, replay = None):
+    memories = [None] * num_agents
+    if replay is not None:
+        from agents.replay import DiskReplayBuffer
+        memories = [DiskReplayBuffer(os.path.join(replay, "agent_" + str(i)), buffer_size) for i in range(num_agents)]
+
+    agents = []
+    start_epoch = 0
+    if os.path.exists(os.path.join(path, "training.json")):
+        with open(os.path.join(path, "training.json")) as file:
+            start_epoch = json.load(file)["epochs"]
+        for i in range(num_agents):
+            agents.append(Agent.load(os.path.join(path, "agent_" + str(i)), memory = memories[i]))
+        print("Resuming from epoch " + str(start_epoch))
+    else:
+        for i in range(num_agents):
+            agents.append(Agent(buffer_size = buffer_size, memory = memories[i]))
+    return agents, start_epoch
 
-    print("Epoch: " + str(e))
+# Saves every agent in its own directory, and the number of finished epochs in training.json,
+# written to a temporary file and then moved in its place, so it is never left half written
+def save_checkpoint(path, agents, epoch):
+    for i, agent in enumerate(agents):
+        agent.save(os.path.join(path, "agent_" + str(i)), include_memory = True)
+    temporary = os.path.join(path, "training.json.tmp")
+    with open(temporary, "w") as file:
+        json.dump({"epochs": epoch}, file)
+    os.replace(temporary, os.path.join(path, "training.json"))
 
+# Plays one race with frozen copies of the agents' actors, until it ends or after max_steps steps,
+# and returns the total reward of every agent, the number of steps and the last info.
+def play_race(env, agents, max_steps = None):
+    policies = [agent.actor.freeze() for agent in agents]
+    actions = np.zeros((len(agents), ACTION_DIM), dtype=DTYPE)
+    totals = np.zeros(len(agents))
+    steps = 0
+    done = False
+    states, info = env.reset()
     while not done:
-        prev_state = states
-        actions = []
-                
-        # Given a list of states, populate the list of actions, with the action for each agent. 
-        for i, agent in enumerate(agents):
-            if np.random.random() < eps:
-                action = np.random.uniform(low=-1, high= 1, size=(3,))
-            else:
-                action = np.resize(agent.forward(states[i]), (3,))
-            actions.append(action)
-
-        # Given the list of actions, return a list of states and rewards.
-        states, rewards, done, info = training_env.step(normalize_action(actions))
-        states = normalize_state(states)
-
-        for i, agent in enumerate(agents):
-            agent.learn(states[i], actions[i], rewards[i], states[i], batch_size)
+        for i, policy in enumerate(policies):
+            actions[i] = policy.act(states[i])
 
+        states, rewards, done, info = env.step(actions)
+        totals += rewards
         steps += 1
-        if steps >= 500:
+        if max_steps is not None and steps >= max_steps:
             done = True
-        
-        if eps > 0:
-            eps -= 0.005
-
-    
-done = False
-states, info = playing_env.reset()
-states = normalize_state(states)
-while not done:
-        prev_state = states
-        actions = []
-        
-        for i, agent in enumerate(agents):
-            
-            action = np.resize(agent.forward(states[i]), (3,))
-            actions.append(action)
-
-        states, rewards, done, info = playing_env.step(normalize_action(actions))
-        states = normalize_state(states)
\ No newline at end of file
+    return totals, steps, info
+
+
+# The main loop shows what the agent/s do for some laps if asked to,
+# then trains the agent/s for as many epochs,
+# then shows the user another race after training.
+def train(args):
+    agents, start_epoch = load_agents(args.checkpoints, args.agents, args.buffer_size, args.replay)
+    assert not args.offline or args.replay, "Offline training needs a replay directory"
+    assert not args.population or not args.replay, "The population keeps its own memory, it can not use a replay directory"
+    training_env = make_env(args.agents, render_mode = "rgb_array", num_bots = 0)
+
+    if args.show:
+        playing_env = make_env(args.agents, render_mode = "human", render_fps = show_fps, num_laps = show_laps)
+        play_race(playing_env, agents)
+
+    # The population members are agents whose networks are views of the population's, so the rest uses them as the agents
+    population = None
+    if args.population:
+        from agents.population import Population
+        assert args.workers == 0, "The population is only used by the local training loop"
+        population = Population.from_agents(agents, args.buffer_size)
+        agents = population.agents()
+
+    viewer = None
+    if args.viewer:
+        from agents.viewer import LiveViewer
+        viewer = LiveViewer([agent.actor for agent in agents], render_fps = args.viewer_fps, skip_frames = args.viewer_skip_frames)
+        viewer.start()
+
+    # After every epoch: the viewer gets the new actors, and the agents are saved every checkpoint_interval epochs
+    def end_epoch(e, rewards = None):
+        if viewer is not None:
+            viewer.publish([agent.actor for agent in agents])
+        if (e + 1) % args.checkpoint_interval == 0:
+            if population is not None:
+                population.agents()
+            save_checkpoint(args.checkpoints, agents, e + 1)
+        profiler.report(e)
+
+    # The agents (or the population) that learn, each with its own metrics
+    learners = agents if population is None else [population]
+    if args.metrics:
+        for i, learner in enumerate(learners):
+            learner.metrics.open(os.path.join(args.metrics, "population.csv" if population is not None else "agent_" + str(i) + ".csv"))
+
+    if args.profile:
+        profiler.enable(args.trace_epochs, args.trace_path)
+
+    if args.offline:
+        for e in range(start_epoch, args.epochs):
+            print("Epoch: " + str(e))
+            profiler.epoch(e)
+            with profiler.phase("agent.learn"):
+                for _ in range(args.steps_per_epoch):
+                    for agent in agents:
+                        agent.update(args.batch_size)
+            end_epoch(e)
+
+    elif args.workers > 0:
+        from agents.rollout import RolloutWorkers
+        workers = RolloutWorkers(args.workers, [agent.actor for agent in agents], max_steps = 500)
+        workers.start()
+
+        for e in range(start_epoch, args.epochs):
+            print("Epoch: " + str(e))
+            profiler.epoch(e)
+
+            for _ in range(args.steps_per_epoch):
+                with profiler.phase("drain"):
+                    profiler.count("transitions", workers.drain(agents, timeout = 1))
+                with profiler.phase("agent.learn"):
+                    for agent in agents:
+                        agent.update(args.batch_size)
+
+            workers.publish([agent.actor for agent in agents])
+            end_epoch(e)
+
+        workers.close()
+    else:
+        from agents.training import train_epochs
+        train_epochs(training_env, agents, start_epoch, args.epochs, args.steps_per_epoch, args.batch_size, population,
+                     end_epoch = end_epoch)
+
+    profiler.disable()
+    if viewer is not None:
+        viewer.close()
+    for learner in learners:
+        learner.metrics.close()
+    if args.replay:
+        for agent in agents:
+            agent.memory.close()
+
+    if args.show:
+        play_race(playing_env, agents)
+
+# Shows races of the agents in a window.
+def play(args):
+    agents, _ = load_agents(args.checkpoints, args.agents)
+    env = make_env(args.agents, render_mode = "human", render_fps = args.fps, num_bots = args.bots, num_laps = args.laps)
+    env = capture(env, args)
+    for _ in range(args.races):
+        play_race(env, agents, args.max_steps)
+    env.close()
+
+# Plays races without a window, and prints the reward and race distance of every agent in each race, and their means.
+def evaluate(args):
+    if args.seed is not None:
+        np.random.seed(args.seed)
+    agents, _ = load_agents(args.checkpoints, args.agents)
+    env = capture(make_env(args.agents, num_bots = args.bots, num_laps = args.laps), args)
+
+    rewards = []
+    progress = []
+    for race in range(args.races):
+        totals, steps, info = play_race(env, agents, args.max_steps)
+        rewards.append(totals)
+        progress.append(info["progress"])
+        print("Race {}: {} steps, rewards {}, progress {}".format(
+            race, steps, np.round(totals, 1).tolist(), np.round(info["progress"]).tolist()))
+
+    print("Mean rewards {}, mean progress {}".format(
+        np.round(np.mean(rewards, axis=0), 1).tolist(), np.round(np.mean(progress, axis=0)).tolist()))
+    env.close()
+
+# With --capture, wraps the environment in a FrameCapture that saves the races in that directory.
+def capture(env, args):
+    if args.capture is None:
+        return env
+    from envs.capture import FrameCapture
+    return FrameCapture(env, args.capture, args.capture_format, args.capture_every, args.capture_downscale,
+                        block = args.capture_block)
+
+def serve(args):
+    from envs.server import EnvServer
+    server = EnvServer(args.races, args.players, args.bots, args.laps, args.collisions)
+    print("Serving " + str(args.races) + " races on " + args.address)
+    server.run(args.address)
+
+def bench(args):
+    from benchmarks.runner import main as run_benchmarks
+    run_benchmarks(args.options, prog = "main.py bench")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py")
+    commands = parser.add_subparsers(dest="command")
+
+    def capture_options(command):
+        command.add_argument("--capture", metavar="DIRECTORY", help="save pictures of the races in this directory")
+        command.add_argument("--capture-format", choices=("npz", "png"), default="npz", help="npz chunks or png files (default %(default)s)")
+        command.add_argument("--capture-every", type=int, default=1, help="save one step out of this many (default %(default)s)")
+        command.add_argument("--capture-downscale", type=int, default=1, help="keep one pixel out of this many (default %(default)s)")
+        command.add_argument("--capture-block", action="store_true", help="wait for the writer when it falls behind instead of dropping frames")
+
+    def agent_options(command):
+        command.add_argument("--agents", type=int, default=num_agents, help="number of agents (default %(default)s)")
+        command.add_argument("--checkpoints", default=checkpoint_path, help="checkpoint directory (default %(default)s)")
+
+    command = commands.add_parser("train", help="train the agents, resuming from the checkpoints if there are some")
+    agent_options(command)
+    command.add_argument("--epochs", type=int, default=epochs, help="number of epochs (default %(default)s)")
+    command.add_argument("--buffer-size", type=int, default=buffer_size, help="replay buffer size (default %(default)s)")
+    command.add_argument("--batch-size", type=int, default=batch_size, help="learning batch size (default %(default)s)")
+    command.add_argument("--steps-per-epoch", type=int, default=steps_per_epoch, help="steps per epoch (default %(default)s)")
+    command.add_argument("--workers", type=int, default=num_workers, help="number of rollout worker processes (default %(default)s)")
+    command.add_argument("--population", action="store_true", default=use_population, help="train the agents as one Population")
+    command.add_argument("--metrics", default=metrics_path, metavar="DIRECTORY", help="append the training metrics to CSV files in this directory")
+    command.add_argument("--replay", default=replay_path, metavar="DIRECTORY", help="keep the replay buffers on disk in this directory")
+    command.add_argument("--offline", action="store_true", default=offline, help="only learn from the experience in --replay, without playing")
+    command.add_argument("--checkpoint-interval", type=int, default=checkpoint_interval, help="epochs between checkpoints (default %(default)s)")
+    command.add_argument("--profile", action="store_true", default=profile, help="print the time of each phase after every epoch")
+    command.add_argument("--trace-epochs", type=int, nargs=2, default=profile_trace_epochs, metavar=("FIRST", "LAST"),
+                         help="epochs run under cProfile")
+    command.add_argument("--trace-path", default=profile_trace_path, help="cProfile output file (default %(default)s)")
+    command.add_argument("--viewer", action="store_true", default=live_viewer, help="watch the training in a live viewer window")
+    command.add_argument("--viewer-fps", type=int, default=viewer_fps, help="steps per second of the viewer (default %(default)s)")
+    command.add_argument("--no-skip-frames", dest="viewer_skip_frames", action="store_false", default=viewer_skip_frames,
+                         help="draw every step in the viewer, even when it falls behind")
+    command.add_argument("--show", action="store_true", help="show a race in a window before and after training")
+    command.set_defaults(run=train)
+
+    command = commands.add_parser("play", help="show races of the agents in a window")
+    agent_options(command)
+    command.add_argument("--races", type=int, default=1, help="number of races (default %(default)s)")
+    command.add_argument("--laps", type=int, default=show_laps, help="laps per race (default %(default)s)")
+    command.add_argument("--bots", type=int, default=1, help="number of bots (default %(default)s)")
+    command.add_argument("--fps", type=int, default=show_fps, help="steps per second (default %(default)s)")
+    command.add_argument("--max-steps", type=int, help="steps after which a race is stopped")
+    capture_options(command)
+    command.set_defaults(run=play)
+
+    command = commands.add_parser("eval", help="play races without a window and print the results")
+    agent_options(command)
+    command.add_argument("--races", type=int, default=10, help="number of races (default %(default)s)")
+    command.add_argument("--laps", type=int, default=3, help="laps per race (default %(default)s)")
+    command.add_argument("--bots", type=int, default=1, help="number of bots (default %(default)s)")
+    command.add_argument("--max-steps", type=int, default=1000, help="steps after which a race is stopped (default %(default)s)")
+    command.add_argument("--seed", type=int, help="seed of the races")
+    capture_options(command)
+    command.set_defaults(run=evaluate)
+
+    command = commands.add_parser("serve", help="serve races on a Unix socket or TCP port, for bots in other processes")
+    command.add_argument("address", help="unix:/path/to/socket or host:port")
+    command.add_argument("--races", type=int, default=64, help="number of races (default %(default)s)")
+    command.add_argument("--players", type=int, default=1, help="players per race (default %(default)s)")
+    command.add_argument("--bots", type=int, default=1, help="bots per race (default %(default)s)")
+    command.add_argument("--laps", type=int, default=3, help="laps per race (default %(default)s)")
+    command.add_argument("--collisions", action="store_true", help="make the pods collide")
+    command.set_defaults(run=serve)
+
+    # The options of bench are left unparsed here and passed to the benchmark suite
+    command = commands.add_parser("bench", help="run the benchmark suite, see main.py bench --help", add_help=False)
+    command.set_defaults(run=bench)
+
+    return parser
+
+def main(argv = None):
+    parser = build_parser()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Without a command (only options, or nothing), the options are the ones of train
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["train"] + argv
+    args, options = parser.parse_known_args(argv)
+    if options and args.command != "bench":
+        parser.error("unrecognized arguments: " + " ".join(options))
+    args.options = options
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -24,4 +24,16 @@ def mse(y_target, y_pred):
     return np.mean(np.power(y_target - y_pred, 2))
 
 def mse_prime(y_target, y_pred):
-    return 2 * (y_pred - y_target) / np.size(y_target)
\ No newline at end of file
+    return 2 * (y_pred - y_target) / np.size(y_target)
+
+# Array version of normalize_state (scale_actions, the one of normalize_action, is in envs/resources/functions.py).
+#
+# normalize_observations takes an array of shape (..., 4) with (x, y, target_x, target_y) rows,
+# as returned by the VectorRaceTrackEnv, and returns the (..., STATE_DIM) states the agents are trained on, of the given dtype.
+def normalize_observations(observations, dtype = DTYPE):
+    observations = np.asarray(observations, dtype=np.float64)
+    states = np.empty(observations.shape[:-1] + (STATE_DIM,), dtype=dtype)
+    states[..., :4] = observations / [WIDTH, HEIGHT, WIDTH, HEIGHT]
+    distance = np.hypot(observations[..., 0] - observations[..., 2], observations[..., 1] - observations[..., 3])
+    states[..., 4] = distance / (WIDTH **2 + HEIGHT**2)**0.5
+    return states
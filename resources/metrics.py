@@ -0,0 +1,271 @@
+from resources.settings import *
+import numpy as np
+import threading
+import queue
+import time
+import csv
+import os
+
+# The Metric class keeps the statistics of one stream of values (a loss, a reward...) in a fixed amount of memory,
+# however many values are added:
+#
+#   -the last `window` values, in a ring buffer (values() returns them, oldest first),
+#   -the count, running mean and variance (Welford), minimum, maximum, last value
+#    and exponential moving average (weight ema) of every value added since the start,
+#   -a decimated history of the whole run: at most `history` points, each the mean of `stride` consecutive values.
+#    When it is full, every pair of points is averaged into one and the stride doubles,
+#    so it always covers the whole run, with finer points for short runs (history() returns (counts, means)),
+#   -the count, sum, minimum, maximum and last value since the last interval() call, for the periodic exports.
+#
+#   A metric can hold scalars (shape ()) or arrays of a fixed shape, e.g. one value per member of a population,
+#   and then every statistic has that shape. Scalars use plain Python floats, so add only costs a few microseconds.
+#
+#   add(value) adds one value, and add_many(values) a batch of them along the first axis, merged all at once.
+#   For the moving average a batch counts as one value, its mean.
+
+class Metric:
+    def __init__(self, shape = (), window = METRICS_WINDOW, history = METRICS_HISTORY, ema = METRICS_EMA):
+        self.shape = tuple(shape)
+        self.ema_weight = ema
+        self.minimum = np.minimum if self.shape else min
+        self.maximum = np.maximum if self.shape else max
+
+        self.recent = np.zeros((window,) + self.shape)
+        self.position = 0
+        self.history_means = np.zeros((history,) + self.shape)
+        self.history_size = 0
+        self.stride = 1
+        self.block = 0.0
+        self.block_count = 0
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.ema = None
+        self._reset_interval()
+
+    def _reset_interval(self):
+        self.interval_count = 0
+        self.interval_sum = 0.0
+        self.interval_min = None
+        self.interval_max = None
+
+    def add(self, value):
+        if self.shape:
+            value = np.array(value, dtype=np.float64)
+        else:
+            value = float(value)
+
+        self.recent[self.position % len(self.recent)] = value
+        self.position += 1
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (value - self.mean)
+        self.min = value if self.min is None else self.minimum(self.min, value)
+        self.max = value if self.max is None else self.maximum(self.max, value)
+        self.last = value
+        self.ema = value if self.ema is None else self.ema + self.ema_weight * (value - self.ema)
+
+        self.interval_count += 1
+        self.interval_sum = self.interval_sum + value
+        self.interval_min = value if self.interval_min is None else self.minimum(self.interval_min, value)
+        self.interval_max = value if self.interval_max is None else self.maximum(self.interval_max, value)
+
+        self.block = self.block + value
+        self.block_count += 1
+        if self.block_count == self.stride:
+            self._add_history()
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape((-1,) + self.shape)
+        n = len(values)
+        if n == 0:
+            return
+
+        # Only the last window values can stay in the ring buffer
+        window = len(self.recent)
+        kept = min(n, window)
+        self.recent[(self.position + n - kept + np.arange(kept)) % window] = values[n - kept:]
+        self.position += n
+
+        # The statistics of the batch are merged with the running ones (Chan et al.)
+        batch_mean = values.mean(axis=0)
+        batch_m2 = np.square(values - batch_mean).sum(axis=0)
+        batch_min = values.min(axis=0)
+        batch_max = values.max(axis=0)
+        if not self.shape:
+            batch_mean, batch_m2, batch_min, batch_max = float(batch_mean), float(batch_m2), float(batch_min), float(batch_max)
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = batch_min if self.min is None else self.minimum(self.min, batch_min)
+        self.max = batch_max if self.max is None else self.maximum(self.max, batch_max)
+        self.last = values[-1].copy() if self.shape else float(values[-1])
+        self.ema = batch_mean if self.ema is None else self.ema + self.ema_weight * (batch_mean - self.ema)
+
+        self.interval_count += n
+        self.interval_sum = self.interval_sum + batch_mean * n
+        self.interval_min = batch_min if self.interval_min is None else self.minimum(self.interval_min, batch_min)
+        self.interval_max = batch_max if self.interval_max is None else self.maximum(self.interval_max, batch_max)
+
+        # The history gets the values block by block
+        start = 0
+        while start < n:
+            take = min(self.stride - self.block_count, n - start)
+            self.block = self.block + values[start:start + take].sum(axis=0)
+            self.block_count += take
+            start += take
+            if self.block_count == self.stride:
+                self._add_history()
+
+    def _add_history(self):
+        self.history_means[self.history_size] = self.block / self.stride
+        self.history_size += 1
+        self.block = 0.0
+        self.block_count = 0
+        if self.history_size == len(self.history_means):
+            half = self.history_size // 2
+            self.history_means[:half] = (self.history_means[0:2 * half:2] + self.history_means[1:2 * half:2]) / 2
+            self.history_size = half
+            self.stride *= 2
+
+    def var(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    def std(self):
+        return np.sqrt(self.var())
+
+    # The last values added (up to window of them), oldest first
+    def values(self):
+        window = len(self.recent)
+        if self.position <= window:
+            return self.recent[:self.position].copy()
+        return np.roll(self.recent, -(self.position % window), axis=0)
+
+    # The decimated history: the number of values added at the end of each point, and the mean of each point
+    def history(self):
+        counts = (np.arange(self.history_size) + 1) * self.stride
+        return counts, self.history_means[:self.history_size].copy()
+
+    def summary(self):
+        return {"count": self.count, "last": self.last, "mean": self.mean, "std": self.std(),
+                "min": self.min, "max": self.max, "ema": self.ema}
+
+    # Returns (count, mean, min, max, last) of the values added since the last call, or None if there are none.
+    def interval(self):
+        if self.interval_count == 0:
+            return None
+        result = (self.interval_count, self.interval_sum / self.interval_count, self.interval_min, self.interval_max, self.last)
+        self._reset_interval()
+        return result
+
+
+# The Metrics class is a set of named Metrics, created the first time a name is used,
+# that can also be exported to an append-only CSV file.
+#
+#   After open(path), the statistics of every interval of flush_interval seconds are written to the file,
+#   one row per metric (and per element, for metrics with a shape, named name[i]):
+#       time (Unix time of the flush), name, count, mean, min, max, last, ema
+#   The rows are collected by the training thread, in add, when the interval is over, and written by a background thread,
+#   so the training never waits for the disk. close() writes the last interval and closes the file.
+
+class Metrics:
+    def __init__(self, window = METRICS_WINDOW, history = METRICS_HISTORY, ema = METRICS_EMA, flush_interval = METRICS_FLUSH_INTERVAL):
+        self.window = window
+        self.history = history
+        self.ema = ema
+        self.flush_interval = flush_interval
+        self.metrics = {}
+
+        self.path = None
+        self.queue = None
+        self.thread = None
+        self.next_flush = None
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def __contains__(self, name):
+        return name in self.metrics
+
+    def get(self, name, shape = ()):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Metric(shape, self.window, self.history, self.ema)
+        return metric
+
+    def add(self, name, value, shape = ()):
+        self.get(name, shape).add(value)
+        if self.next_flush is not None and time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def add_many(self, name, values, shape = ()):
+        self.get(name, shape).add_many(values)
+        if self.next_flush is not None and time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def summary(self):
+        return {name: metric.summary() for name, metric in self.metrics.items()}
+
+    # Starts exporting to the CSV file at path, appending to it if it exists.
+    def open(self, path):
+        assert self.thread is None, "The metrics are already exported to " + str(self.path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target = self._writer, args = (path,), daemon = True)
+        self.thread.start()
+        self.next_flush = time.monotonic() + self.flush_interval
+
+    # Sends the statistics of the interval to the writer thread.
+    def flush(self):
+        if self.thread is None:
+            return
+        self.next_flush = time.monotonic() + self.flush_interval
+        now = round(time.time(), 3)
+        rows = []
+        for name, metric in self.metrics.items():
+            interval = metric.interval()
+            if interval is None:
+                continue
+            if metric.shape:
+                for index in np.ndindex(metric.shape):
+                    label = name + "[" + ",".join(str(i) for i in index) + "]"
+                    rows.append([now, label, interval[0]] + [float(value[index]) for value in interval[1:]] + [float(metric.ema[index])])
+            else:
+                rows.append([now, name] + list(interval) + [metric.ema])
+        if rows:
+            self.queue.put(rows)
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.next_flush = None
+
+    def _writer(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, "a", newline="") as file:
+            writer = csv.writer(file)
+            if new:
+                writer.writerow(["time", "name", "count", "mean", "min", "max", "last", "ema"])
+                file.flush()
+            while True:
+                rows = self.queue.get()
+                if rows is None:
+                    break
+                writer.writerows(rows)
+                file.flush()
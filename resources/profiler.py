@@ -0,0 +1,145 @@
+import numpy as np
+import cProfile
+import time
+
+# The Profiler class measures how much time goes to each phase of the training loop.
+#
+#   Code is instrumented with:
+#       with profiler.phase("env.step"):
+#           ...
+#       profiler.count("steps")
+#
+#   Phases can be nested, and each one is recorded under its full path (e.g. "learn/sample").
+#   While the profiler is disabled (the default), phase returns a shared empty context and count returns
+#   right away, so the instrumentation can stay in the code.
+#
+#   report(epoch) prints and returns the statistics of everything recorded since the last report:
+#   calls, total, mean, p50 and p99 time of each phase, and the rate of each counter per second.
+#   dump_collapsed writes the total time of each phase path in the "collapsed stacks" format read by flamegraph tools.
+#
+#   If trace_epochs is given as (first, last), the whole program is also run under cProfile during those epochs,
+#   and the result is written to trace_path, to be opened with pstats, snakeviz or flameprof.
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.path = "/".join(self.profiler.stack)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.stack.pop()
+        self.profiler.times.setdefault(self.path, []).append(elapsed)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.trace_epochs = None
+        self.trace_path = "profile.prof"
+        self.tracer = None
+        self.stack = []
+        self.reset()
+
+    def enable(self, trace_epochs = None, trace_path = "profile.prof"):
+        self.enabled = True
+        self.trace_epochs = trace_epochs
+        self.trace_path = trace_path
+        self.reset()
+
+    def disable(self):
+        self.enabled = False
+        self._stop_trace()
+
+    def reset(self):
+        self.times = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def count(self, name, amount = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Called at the start of every epoch, to start and stop the cProfile trace.
+    def epoch(self, epoch):
+        if not self.enabled or self.trace_epochs is None:
+            return
+        first, last = self.trace_epochs
+        if epoch == first and self.tracer is None:
+            self.tracer = cProfile.Profile()
+            self.tracer.enable()
+        elif epoch > last:
+            self._stop_trace()
+
+    def _stop_trace(self):
+        if self.tracer is not None:
+            self.tracer.disable()
+            self.tracer.dump_stats(self.trace_path)
+            self.tracer = None
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        phases = {}
+        for path, times in self.times.items():
+            times = np.array(times)
+            phases[path] = {
+                "calls": len(times),
+                "total": float(times.sum()),
+                "mean": float(times.mean()),
+                "p50": float(np.percentile(times, 50)),
+                "p99": float(np.percentile(times, 99)),
+                "share": float(times.sum() / elapsed),
+            }
+        rates = {name: count / elapsed for name, count in self.counters.items()}
+        return {"elapsed": elapsed, "phases": phases, "rates": rates}
+
+    # Prints the statistics since the last report and starts recording again.
+    def report(self, epoch = None):
+        if not self.enabled:
+            return None
+        stats = self.stats()
+
+        title = "Profile" if epoch is None else "Profile of epoch " + str(epoch)
+        print("{} ({:.2f} s)".format(title, stats["elapsed"]))
+        print("    {:<40} {:>8} {:>10} {:>10} {:>10} {:>10} {:>7}".format("phase", "calls", "total s", "mean us", "p50 us", "p99 us", "share"))
+        for path in sorted(stats["phases"]):
+            phase = stats["phases"][path]
+            print("    {:<40} {:>8} {:>10.3f} {:>10.1f} {:>10.1f} {:>10.1f} {:>7.1%}".format(
+                path, phase["calls"], phase["total"], phase["mean"] * 1e6, phase["p50"] * 1e6, phase["p99"] * 1e6, phase["share"]))
+        for name in sorted(stats["rates"]):
+            print("    {:<40} {:>10.1f} /s".format(name, stats["rates"][name]))
+
+        self.reset()
+        return stats
+
+    # Writes the time spent in each phase, excluding its nested phases, as "a;b;c microseconds" lines.
+    def dump_collapsed(self, path):
+        totals = {name: sum(times) for name, times in self.times.items()}
+        with open(path, "w") as file:
+            for name, total in sorted(totals.items()):
+                children = sum(t for other, t in totals.items() if other.startswith(name + "/") and "/" not in other[len(name) + 1:])
+                file.write("{} {}\n".format(name.replace("/", ";"), max(0, int((total - children) * 1e6))))
+
+
+profiler = Profiler()
@@ -1,4 +1,22 @@
 # game options and settings
 WIDTH = 16000
 HEIGHT = 9000
-EPSILON = 0.9
\ No newline at end of file
+EPSILON = 0.9
+
+# The normalized observations and actions, shared by the environments and the agents: STATE_DIM values per observation,
+# ACTION_DIM values per action, and DTYPE, the floating point type of the networks, their gradients and optimizer moments,
+# the replay buffers and the states. Everything is kept in this type end to end, the normalized observations included.
+STATE_DIM = 5
+ACTION_DIM = 3
+DTYPE = "float32"
+
+# Exploration: epsilon starts at EPSILON on every race and goes down by EPSILON_DECAY every step
+EPSILON_DECAY = 0.005
+
+# Training metrics (see resources/metrics.py): the number of recent values kept for each metric,
+# the number of points of its decimated history, the weight of its moving average,
+# and the seconds between two exports to the metrics file
+METRICS_WINDOW = 1000
+METRICS_HISTORY = 1000
+METRICS_EMA = 0.01
+METRICS_FLUSH_INTERVAL = 10
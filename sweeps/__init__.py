@@ -0,0 +1 @@
+from sweeps.runner import *
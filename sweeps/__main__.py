@@ -0,0 +1,22 @@
+import argparse
+
+from sweeps.runner import *
+
+# Runs a hyperparameter sweep (see sweeps/runner.py for the spec format):
+#
+#   python -m sweeps sweeps/example.json                       runs every trial, one process per core
+#   python -m sweeps spec.json --workers 8 --output results.csv  with 8 processes, writing the table to results.csv
+#
+# The main code only runs in the main process: the trial processes are spawned and import this module again.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m sweeps")
+    parser.add_argument("spec", help="JSON file with the sweep spec")
+    parser.add_argument("--workers", type=int, help="number of trial processes (default: one per core)")
+    parser.add_argument("--output", default="sweep.csv", help="CSV file for the summary table (default sweep.csv)")
+    parser.add_argument("--top", type=int, default=10, help="number of trials printed at the end")
+    args = parser.parse_args()
+
+    results = run_sweep(load_spec(args.spec), args.workers, args.output)
+    print()
+    print_table(results, args.top)
@@ -0,0 +1,127 @@
+import multiprocessing as mp
+import numpy as np
+import itertools
+import json
+import csv
+import os
+
+from sweeps.trial import *
+
+# A sweep is described by a spec, a dictionary (usually read from a JSON file) with:
+#
+#   "search": "grid" or "random"
+#   "parameters": the values to try for each parameter:
+#       -a list of values: every value in a grid search, or one of them at random in a random search,
+#       -only in a random search, a distribution: {"uniform": [low, high]}, {"log_uniform": [low, high]}
+#        or {"int_uniform": [low, high]} (both ends included),
+#   "fixed": parameters with the same value in every trial (optional),
+#   "trials": the number of configurations drawn in a random search,
+#   "repeats": how many times each configuration is trained, with different seeds (1 by default),
+#   "seed": the seed of the random search and of the trials (0 by default), trial i is trained with seed + i,
+#   "early_stopping": the median stopping rule, {"min_epochs": 3, "min_trials": 3}, or null to train every trial to the end.
+#
+# The parameters are the options of the training loop or the names of settings constants, see sweeps/trial.py.
+#
+# Every trial runs in its own new process, from a pool of workers processes (one per core by default).
+# The summary table is written again every time a trial finishes, so it is never lost in a long sweep.
+
+def load_spec(path):
+    with open(path) as file:
+        return json.load(file)
+
+# Returns the configurations of the spec, as dictionaries of parameters.
+def expand(spec):
+    parameters = spec["parameters"]
+    fixed = spec.get("fixed", {})
+
+    if spec.get("search", "grid") == "grid":
+        for name, values in parameters.items():
+            assert isinstance(values, list), "Grid search parameters must be lists: " + name
+        names = list(parameters)
+        return [dict(fixed, **dict(zip(names, values))) for values in itertools.product(*parameters.values())]
+
+    rng = np.random.default_rng(spec.get("seed", 0))
+    return [dict(fixed, **{name: _sample(rng, values) for name, values in parameters.items()})
+            for _ in range(spec["trials"])]
+
+def _sample(rng, values):
+    if isinstance(values, list):
+        return values[rng.integers(len(values))]
+    (kind, (low, high)), = values.items()
+    if kind == "uniform":
+        return float(rng.uniform(low, high))
+    if kind == "log_uniform":
+        return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+    if kind == "int_uniform":
+        return int(rng.integers(low, high, endpoint=True))
+    raise ValueError("Unknown distribution " + kind)
+
+# Returns the trials of the spec: every configuration repeats times, each with its own index and seed.
+def make_trials(spec):
+    seed = spec.get("seed", 0)
+    rule = spec.get("early_stopping")
+    configurations = expand(spec)
+    trials = []
+    for params in configurations:
+        for _ in range(spec.get("repeats", 1)):
+            index = len(trials)
+            trials.append({"index": index, "seed": seed + index, "params": params, "early_stopping": rule})
+    return trials
+
+# The score of a trial is its mean reward over its last score_epochs epochs.
+def score(result, score_epochs = 3):
+    if not result["rewards"]:
+        return float("nan")
+    return float(np.mean(result["rewards"][-score_epochs:]))
+
+# Runs every trial of the spec with workers processes, writes the summary table to output after each trial,
+# and returns the results sorted by score.
+def run_sweep(spec, workers = None, output = "sweep.csv", verbose = True):
+    trials = make_trials(spec)
+    epochs = max(trial["params"].get("epochs", TRAINING_OPTIONS["epochs"]) for trial in trials)
+
+    # Spawned processes start without anything imported, and maxtasksperchild = 1 gives every trial a new one
+    context = mp.get_context("spawn")
+    shared = context.RawArray("d", len(trials) * epochs)
+    np.frombuffer(shared, dtype=np.float64)[:] = np.nan
+
+    if verbose:
+        print("Running " + str(len(trials)) + " trials on " + str(workers or os.cpu_count()) + " processes")
+
+    results = []
+    with context.Pool(workers, initializer=init_worker, initargs=(shared, (len(trials), epochs)), maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(run_trial, trials):
+            results.append(result)
+            write_table(results, output)
+            if verbose:
+                status = "error " + result["error"] if result["error"] else ("stopped" if result["stopped"] else "done")
+                print("[{}/{}] trial {} {} after {} epochs, score {:.2f}, {:.0f}s".format(
+                    len(results), len(trials), result["trial"], status, len(result["rewards"]), score(result), result["seconds"]))
+
+    return sorted(results, key=_order)
+
+def _order(result):
+    value = score(result)
+    return (np.isnan(value), -value if not np.isnan(value) else 0)
+
+# Writes one row per trial, best score first, with the results and then one column per parameter.
+def write_table(results, path):
+    names = sorted({name for result in results for name in result["params"]})
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["trial", "seed", "score", "final_reward", "best_reward", "epochs_run", "stopped", "seconds", "error"] + names)
+        for result in sorted(results, key=_order):
+            rewards = result["rewards"]
+            writer.writerow([result["trial"], result["seed"], score(result),
+                             rewards[-1] if rewards else "", max(rewards) if rewards else "",
+                             len(rewards), result["stopped"], round(result["seconds"], 1), result["error"] or ""] +
+                            [json.dumps(result["params"][name]) if name in result["params"] else "" for name in names])
+
+# Prints the best trials as a table.
+def print_table(results, top = 10):
+    names = sorted({name for result in results for name in result["params"]})
+    print("{:>6} {:>10} {:>7} {:>8}  {}".format("trial", "score", "epochs", "stopped", "  ".join(names)))
+    for result in results[:top]:
+        values = "  ".join(json.dumps(result["params"].get(name)) for name in names)
+        print("{:>6} {:>10.2f} {:>7} {:>8}  {}".format(result["trial"], score(result), len(result["rewards"]),
+                                                       str(result["stopped"]), values))
@@ -0,0 +1,117 @@
+import importlib.util
+import numpy as np
+import random
+import time
+import sys
+import os
+
+# One trial of a sweep: a training job run in its own process, with its own settings and seed.
+#
+#   The parameters of a trial are either options of the training loop (the knobs at the top of main.py, in TRAINING_OPTIONS),
+#   or the name of a constant of one of the settings modules (DISCOUNT_FACTOR, HIDDEN_DIM, ACTOR_NETWORK, EPSILON...).
+#   The settings are star-imported and used as default arguments all over the code, so they can not be changed
+#   once the agents are imported: the trial loads its own copy of every settings module, changes the constants,
+#   and only then imports the agents and the environment, which then see the trial's values everywhere.
+#   That is why every trial needs a new process that did not import them yet.
+#
+#   The trial trains with train_epochs (agents/training.py), the same loop as python main.py train, with one agent.
+#   After every epoch the trial writes its total reward to the epoch_rewards array shared by all trials of the sweep,
+#   and with early stopping it gives up when its mean reward so far is below the median of the other trials
+#   that reached the same epoch (the median stopping rule).
+
+# The shared resources.settings goes first, as the other two import from it
+SETTINGS_MODULES = ("resources.settings", "agents.resources.settings", "envs.resources.settings")
+
+TRAINING_OPTIONS = {
+    "buffer_size": 500,
+    "batch_size": 100,
+    "epochs": 20,
+    "steps_per_epoch": 500,
+    "epsilon_decay": 0.005,
+    "num_bots": 0,
+    "prioritized": False,
+}
+
+# The (trials, epochs) array of epoch rewards, NaN until reached, in memory shared by all the trial processes.
+# A pool only hands shared memory to its processes through their initializer, so init_worker keeps it here.
+epoch_rewards = None
+
+def init_worker(shared, shape):
+    global epoch_rewards
+    epoch_rewards = np.frombuffer(shared, dtype=np.float64).reshape(shape)
+
+# Loads a fresh copy of the settings modules with the given constants changed.
+def load_settings(overrides):
+    assert "agents.AI" not in sys.modules, "The settings must be loaded before the agents are imported"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    modules = []
+    for name in SETTINGS_MODULES:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(root, *name.split(".")) + ".py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+        modules.append(module)
+
+    for key, value in overrides.items():
+        owners = [module for module in modules if hasattr(module, key)]
+        assert owners, "Unknown setting " + key
+        for module in owners:
+            setattr(module, key, value)
+
+# Median stopping rule: True if the trial's mean reward up to this epoch is below the median of the others',
+# once it ran min_epochs epochs and at least min_trials other trials reached the same epoch.
+def should_stop(index, epoch, rule):
+    if rule is None or epoch + 1 < rule.get("min_epochs", 3):
+        return False
+    reached = ~np.isnan(epoch_rewards[:, epoch])
+    reached[index] = False
+    if np.count_nonzero(reached) < rule.get("min_trials", 3):
+        return False
+    others = epoch_rewards[reached, :epoch + 1].mean(axis=1)
+    return epoch_rewards[index, :epoch + 1].mean() < np.median(others)
+
+# Runs the trial described by a dictionary with its "index", "seed", "params" and "early_stopping" rule,
+# and returns its results. A trial that fails returns its error instead of stopping the sweep.
+def run_trial(trial):
+    start = time.time()
+    result = {"trial": trial["index"], "seed": trial["seed"], "params": trial["params"],
+              "rewards": [], "stopped": False, "error": None}
+    try:
+        _train(trial, result)
+    except Exception as error:
+        result["error"] = repr(error)
+    result["seconds"] = time.time() - start
+    return result
+
+def _train(trial, result):
+    options = dict(TRAINING_OPTIONS)
+    overrides = {}
+    for key, value in trial["params"].items():
+        if key in TRAINING_OPTIONS:
+            options[key] = value
+        else:
+            overrides[key] = value
+    load_settings(overrides)
+
+    from agents.AI import Agent
+    from agents.training import train_epochs
+    from agents.resources.settings import DTYPE
+    from envs.pod_racing import RaceTrackEnv
+
+    np.random.seed(trial["seed"])
+    random.seed(trial["seed"])
+
+    env = RaceTrackEnv(num_players = 1, num_bots = options["num_bots"], normalized = True, dtype = DTYPE)
+    agent = Agent(buffer_size = options["buffer_size"], prioritized = options["prioritized"])
+
+    # The reward of every epoch is reported to the sweep, which stops the trial by the median stopping rule
+    def end_epoch(epoch, rewards):
+        total = float(rewards[0])
+        result["rewards"].append(total)
+        epoch_rewards[trial["index"], epoch] = total
+        result["stopped"] = should_stop(trial["index"], epoch, trial["early_stopping"])
+        return result["stopped"]
+
+    train_epochs(env, [agent], 0, options["epochs"], options["steps_per_epoch"], options["batch_size"],
+                 epsilon_decay = options["epsilon_decay"], end_epoch = end_epoch, verbose = False)
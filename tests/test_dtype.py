@@ -0,0 +1,74 @@
+from agents.AI import Agent, ReplayBuffer
+from agents.population import PopulationBuffer
+from agents.resources.settings import *
+from envs.pod_racing import RaceTrackEnv
+from resources.functions import normalize_observations
+import numpy as np
+
+# Everything the agents learn from and with must stay DTYPE: a single float64 array mixed in anywhere
+# upcasts every step after it, and nothing in forward or backward would complain.
+
+# Wraps the forward and backward of every layer of the brains to record the dtype of what comes out of them.
+def record_dtypes(brains):
+    seen = []
+    def wrap(method):
+        def recorded(*args):
+            output = method(*args)
+            seen.append(output.dtype)
+            return output
+        return recorded
+
+    for brain in brains:
+        for layer in brain.network:
+            layer.forward = wrap(layer.forward)
+            layer.backward = wrap(layer.backward)
+    return seen
+
+def test_normalized_env_observes_dtype():
+    env = RaceTrackEnv(num_players = 2, normalized = True)
+    states, info = env.reset()
+    assert states.dtype == DTYPE
+    states, rewards, done, info = env.step(np.zeros((2, ACTION_DIM), dtype=DTYPE))
+    assert states.dtype == DTYPE
+
+def test_replay_buffer_stores_and_samples_dtype():
+    memory = ReplayBuffer(4)
+    for step in range(4):
+        memory.add_experience(np.ones(STATE_DIM), np.ones(ACTION_DIM), 1.0, np.ones(STATE_DIM), False)
+    for column in (memory.states, memory.actions, memory.rewards, memory.next_states, memory.dones):
+        assert column.dtype == DTYPE
+    states, actions, rewards, next_states, dones, indices, weights = memory.sample_batch(4)
+    for column in (states, actions, rewards, next_states, dones, weights):
+        assert column.dtype == DTYPE
+
+def test_agent_learns_in_dtype():
+    env = RaceTrackEnv(num_players = 1, normalized = True)
+    agent = Agent(buffer_size = 8)
+    brains = (agent.actor, agent.critic, agent.target_actor, agent.target_critic)
+    seen = record_dtypes(brains)
+
+    states, info = env.reset()
+    for step in range(12):
+        prev_states = states.copy()
+        action = agent.forward(states[0:1].T)[:, 0]
+        states, rewards, done, info = env.step(action[None, :])
+        agent.learn(prev_states[0], action, rewards[0], states[0], batch_size = 4)
+
+    assert agent.learn_steps > 0
+    assert seen and all(dtype == DTYPE for dtype in seen)
+    for brain in brains:
+        assert brain.parameters.dtype == DTYPE
+        assert brain.gradients.dtype == DTYPE
+    for brain in (agent.actor, agent.critic):
+        moments = brain.optimizer.moments()
+        assert moments and all(moment.dtype == DTYPE for moment in moments.values())
+
+def test_population_buffer_and_observations_default_to_dtype():
+    memory = PopulationBuffer(2, 4)
+    for column in (memory.states, memory.actions, memory.rewards, memory.next_states, memory.dones):
+        assert column.dtype == DTYPE
+    assert normalize_observations(np.ones((2, 4))).dtype == DTYPE
+
+    memory = PopulationBuffer(2, 4, dtype = "float64")
+    for column in (memory.states, memory.actions, memory.rewards, memory.next_states, memory.dones):
+        assert column.dtype == np.float64
@@ -0,0 +1,23 @@
+from envs.pod_racing import RaceTrackEnv
+from envs.recorder import TrajectoryRecorder, TrajectoryPlayer
+from envs.resources.settings import *
+import numpy as np
+
+# A recording of a normalized environment holds the actions in game units, so the player can draw them.
+
+def test_normalized_recording_round_trip(tmp_path):
+    path = str(tmp_path / "race.rec")
+    env = TrajectoryRecorder(RaceTrackEnv(num_players = 2, normalized = True), path)
+    env.reset()
+    actions = np.array([[0.5, 0.5, 0.9], [-1.0, 1.0, -1.0]], dtype=DTYPE)
+    for step in range(3):
+        env.step(actions)
+    env.close()
+
+    player = TrajectoryPlayer(path)
+    ticks = player.episode(0)
+    assert len(player) == 1 and len(ticks) == 4
+    expected = np.floor((actions + 1) * ACTION_SCALE)
+    expected[:, :2] = (actions[:, :2] + 1) * ACTION_SCALE[:2]
+    for tick in ticks[1:]:
+        assert np.allclose(tick["action"], expected)